@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 from task_dispatcher.celery import app
 from task_dispatcher.decorators import producer, consumer
+from task_dispatcher.map_reduce import map_reduce
 from task_dispatcher.register import register
 
 __version__ = '1.4.5'
@@ -12,6 +13,6 @@ __email__ = 'perdy.hh@gmail.com'
 __url__ = 'https://github.com/PeRDy/task-dispatcher'
 __description__ = 'Library that provides a system to generate tasks producers and consumers with ease.'
 
-__all__ = ['producer', 'consumer', 'register', 'app']
+__all__ = ['producer', 'consumer', 'register', 'map_reduce', 'app']
 
 default_app_config = 'task_dispatcher.apps.TaskDispatcher'
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+Asyncio tasks.
+
+Coroutine functions are run on an event loop that each worker process runs in a background thread, so tasks running in
+threads of a thread pool wait on the loop while their coroutines are run concurrently. A worker consuming async tasks
+with N threads keeps up to N coroutines in flight in a single process.
+"""
+import asyncio
+import os
+import threading
+from typing import Any, Awaitable, Callable
+
+from task_dispatcher.utils import wraps
+
+__all__ = ['EventLoop', 'event_loop', 'run_async']
+
+
+class EventLoop:
+    """
+    Event loop run in a background thread of current process. It is created on first use and again after forking.
+    """
+    def __init__(self):
+        """
+        Event loop run in a background thread of current process.
+        """
+        self._lock = threading.Lock()
+        self._loop = None
+        self._pid = None
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None or self._pid != os.getpid():
+                self._loop = asyncio.new_event_loop()
+                self._pid = os.getpid()
+                thread = threading.Thread(target=self._loop.run_forever, name='task_dispatcher_loop', daemon=True)
+                thread.start()
+
+            return self._loop
+
+    def run(self, coroutine: Awaitable) -> Any:
+        """
+        Run a coroutine on the event loop and wait for its result.
+
+        :param coroutine: Coroutine.
+        :return: Coroutine result.
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def stop(self):
+        """
+        Stop the event loop, if running.
+        """
+        with self._lock:
+            if self._loop is not None and self._pid == os.getpid():
+                self._loop.call_soon_threadsafe(self._loop.stop)
+
+            self._loop = None
+
+
+event_loop = EventLoop()
+
+
+def run_async(func: Callable) -> Callable:
+    """
+    Wrap a coroutine function, so calling it runs the coroutine on the event loop of current process and returns its
+    result.
+
+    :param func: Coroutine function.
+    :return: Wrapped function.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        return event_loop.run(func(*args, **kwargs))
+
+    return wrapper
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+Adaptive pool autoscaling.
+"""
+import logging
+import math
+import os
+from typing import List, Optional
+
+from celery.five import monotonic
+from celery.worker import state
+from celery.worker.autoscale import AUTOSCALE_KEEPALIVE, Autoscaler as CeleryAutoscaler
+
+from task_dispatcher import stats
+from task_dispatcher.queues import QueueDepth
+from task_dispatcher.settings import settings
+
+__all__ = ['Autoscaler']
+
+logger = logging.getLogger(__name__)
+
+
+class Autoscaler(CeleryAutoscaler):
+    """
+    Autoscaler that sizes the pool to drain pending messages within *drain_time* seconds. Pending messages are those
+    waiting in the broker queues consumed by the worker plus the ones already reserved by it, and the time needed to
+    process them is estimated from recent execution times of instrumented tasks. When no execution time is known yet,
+    one process per pending message is requested, bounded by max concurrency.
+
+    The pool grows as soon as more processes are needed, unless CPU is already saturated, and shrinks only when the
+    desired size falls below current size by a *hysteresis* fraction and after *keepalive* seconds since last scale up.
+    """
+    def __init__(self, pool, max_concurrency, min_concurrency=0, worker=None, keepalive=AUTOSCALE_KEEPALIVE,
+                 mutex=None, drain_time: float=None, hysteresis: float=None, cpu_threshold: float=None):
+        """
+        Autoscaler that sizes the pool based on queue depth, execution time and CPU load.
+
+        :param pool: Worker pool.
+        :param max_concurrency: Maximum number of processes.
+        :param min_concurrency: Minimum number of processes.
+        :param worker: Worker.
+        :param keepalive: Seconds since last scale up before the pool can shrink.
+        :param mutex: Lock.
+        :param drain_time: Seconds to drain pending messages.
+        :param hysteresis: Fraction of current size that desired size must fall below before the pool shrinks.
+        :param cpu_threshold: Load average per CPU over which the pool does not grow.
+        """
+        super().__init__(pool, max_concurrency, min_concurrency, worker=worker, keepalive=keepalive, mutex=mutex)
+        self.drain_time = drain_time if drain_time is not None else settings.autoscale_drain_time
+        self.hysteresis = hysteresis if hysteresis is not None else settings.autoscale_hysteresis
+        self.cpu_threshold = cpu_threshold if cpu_threshold is not None else settings.autoscale_cpu_threshold
+        self.queue_depth = QueueDepth(worker.app)
+        self._execution = {}
+        self._execution_time = None
+
+    @property
+    def queues(self) -> List[str]:
+        """
+        Queues consumed by the worker.
+        """
+        return list(self.worker.app.amqp.queues.consume_from)
+
+    @property
+    def execution_time(self) -> Optional[float]:
+        """
+        Mean execution time of tasks finished since last call, or last known mean if none finished.
+        """
+        total, count = 0.0, 0
+        for name, task_stats in stats.stats.to_dict().items():
+            histogram = task_stats['histograms']['execution_seconds']
+            current = (histogram['sum'], sum(histogram['counts']))
+            previous = self._execution.get(name, (0.0, 0))
+            total, count = total + current[0] - previous[0], count + current[1] - previous[1]
+            self._execution[name] = current
+
+        if count:
+            self._execution_time = total / count
+
+        return self._execution_time
+
+    @property
+    def cpu_saturated(self) -> bool:
+        """
+        Whether load average per CPU is over the threshold.
+        """
+        try:
+            return os.getloadavg()[0] / (os.cpu_count() or 1) >= self.cpu_threshold
+        except OSError:
+            return False
+
+    @property
+    def qty(self) -> int:
+        pending = len(state.reserved_requests) + self.queue_depth(*self.queues)
+        execution_time = self.execution_time
+
+        if execution_time is None:
+            return pending
+
+        return math.ceil(pending * execution_time / self.drain_time)
+
+    def _maybe_scale(self, req=None):
+        procs, qty = self.processes, self.qty
+
+        desired = min(qty, self.max_concurrency)
+        if desired > procs:
+            if self.cpu_saturated:
+                logger.debug('Autoscaler won\'t scale up: CPU is saturated.')
+                return False
+
+            self.scale_up(desired - procs)
+            return True
+
+        desired = max(qty, self.min_concurrency)
+        if desired < procs * (1 - self.hysteresis):
+            return self.scale_down(procs - desired)
+
+        return False
+
+    def scale_down(self, n):
+        if self._last_scale_up is None or monotonic() - self._last_scale_up > self.keepalive:
+            self._shrink(n)
+            return True
+
+        return False
+
+    def info(self):
+        return dict(super().info(), execution_time=self._execution_time, drain_time=self.drain_time,
+                    hysteresis=self.hysteresis)
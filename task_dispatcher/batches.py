@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+Batched execution of consumer tasks.
+"""
+import logging
+import time
+from collections import deque
+from typing import Any, List
+
+from celery import Task
+from celery.app.task import Context
+from celery.utils.imports import symbol_by_name
+from kombu.five import buffer_t
+
+from task_dispatcher.celery import app
+
+__all__ = ['BatchTask', 'BatchItem', 'apply_batch']
+
+logger = logging.getLogger(__name__)
+
+
+class BatchItem(Context):
+    """
+    Picklable context of a single request buffered in a batch.
+    """
+    @property
+    def item(self) -> Any:
+        """
+        Item sent by producer. A call like *task.delay(x)* produces *x* as item, while calls with several arguments
+        produce a tuple of them. Calls with keyword arguments produce an *(args, kwargs)* tuple.
+
+        :return: Item.
+        """
+        if self.kwargs:
+            return tuple(self.args), dict(self.kwargs)
+
+        if len(self.args) == 1:
+            return self.args[0]
+
+        return tuple(self.args)
+
+    @classmethod
+    def from_request(cls, request) -> 'BatchItem':
+        return cls(request.request_dict)
+
+
+def _observe_execution(task_stats, start: float):
+    if task_stats is not None:
+        task_stats.observe('execution_seconds', time.perf_counter() - start)
+
+
+def apply_batch(task_name: str, batch: List[BatchItem]):
+    """
+    Run a batch of requests in a single call to the task function and store a result for every request. This function
+    is executed by a worker pool process. Instrumented tasks record queue wait time of each request and execution time
+    of the whole batch.
+
+    :param task_name: Batch task name.
+    :param batch: Requests to be run.
+    """
+    from task_dispatcher import stats
+
+    task = app.tasks[task_name]
+    store_results = not task.ignore_result
+
+    task_stats = stats.stats.get(task_name)
+    if task_stats is not None:
+        for i in batch:
+            wait = stats.queue_wait(i)
+            if wait is not None:
+                task_stats.observe('queue_wait_seconds', wait)
+
+    start = time.perf_counter()
+    try:
+        results = task([i.item for i in batch])
+        if store_results:
+            results = results if results is not None else [None] * len(batch)
+            if len(results) != len(batch):
+                raise ValueError('Task "{}" returned {} results for a batch of {} items'.format(
+                    task_name, len(results), len(batch)))
+    except Exception as exc:
+        _observe_execution(task_stats, start)
+        logger.exception('Batch of %d items failed in task "%s"', len(batch), task_name)
+        if store_results or task.store_errors_even_if_ignored:
+            for i in batch:
+                task.backend.mark_as_failure(i.id, exc, request=i)
+    else:
+        _observe_execution(task_stats, start)
+        if store_results:
+            for i, result in zip(batch, results):
+                task.backend.mark_as_done(i.id, result, request=i)
+
+
+class BatchTask(Task):
+    """
+    Celery task that buffers received requests on the worker and runs the task function once per batch, giving it a
+    list of items. A batch is flushed when *batch_size* requests are buffered or every *flush_interval* seconds.
+
+    Task function can return a list with a result for each item, that will be stored as the result of each request.
+    Requests are acknowledged individually, when the batch is accepted by a pool process or, if *acks_late* is set,
+    after the batch finished. Requests of a batch that cannot be run by the pool are rejected.
+
+    Worker prefetch limit is raised by *batch_size* the first time a request is received, so the worker is able to
+    buffer a full batch regardless of its concurrency.
+    """
+    abstract = True
+
+    #: Maximum number of requests per batch.
+    batch_size = 100
+
+    #: Seconds between periodic flushes of the buffer.
+    flush_interval = 1.0
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._buffer = deque()
+        self._pool = None
+        self._tref = None
+        self._qos = None
+
+    def Strategy(self, task, app, consumer):  # noqa
+        """
+        Execution strategy that buffers requests instead of sending them to the pool.
+        """
+        from celery.worker.strategy import proto1_to_proto2
+
+        self._pool = consumer.pool
+        self._qos = None
+        hostname = consumer.hostname
+        eventer = consumer.event_dispatcher
+        connection_errors = consumer.connection_errors
+        timer = consumer.timer
+        body_can_be_buffer = consumer.pool.body_can_be_buffer
+        request_cls = symbol_by_name(task.Request)
+
+        def task_message_handler(message, body, ack, reject, callbacks, **kwargs):
+            if body is None:
+                body, headers, decoded, utc = message.body, message.headers, False, app.uses_utc_timezone()
+                if not body_can_be_buffer:
+                    body = bytes(body) if isinstance(body, buffer_t) else body
+            else:
+                body, headers, decoded, utc = proto1_to_proto2(message, body)
+
+            request = request_cls(
+                message, on_ack=ack, on_reject=reject, app=app, hostname=hostname, eventer=eventer, task=task,
+                connection_errors=connection_errors, body=body, headers=headers, decoded=decoded, utc=utc,
+            )
+            self._buffer.append(request)
+
+            # QoS is created again on every broker connection
+            if consumer.qos is not None and consumer.qos is not self._qos:
+                self._qos = consumer.qos
+                self._qos.increment_eventually(self.batch_size)
+
+            if self._tref is None:
+                self._tref = timer.call_repeatedly(self.flush_interval, self.flush)
+
+            if len(self._buffer) >= self.batch_size:
+                self.flush()
+
+        return task_message_handler
+
+    def flush(self):
+        """
+        Send all buffered requests to the pool, split in batches of *batch_size* requests.
+        """
+        while self._buffer:
+            requests = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+            self.apply_buffer(requests)
+
+    def apply_buffer(self, requests: list):
+        """
+        Run a batch of requests in the worker pool, acknowledging them as soon as the batch is accepted or after it
+        finishes if *acks_late* is set.
+
+        :param requests: Worker requests.
+        """
+        batch = [BatchItem.from_request(r) for r in requests]
+
+        def on_accepted(*args, **kwargs):
+            if not self.acks_late:
+                for r in requests:
+                    r.acknowledge()
+
+        def on_return(*args, **kwargs):
+            if self.acks_late:
+                for r in requests:
+                    r.acknowledge()
+
+        def on_error(*args, **kwargs):
+            for r in requests:
+                r.reject(requeue=False)
+
+        return self._pool.apply_async(apply_batch, (self.name, batch), accept_callback=on_accepted,
+                                      callback=on_return, error_callback=on_error)
@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+"""
+Throughput benchmark of producer to consumer pipelines, and microbenchmark of the cost of sending tasks through
+decorators.
+"""
+import platform
+import threading
+import time
+from queue import Empty
+from typing import Iterable, List
+
+import celery
+from celery import Celery
+from kombu.serialization import dumps, loads, prepare_accept_content
+
+import task_dispatcher
+from task_dispatcher.decorators import consumer
+from task_dispatcher.serializers import accept
+from task_dispatcher.utils import rss_kb
+
+__all__ = ['run', 'pipeline', 'codec', 'proxy', 'percentile', 'rss_kb']
+
+QUEUE = 'bench'
+
+app = Celery('task_dispatcher_bench', broker='memory://', set_as_current=False)
+app.conf.update(task_default_queue=QUEUE, task_ignore_result=True, broker_pool_limit=None)
+
+
+@app.task(name='task_dispatcher.bench.consume', shared=False)
+def consume(payload: str, sent: float) -> float:
+    """
+    Synthetic consumer that does nothing but returning the time spent since the message was sent.
+    """
+    return time.perf_counter() - sent
+
+
+class _Unpublished(celery.Task):
+    """
+    Task whose messages are not published, so only the cost of sending them through decorators is measured.
+    """
+    def apply_async(self, *args, **kwargs):
+        return None
+
+
+class _BenchConsumer(consumer):
+    """
+    Consumer of the benchmark app, kept out of the task register and of the Task Dispatcher app, so benchmark tasks are
+    not shown, listed in manifests nor consumed by workers.
+    """
+    def _create_task(self, func, *args, **kwargs):
+        return app.task(*args, **kwargs)(func)
+
+    def _register(self):
+        pass
+
+
+def percentile(values: List[float], p: float) -> float:
+    """
+    Get the percentile of a list of values, using nearest rank method.
+
+    :param values: Sorted values.
+    :param p: Percentile, between 0 and 100.
+    :return: Percentile value.
+    """
+    if not values:
+        return 0.0
+
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def codec(payload: str, serializer: str, messages: int) -> dict:
+    """
+    Measure the cost of encoding and decoding a task body with a serializer.
+
+    :param payload: Payload.
+    :param serializer: Serializer name.
+    :param messages: Number of times the body is encoded and decoded.
+    :return: Mean encode and decode time in microseconds, and message size in bytes.
+    """
+    body = ((payload, 0.0), {}, {})
+
+    start = time.perf_counter()
+    for _ in range(messages):
+        content_type, encoding, data = dumps(body, serializer=serializer)
+    encode = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(messages):
+        loads(data, content_type, encoding, accept=[content_type])
+    decode = time.perf_counter() - start
+
+    return {
+        'encode_us': encode / messages * 1e6,
+        'decode_us': decode / messages * 1e6,
+        'message_bytes': len(data),
+    }
+
+
+def proxy(calls: int) -> dict:
+    """
+    Measure the cost of sending tasks and reading task attributes through decorators of functions and methods, without
+    publishing messages.
+
+    :param calls: Number of times each operation is done.
+    :return: Mean time of each operation in microseconds.
+    """
+    @_BenchConsumer(name='task_dispatcher.bench.proxied', queue=QUEUE, base=_Unpublished, shared=False)
+    def proxied(payload: str):
+        """
+        Synthetic consumer whose messages are not published.
+        """
+
+    class Proxied:
+        @_BenchConsumer(name='task_dispatcher.bench.Proxied.proxied', queue=QUEUE, base=_Unpublished, shared=False)
+        def proxied(self, payload: str):
+            """
+            Synthetic consumer method whose messages are not published.
+            """
+
+    instance = Proxied()
+    operations = (
+        ('delay_us', lambda: proxied.delay('')),
+        ('method_delay_us', lambda: instance.proxied.delay('')),
+        ('attribute_us', lambda: proxied.name),
+        ('method_attribute_us', lambda: instance.proxied.s),
+    )
+
+    results = {}
+    for key, operation in operations:
+        start = time.perf_counter()
+        for _ in range(calls):
+            operation()
+        results[key] = (time.perf_counter() - start) / calls * 1e6
+
+    return results
+
+
+def _consumer(messages: int, processed: List[int], latencies: List[float], lock: threading.Lock,
+              stop: threading.Event, errors: List[BaseException]):
+    """
+    Consume messages from bench queue until all messages are processed or the pipeline is stopped. Errors are recorded
+    and stop the whole pipeline, so other consumers do not wait forever for messages that will never be processed.
+    """
+    try:
+        with app.connection_for_read() as connection:
+            queue = connection.SimpleQueue(QUEUE, no_ack=True)
+            queue.consumer.accept = prepare_accept_content(app.conf.accept_content)
+            try:
+                while not stop.is_set():
+                    try:
+                        message = queue.get(timeout=0.1)
+                    except Empty:
+                        continue
+
+                    args, kwargs, _ = message.payload
+                    latency = app.tasks[message.headers['task']](*args, **kwargs)
+
+                    with lock:
+                        processed[0] += 1
+                        latencies.append(latency)
+                        if processed[0] >= messages:
+                            stop.set()
+            finally:
+                queue.close()
+    except BaseException as e:
+        errors.append(e)
+        stop.set()
+
+
+def pipeline(messages: int, payload_size: int, concurrency: int, serializer: str='json', timeout: float=300.0) -> dict:
+    """
+    Run a producer that sends a number of messages with a given payload size, while a number of consumers handle them.
+
+    :param messages: Number of messages.
+    :param payload_size: Payload size in bytes.
+    :param concurrency: Number of consumers.
+    :param serializer: Serializer name.
+    :param timeout: Seconds to wait for consumers to process all messages.
+    :return: Benchmark results.
+    :raise TimeoutError: Messages were not processed in time.
+    """
+    payload = 'x' * payload_size
+    # Serializer is chosen explicitly and only decoded by this isolated app, so pickle serializers are allowed
+    accept(app, serializer, allow_pickle=True)
+
+    # Messages left by a previous pipeline that failed are discarded
+    with app.connection_for_write() as connection:
+        queue = connection.SimpleQueue(QUEUE, no_ack=True)
+        queue.clear()
+        queue.close()
+
+    processed, latencies, lock, stop, errors = [0], [], threading.Lock(), threading.Event(), []
+
+    consumers = [threading.Thread(target=_consumer, args=(messages, processed, latencies, lock, stop, errors),
+                                  daemon=True)
+                 for _ in range(concurrency)]
+
+    rss_start = rss_kb()
+    start = time.perf_counter()
+    for c in consumers:
+        c.start()
+
+    try:
+        with app.producer_or_acquire() as producer:
+            for _ in range(messages):
+                consume.apply_async((payload, time.perf_counter()), producer=producer, serializer=serializer)
+        enqueue = time.perf_counter() - start
+
+        stop.wait(timeout)
+        elapsed = time.perf_counter() - start
+    finally:
+        stop.set()
+        for c in consumers:
+            c.join(1.0)
+
+    if errors:
+        raise errors[0]
+
+    if processed[0] < messages:
+        raise TimeoutError('Only {} of {} messages processed in {} seconds'.format(processed[0], messages, timeout))
+
+    rss_end = rss_kb()
+
+    latencies.sort()
+    return dict({
+        'payload_size': payload_size,
+        'concurrency': concurrency,
+        'serializer': serializer,
+        'messages': messages,
+        'tasks_per_second': messages / elapsed,
+        'enqueue_us': enqueue / messages * 1e6,
+        'latency_p50_ms': percentile(latencies, 50) * 1e3,
+        'latency_p99_ms': percentile(latencies, 99) * 1e3,
+        'rss_kb': rss_end,
+        'rss_delta_kb': rss_end - rss_start,
+    }, **codec(payload, serializer, messages))
+
+
+def run(messages: int=10000, payload_sizes: Iterable[int]=(16, 1024, 65536),
+        concurrency: Iterable[int]=(1, 4), serializers: Iterable[str]=('json',)) -> dict:
+    """
+    Run pipeline benchmark for each combination of payload size, concurrency level and serializer. Consumers run as
+    threads of current process, so RSS is reported per worker process: current RSS at the end of each pipeline and its
+    growth during the pipeline. Encode and decode costs of each serializer, and the cost of sending tasks through
+    decorators, are measured apart from the pipelines.
+
+    :param messages: Number of messages sent in each pipeline.
+    :param payload_sizes: Payload sizes in bytes.
+    :param concurrency: Concurrency levels.
+    :param serializers: Serializers names.
+    :return: Benchmark results.
+    """
+    return {
+        'task_dispatcher': task_dispatcher.__version__,
+        'celery': celery.__version__,
+        'python': platform.python_version(),
+        'proxy': proxy(messages),
+        'pipelines': [pipeline(messages, s, c, z) for s in payload_sizes for c in concurrency for z in serializers],
+    }
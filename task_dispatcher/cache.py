@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+In-process caches.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+__all__ = ['LRUCache']
+
+
+class LRUCache:
+    """
+    Bounded cache whose entries expire after a fixed time. When full, least recently used entries are evicted first.
+    """
+    def __init__(self, maxsize: int, ttl: float):
+        """
+        Bounded cache whose entries expire after a fixed time.
+
+        :param maxsize: Maximum number of entries.
+        :param ttl: Seconds that an entry is kept.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _get(self, key: Hashable, now: float) -> tuple:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= now:
+            return False, None
+
+        self._entries.move_to_end(key)
+        return True, entry[1]
+
+    def _set(self, key: Hashable, value: Any, now: float):
+        self._entries[key] = (now + self.ttl, value)
+        self._entries.move_to_end(key)
+
+        # Expired entries at the head are evicted eagerly, and least recently used ones when cache is full
+        while self._entries:
+            oldest, (expires, _) = next(iter(self._entries.items()))
+            if expires > now and len(self._entries) <= self.maxsize:
+                break
+            del self._entries[oldest]
+
+    def get(self, key: Hashable) -> tuple:
+        """
+        Get the value of an entry that is not expired.
+
+        :param key: Key.
+        :return: Whether the entry was found and its value.
+        """
+        with self._lock:
+            return self._get(key, time.monotonic())
+
+    def set(self, key: Hashable, value: Any):
+        """
+        Set the value of an entry.
+
+        :param key: Key.
+        :param value: Value.
+        """
+        with self._lock:
+            self._set(key, value, time.monotonic())
+
+    def add(self, key: Hashable, value: Any=None) -> bool:
+        """
+        Set the value of an entry unless it is already cached and not expired.
+
+        :param key: Key.
+        :param value: Value.
+        :return: True if entry was added.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self._get(key, now)[0]:
+                return False
+
+            self._set(key, value, now)
+            return True
+
+    def discard(self, key: Hashable):
+        """
+        Remove an entry, if cached.
+
+        :param key: Key.
+        """
+        with self._lock:
+            self._entries.pop(key, None)
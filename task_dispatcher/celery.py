@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 from celery import Celery
 
+from task_dispatcher.register import LazyTaskRegistry
 
-app = Celery('task_dispatcher')
+
+app = Celery('task_dispatcher', tasks=LazyTaskRegistry())
 app.config_from_envvar('TASK_DISPATCHER_SETTINGS', silent=True)
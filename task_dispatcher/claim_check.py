@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+"""
+Claim check of large task arguments.
+
+Arguments larger than *claim_check_threshold* bytes, either strings or objects that support the buffer protocol such
+as bytes or numpy arrays, are written to a blob store before sending a message, and replaced in the message by a
+reference. References are resolved right before running the task, mapping stored blobs in memory instead of copying
+them when possible, and blobs are deleted once the task succeeds or fails without being retried.
+"""
+import logging
+import mmap
+import os
+import re
+import tempfile
+import uuid
+from typing import Any, Callable, Dict, List, Tuple
+
+from celery import signals
+from kombu.utils.imports import symbol_by_name
+
+from task_dispatcher.settings import settings
+from task_dispatcher.utils import wraps
+
+__all__ = ['BlobStore', 'FileBlobStore', 'REFERENCE', 'get_store', 'offload', 'references', 'resolve', 'resolving']
+
+logger = logging.getLogger(__name__)
+
+#: Key that identifies a reference to a stored argument.
+REFERENCE = '__claim_check__'
+
+_store = None
+
+
+class BlobStore:
+    """
+    Storage of blobs, that must be reachable by producers and consumers.
+    """
+    def put(self, data: memoryview) -> str:
+        """
+        Store a blob.
+
+        :param data: Blob.
+        :return: Blob key.
+        """
+        raise NotImplementedError
+
+    def get(self, key: str) -> memoryview:
+        """
+        Get a stored blob.
+
+        :param key: Blob key.
+        :return: Blob.
+        """
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        """
+        Delete a stored blob, if exists.
+
+        :param key: Blob key.
+        """
+        raise NotImplementedError
+
+
+class FileBlobStore(BlobStore):
+    """
+    Blob store that keeps each blob in a file of a directory, that must be shared by producers and consumers. Blobs are
+    memory mapped when read, so they are not copied into worker memory.
+    """
+    KEY = re.compile('[0-9a-f]{32}')
+
+    def __init__(self, path: str=None):
+        """
+        Blob store that keeps each blob in a file of a directory.
+
+        :param path: Directory path. A task_dispatcher directory in system temp directory by default.
+        """
+        self.path = path or os.path.join(tempfile.gettempdir(), 'task_dispatcher')
+
+    def _path(self, key: str) -> str:
+        """
+        Path of the file of a blob. Keys come from task messages, so only keys generated by the store are accepted and
+        the path must stay inside the store directory.
+
+        :param key: Blob key.
+        :return: File path.
+        :raise ValueError: Invalid key.
+        """
+        if not isinstance(key, str) or not self.KEY.fullmatch(key):
+            raise ValueError('Invalid blob key "{}"'.format(key))
+
+        directory = os.path.realpath(self.path)
+        path = os.path.realpath(os.path.join(directory, key))
+        if os.path.dirname(path) != directory:
+            raise ValueError('Blob key "{}" is outside of store directory'.format(key))
+
+        return path
+
+    def put(self, data: memoryview) -> str:
+        os.makedirs(self.path, exist_ok=True)
+        key = uuid.uuid4().hex
+
+        # Blobs are written to a temporary file and renamed, so consumers never see a partial blob
+        path = self._path(key)
+        with open(path + '.tmp', 'wb') as f:
+            f.write(data)
+        os.replace(path + '.tmp', path)
+
+        return key
+
+    def get(self, key: str) -> memoryview:
+        with open(self._path(key), 'rb') as f:
+            if not os.fstat(f.fileno()).st_size:
+                return memoryview(b'')
+
+            return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def delete(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+
+def get_store() -> BlobStore:
+    """
+    Get the blob store defined in settings.
+
+    :return: Blob store.
+    """
+    global _store
+
+    if _store is None:
+        _store = symbol_by_name(settings.claim_check_store)(settings.claim_check_path)
+
+    return _store
+
+
+def _offload_value(value: Any, store: BlobStore) -> Any:
+    if isinstance(value, str):
+        if len(value) <= settings.claim_check_threshold:
+            return value
+
+        return {REFERENCE: store.put(memoryview(value.encode('utf-8'))), 'type': 'str'}
+
+    try:
+        view = memoryview(value)
+    except TypeError:
+        return value
+
+    if view.nbytes <= settings.claim_check_threshold:
+        return value
+
+    reference = {REFERENCE: store.put(view if view.c_contiguous else memoryview(view.tobytes())), 'type': 'buffer'}
+    if view.format != 'B' or view.ndim != 1:
+        reference.update(format=view.format, shape=list(view.shape))
+
+    return reference
+
+
+def offload(args: tuple=None, kwargs: dict=None) -> Tuple[tuple, dict]:
+    """
+    Replace task arguments larger than threshold by references to blobs in the store.
+
+    :param args: Task args.
+    :param kwargs: Task kwargs.
+    :return: Task args and kwargs.
+    """
+    store = get_store()
+    args = tuple(_offload_value(v, store) for v in args or ())
+    kwargs = {k: _offload_value(v, store) for k, v in (kwargs or {}).items()}
+    return args, kwargs
+
+
+def _resolve_reference(reference: Dict[str, Any], store: BlobStore) -> Any:
+    view = store.get(reference[REFERENCE])
+    if reference['type'] == 'str':
+        return str(view, 'utf-8')
+
+    if 'format' in reference:
+        try:
+            return view.cast(reference['format'], reference['shape'])
+        except (TypeError, ValueError):
+            logger.debug('Cannot cast claim check "%s" to "%s"', reference[REFERENCE], reference['format'])
+
+    return view
+
+
+def references(value: Any, keys: List[str]=None) -> List[str]:
+    """
+    Find keys of references in a value, including those nested in lists, tuples and dicts, without resolving them.
+
+    :param value: Value.
+    :param keys: List where keys are appended. A new one by default.
+    :return: Keys.
+    """
+    keys = [] if keys is None else keys
+    if isinstance(value, dict):
+        if isinstance(value.get(REFERENCE), str):
+            keys.append(value[REFERENCE])
+        else:
+            for v in value.values():
+                references(v, keys)
+    elif type(value) in (list, tuple):
+        for v in value:
+            references(v, keys)
+
+    return keys
+
+
+def _on_task_failure(sender=None, args=None, kwargs=None, **_):
+    """
+    Delete blobs of a task that failed without being retried, since no other execution will resolve them.
+    """
+    if not getattr(sender, '_claim_check', False):
+        return
+
+    store = get_store()
+    for key in references([args, kwargs]):
+        try:
+            store.delete(key)
+        except Exception:
+            logger.exception('Cannot delete claim check "%s" of failed task "%s"', key, sender.name)
+
+
+def resolve(value: Any, keys: List[str]=None) -> Any:
+    """
+    Replace references found in a value, including those nested in lists, tuples and dicts, by their blobs.
+
+    :param value: Value.
+    :param keys: List where keys of resolved blobs are appended.
+    :return: Resolved value.
+    """
+    if isinstance(value, dict):
+        if isinstance(value.get(REFERENCE), str):
+            if keys is not None:
+                keys.append(value[REFERENCE])
+
+            return _resolve_reference(value, get_store())
+
+        return {k: resolve(v, keys) for k, v in value.items()}
+
+    if type(value) in (list, tuple):
+        return type(value)(resolve(v, keys) for v in value)
+
+    return value
+
+
+def resolving(func: Callable) -> Callable:
+    """
+    Wrap a task function, so references in its arguments are resolved before calling it and their blobs are deleted
+    once it succeeds. Blobs are kept when it fails, so retries can resolve them again, and they are deleted once the
+    task fails without being retried.
+
+    :param func: Task function.
+    :return: Wrapped function.
+    """
+    signals.task_failure.connect(_on_task_failure, weak=False, dispatch_uid=__name__ + '.failure')
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        keys = []
+        result = func(*resolve(args, keys), **resolve(kwargs, keys))
+
+        store = get_store()
+        for key in keys:
+            store.delete(key)
+
+        return result
+
+    return wrapper
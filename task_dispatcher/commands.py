@@ -1,97 +1,322 @@
 # -*- coding: utf-8 -*-
-import itertools
+import json
 import logging
 import os
 from _socket import gethostname
 from importlib import import_module
 
-from celery import Celery
-from celery.bin.beat import beat as beat_bin
-from celery.bin.worker import worker as worker_bin
+from argparse import ArgumentParser
+from typing import Callable, List, Set
 from clinner.command import command
 from clinner.exceptions import ImproperlyConfigured
 from clinner.run import Main
-from flower.command import FlowerCommand
+from kombu.utils.imports import symbol_by_name
 
+from task_dispatcher import serializers
 from task_dispatcher.celery import app
+from task_dispatcher.groups import Supervisor, get_groups
+from task_dispatcher.lanes import get_lanes
+from task_dispatcher.partitions import parse_partitions, partition_queue
 from task_dispatcher.register import register
 from task_dispatcher.settings import settings
 
 logger = logging.getLogger(__name__)
 
-_worker_bin = worker_bin(app=Celery())
-_beat_bin = beat_bin(app=Celery())
-
 SHOW_JSON = 'json'
 SHOW_YAML = 'yaml'
 SHOW_CHOICES = (SHOW_JSON, SHOW_YAML)
 
 
-@command(args=_worker_bin.add_arguments, parser_opts={'help': 'Run a consumer.'})
+class _CommandParser(ArgumentParser):
+    """
+    Parser of a command run from the command line. Celery arguments are not added to these parsers but parsed by the
+    command itself, so Celery command line modules are only imported when a command that needs them is run.
+    """
+    def __init__(self, main, **kwargs):
+        super().__init__(**kwargs)
+
+
+def _add_worker_arguments(parser: ArgumentParser):
+    from celery import Celery
+    from celery.bin.worker import worker
+
+    worker(app=Celery(set_as_current=False)).add_arguments(parser)
+    parser.add_argument('--adaptive-autoscale', metavar='MAX,MIN',
+                        help='Scale the pool between MAX and MIN processes based on queue depth, task execution time '
+                             'and CPU load')
+    parser.add_argument('--partitions', metavar='PARTITIONS',
+                        help='Also consume the partition queues of given queues, as a comma separated list of '
+                             'partitions and ranges of partitions, e.g: 0-3,7')
+    parser.add_argument('--lanes', nargs='+', metavar='LANE',
+                        help='Consume from the queues of these lanes, using weighted fair queuing between them')
+    parser.add_argument('--async-concurrency', type=int, metavar='N',
+                        help='Run tasks in N threads of a single process, keeping up to N coroutines of async tasks in '
+                             'flight on its event loop')
+
+
+def _add_beat_arguments(parser: ArgumentParser):
+    from celery import Celery
+    from celery.bin.beat import beat
+
+    beat(app=Celery(set_as_current=False)).add_arguments(parser)
+
+
+def _celery_arguments(add_arguments: Callable[[ArgumentParser], None]) -> Callable[[ArgumentParser], None]:
+    """
+    Add Celery arguments to a command parser, unless the command is run from the command line and parses them itself.
+
+    :param add_arguments: Function that adds Celery arguments to a parser.
+    :return: Function that adds arguments to a command parser.
+    """
+    def arguments(parser: ArgumentParser):
+        if not isinstance(parser, _CommandParser):
+            parser.add_argument('-h', '--help', action='help', help='show this help message and exit')
+            add_arguments(parser)
+
+    return arguments
+
+
+def _parse_celery_options(add_arguments: Callable[[ArgumentParser], None], prog: str, args: tuple,
+                          kwargs: dict) -> dict:
+    """
+    Parse Celery arguments of a command, that are given as unknown arguments when run from the command line.
+
+    :param add_arguments: Function that adds Celery arguments to a parser.
+    :param prog: Command name.
+    :param args: Unknown arguments.
+    :param kwargs: Known arguments, that take precedence.
+    :return: Options.
+    """
+    parser = ArgumentParser(prog=prog)
+    add_arguments(parser)
+    options = vars(parser.parse_args(args))
+    options.update(kwargs)
+    return options
+
+
+def _worker_options(kwargs: dict) -> dict:
+    """
+    Complete worker options with Task dispatcher settings.
+
+    :param kwargs: Worker options.
+    :return: Worker options.
+    """
+    if settings.manifest:
+        # Tasks modules are imported the first time one of their tasks is received
+        register.load_manifest(settings.manifest)
+        app.conf.update(imports=(), include=())
+        kwargs['consumer_cls'] = kwargs.get('consumer_cls') or 'task_dispatcher.worker:Consumer'
+
+        # Stats must be allocated before the pool forks to be shared with worker processes
+        from task_dispatcher import stats
+
+        instrumented = [k for k, v in register.manifest.items() if v.get('stats')]
+        for name in instrumented:
+            stats.stats.register(name)
+
+        if instrumented:
+            stats.enable(port=settings.stats_port)
+
+    # Workers accept serializers declared by tasks, failing to start if a pickle serializer is not allowed
+    if settings.manifest:
+        declared = {v.get('serializer') for v in register.manifest.values()}
+    else:
+        app.loader.import_default_modules()
+        declared = {getattr(t, 'serializer', None) for t in app.tasks.values()}
+    serializers.accept(app, *sorted(s for s in declared if s))
+
+    # Limits of throttled tasks only apply to each process when their backend is kept in process memory
+    if settings.manifest:
+        throttled = {k for k, v in register.manifest.items() if v.get('throttled')}
+    else:
+        throttled = {k for k, v in list(register.consumers.items()) + list(register.producers.items()) if v.throttle}
+    if throttled and not getattr(symbol_by_name(settings.throttle_backend), 'shared', True):
+        logger.warning('Throttle backend "%s" is not shared by processes, so limits of tasks %s apply to each worker '
+                       'process instead of all workers', settings.throttle_backend, ', '.join(sorted(throttled)))
+
+    # Pool processes are recycled once their resident memory exceeds the budget, after finishing their current task
+    if not kwargs.get('max_memory_per_child') and settings.max_memory_per_child:
+        kwargs['max_memory_per_child'] = settings.max_memory_per_child
+
+    partitions = kwargs.pop('partitions', None)
+    if partitions:
+        queues = kwargs.get('queues') or []
+        queues = queues.split(',') if isinstance(queues, str) else list(queues)
+        kwargs['queues'] = queues + [partition_queue(q, i) for q in queues for i in parse_partitions(partitions)]
+
+    lanes = kwargs.pop('lanes', None)
+    if lanes:
+        queues = kwargs.get('queues') or []
+        queues = queues.split(',') if isinstance(queues, str) else list(queues)
+        kwargs['lanes'] = get_lanes(lanes)
+        kwargs['queues'] = queues + [l.queue for l in kwargs['lanes'] if l.queue not in queues]
+        kwargs['consumer_cls'] = kwargs.get('consumer_cls') or 'task_dispatcher.worker:Consumer'
+
+    async_concurrency = kwargs.pop('async_concurrency', None)
+    if async_concurrency:
+        kwargs['pool_cls'] = 'threads'
+        kwargs['concurrency'] = async_concurrency
+
+    adaptive_autoscale = kwargs.pop('adaptive_autoscale', None)
+    if adaptive_autoscale:
+        kwargs['autoscale'] = adaptive_autoscale
+        kwargs['autoscaler_cls'] = 'task_dispatcher.autoscale:Autoscaler'
+
+    return kwargs
+
+
+@command(args=_celery_arguments(_add_worker_arguments), parser_opts={'help': 'Run a consumer.', 'add_help': False})
 def consumer(*args, **kwargs):
     """
     Run a consumer process.
     """
+    kwargs = _parse_celery_options(_add_worker_arguments, 'consumer', args, kwargs)
     kwargs['queues'] = kwargs.get('queues') or ['consumer']
     kwargs['hostname'] = kwargs.get('hostname') or 'consumer@{}'.format(gethostname())
-    worker = app.Worker(**kwargs)
+    worker = app.Worker(**_worker_options(kwargs))
     worker.start()
     return worker.exitcode
 
 
-@command(args=_worker_bin.add_arguments, parser_opts={'help': 'Run a producer.'})
+@command(args=_celery_arguments(_add_worker_arguments), parser_opts={'help': 'Run a producer.', 'add_help': False})
 def producer(*args, **kwargs):
     """
     Run a producer process.
     """
+    kwargs = _parse_celery_options(_add_worker_arguments, 'producer', args, kwargs)
     kwargs['queues'] = kwargs.get('queues') or ['producer']
     kwargs['hostname'] = kwargs.get('hostname') or 'producer@{}'.format(gethostname())
-    worker = app.Worker(**kwargs)
+    worker = app.Worker(**_worker_options(kwargs))
     worker.start()
     return worker.exitcode
 
 
-@command(args=_beat_bin.add_arguments, parser_opts={'help': 'Run the scheduler.'})
+@command(args=((('groups',), {'nargs': '*', 'metavar': 'GROUP', 'help': 'Groups to run. All groups by default'}),),
+         parser_opts={'help': 'Run and supervise a consumer for each task group.'})
+def supervise(*args, **kwargs):
+    """
+    Run a consumer process for each task group defined in settings, restarting them when they exit.
+    """
+    groups = get_groups(kwargs.get('groups'))
+    if not groups:
+        raise ImproperlyConfigured('Task groups not defined')
+
+    return Supervisor(groups).run()
+
+
+def _tasks_in_workers(names: Set[str]) -> List[str]:
+    """
+    Get ids of tasks with given names that are scheduled, active or reserved in any worker. Workers are inspected
+    concurrently, so replies are only waited for once.
+
+    :param names: Tasks names.
+    :return: Tasks ids.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    inspect = app.control.inspect()
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        replies = executor.map(lambda method: method() or {}, (inspect.scheduled, inspect.active, inspect.reserved))
+        tasks = [t for reply in replies for worker_tasks in reply.values() for t in worker_tasks]
+
+    # Scheduled tasks are wrapped along with their ETA
+    tasks = (t.get('request', t) for t in tasks)
+    return sorted({t['id'] for t in tasks if t['name'] in names})
+
+
+@command(args=_celery_arguments(_add_beat_arguments), parser_opts={'help': 'Run the scheduler.', 'add_help': False})
 def scheduler(*args, **kwargs):
     """
     Run a scheduler process.
     """
+    kwargs = _parse_celery_options(_add_beat_arguments, 'scheduler', args, kwargs)
     beat = app.Beat(**kwargs)
 
-    # Remove old startup tasks
-    startup_tasks = [t[0] for t in settings.run_at_startup]
-    inspect = app.control.inspect()
-    tasks = itertools.chain(
-        (t for worker_tasks in (inspect.scheduled().values() if inspect.scheduled() else []) for t in worker_tasks),
-        (t for worker_tasks in (inspect.active().values() if inspect.active() else []) for t in worker_tasks),
-        (t for worker_tasks in (inspect.reserved().values() if inspect.reserved() else []) for t in worker_tasks),
-    )
-    tasks = {(t['id'], t['name']) for t in tasks}
-    app.control.revoke([id_ for id_, name in tasks if name in startup_tasks])
-
-    # Load startup tasks
-    for task_path, task_args, task_kwargs in settings.run_at_startup:
-        try:
-            task_module, task_name = task_path.rsplit('.', 1)
-            task = getattr(import_module(task_module), task_name)
-        except:
-            logger.error('Cannot load task "%s"', task_path)
-        else:
-            task.delay(*task_args, **task_kwargs)
+    if settings.run_at_startup:
+        # Remove old startup tasks
+        ids = _tasks_in_workers({t[0] for t in settings.run_at_startup})
+        if ids:
+            app.control.revoke(ids)
+
+        # Load startup tasks
+        with app.producer_or_acquire() as producer:
+            for task_path, task_args, task_kwargs in settings.run_at_startup:
+                try:
+                    task_module, task_name = task_path.rsplit('.', 1)
+                    task = getattr(import_module(task_module), task_name)
+                except:
+                    logger.error('Cannot load task "%s"', task_path)
+                else:
+                    task.apply_async(task_args, task_kwargs, producer=producer)
 
     return beat.run()
 
 
-@command(args=((('-f', '--format'), {'choices': SHOW_CHOICES, 'default': SHOW_YAML}),),
+@command(args=((('-f', '--format'), {'choices': SHOW_CHOICES, 'default': SHOW_YAML}),
+               (('--stats',), {'action': 'store_true', 'help': 'Show stats of tasks collected from workers'}),
+               (('-t', '--timeout'), {'type': float, 'default': 1.0, 'help': 'Seconds to wait for workers'}),
+               (('--manifest',), {'help': 'Import all tasks modules and write a tasks manifest to this file'}),
+               (('--queue',), {'help': 'Only show tasks of this queue'}),
+               (('--module',), {'help': 'Only show tasks of this module or package'}),
+               (('--tag',), {'help': 'Only show tasks with this tag'})),
          parser_opts={'help': 'Lists all producers and consumers registered.'})
 def show(*args, **kwargs):
     """
     Lists all producers and consumers registered.
     """
-    if kwargs.get('format') == SHOW_YAML:
-        print(register.to_yaml())
+    if kwargs.get('manifest'):
+        app.loader.import_default_modules()
+        register.dump_manifest(kwargs['manifest'], app.tasks)
+        return
+
+    if settings.manifest:
+        register.load_manifest(settings.manifest)
+
+    if kwargs.get('stats'):
+        from task_dispatcher import stats
+
+        replies = app.control.broadcast(stats.CONTROL_COMMAND, reply=True, timeout=kwargs.get('timeout', 1.0))
+        tasks_stats = stats.summary(stats.merge(r for reply in replies or [] for r in reply.values()))
+        if kwargs.get('format') == SHOW_YAML:
+            import yaml
+
+            print(yaml.dump(tasks_stats, default_flow_style=False))
+        else:
+            print(json.dumps(tasks_stats))
     else:
-        print(register.to_json())
+        filters = {k: kwargs[k] for k in ('queue', 'module', 'tag') if kwargs.get(k)}
+        if kwargs.get('format') == SHOW_YAML:
+            print(register.to_yaml(**filters))
+        else:
+            print(register.to_json(**filters))
+
+
+@command(args=((('-m', '--messages'), {'type': int, 'default': 10000, 'help': 'Messages sent in each pipeline'}),
+               (('-p', '--payload-sizes'), {'type': int, 'nargs': '+', 'default': [16, 1024, 65536],
+                                            'help': 'Payload sizes in bytes'}),
+               (('-c', '--concurrency'), {'type': int, 'nargs': '+', 'default': [1, 4],
+                                          'help': 'Number of consumers'}),
+               (('-z', '--serializers'), {'nargs': '+', 'default': ['json'], 'help': 'Serializers'}),
+               (('-o', '--output',), {'help': 'Output file'})),
+         parser_opts={'help': 'Run a throughput benchmark of producer-consumer pipelines.'})
+def bench(*args, **kwargs):
+    """
+    Run a throughput benchmark of producer-consumer pipelines using an in-memory broker and print results as JSON.
+    """
+    from task_dispatcher import bench as benchmark
+
+    results = json.dumps(benchmark.run(
+        messages=kwargs.get('messages', 10000),
+        payload_sizes=kwargs.get('payload_sizes', (16, 1024, 65536)),
+        concurrency=kwargs.get('concurrency', (1, 4)),
+        serializers=kwargs.get('serializers', ('json',)),
+    ), indent=2)
+
+    if kwargs.get('output'):
+        with open(kwargs['output'], 'w') as f:
+            f.write(results)
+    else:
+        print(results)
 
 
 @command(parser_opts={'help': 'Run Flower monitoring tool.'})
@@ -100,6 +325,8 @@ def flower(*args, **kwargs):
     Run Flower monitoring tool.
     """
     args = ('flower',) + args
+    from flower.command import FlowerCommand
+
     flower_cmd = FlowerCommand(app=app)
     flower_cmd.execute_from_commandline(argv=args)
 
@@ -112,6 +339,9 @@ class TaskDispatcherCommand(Main):
     description = 'Task dispatcher command that provides a common entry point for running the different processes as ' \
                   'well as some utilities.'
 
+    def parse_arguments(self, args=None, parser=None, parser_class=None):
+        return super().parse_arguments(args=args, parser=parser, parser_class=parser_class or _CommandParser)
+
     def inject_app_settings(self):
         if self.args.settings:
             os.environ['TASK_DISPATCHER_SETTINGS'] = self.args.settings
@@ -2,10 +2,23 @@
 import inspect
 from functools import partial
 from functools import update_wrapper
-from typing import Callable
+from typing import Callable, Iterable
 
+from celery import Task
+from celery.local import Proxy
+
+from task_dispatcher import claim_check, streaming
+from task_dispatcher import serializers  # noqa: registers serializers, so tasks can be declared with them
+from task_dispatcher.batches import BatchTask
 from task_dispatcher.celery import app
+from task_dispatcher.flow import flow_control
+from task_dispatcher.groups import group_of
+from task_dispatcher.lanes import lane_queue
+from task_dispatcher.partitions import partition, partition_queue
 from task_dispatcher.register import register
+from task_dispatcher.results import FireAndForgetResult
+from task_dispatcher.settings import settings
+from task_dispatcher.utils import is_method
 
 __all__ = ['producer', 'consumer']
 
@@ -37,6 +50,84 @@ class BaseDecorator(object):
         def foo(bar):
             pass
 
+        Tasks can be tagged, so they can be found in the register by tag:
+        @BaseDecorator(tags=('billing', 'nightly'))
+        def foo(bar):
+            pass
+
+        Tasks can be assigned to a priority lane, that routes them to a queue of that lane:
+        @BaseDecorator(lane='interactive')
+        def foo(bar):
+            pass
+
+        Tasks can be run in batches, buffering requests on the worker and calling the function once with a list of
+        items when *batch_size* items are buffered or every *flush_interval* seconds:
+        @BaseDecorator(batch_size=100, flush_interval=1.0)
+        def foo(items):
+            return [bar(i) for i in items]
+
+        Batches are only allowed for functions, not for class methods.
+
+        Coroutine functions are run on an event loop of the worker process, so many of them run concurrently when
+        consumed by a worker started with *--async-concurrency*:
+        @BaseDecorator
+        async def foo(url):
+            return await fetch(url)
+
+        Generator functions can stream each yielded item to a target consumer, checkpointing their position so they are
+        resumed if killed halfway. Messages are acknowledged late, so they are delivered again in that case:
+        @BaseDecorator(target=square, checkpoint_interval=1000)
+        def foo(*, stream_checkpoint=0):
+            yield from range(stream_checkpoint, 1000000)
+
+        Payloads can be serialized using any serializer registered in kombu, including msgpack, pickle5 and their
+        compressed variants, e.g: msgpack+zlib:
+        @BaseDecorator(serializer='pickle5')
+        def foo(array):
+            pass
+
+        Large arguments can be moved out of the message to a blob store, sending only a reference to them that is
+        resolved by the consumer:
+        @BaseDecorator(claim_check=True)
+        def foo(blob):
+            pass
+
+        Executions can be skipped when another one with the same key, computed from task arguments, ran within the last
+        *dedup_ttl* seconds:
+        @BaseDecorator(dedup_key=lambda bar: bar, dedup_ttl=60)
+        def foo(bar):
+            pass
+
+        Results of pure functions can be cached, so calling them again with the same arguments within *cache_ttl*
+        seconds returns the cached result:
+        @BaseDecorator(cache=True, cache_size=1024, cache_ttl=300)
+        def foo(bar):
+            return bar ** 2
+
+        Tasks can be partitioned, routing each message to one of *partitions* queues by a consistent hash of a key
+        computed from its arguments, so messages with the same key are consumed by the same workers:
+        @BaseDecorator(partition_key=lambda tenant, item: tenant, partitions=8)
+        def foo(tenant, item):
+            pass
+
+        Tasks can be rate limited and capped in concurrency across all workers. Executions over those limits are
+        deferred:
+        @BaseDecorator(max_rate='100/m', max_concurrency=10)
+        def foo(bar):
+            pass
+
+        Tasks whose result is never read can skip the result backend and state tracking. Waiting for the result of
+        these tasks raises an error:
+        @BaseDecorator(fire_and_forget=True)
+        def foo(bar):
+            pass
+
+        Instrumentation of queue wait time, execution time, payload size and retries can be enabled for all tasks
+        through settings or for a single task:
+        @BaseDecorator(stats=True)
+        def foo(bar):
+            pass
+
         For last, is possible to decorate functions or class methods:
         class Foo:
             @BaseDecorator
@@ -52,7 +143,15 @@ class BaseDecorator(object):
         self.args = args
         self.kwargs = kwargs
         self.task = None
-        self.instance = None
+        self.stats = False
+        self.fire_and_forget = False
+        self.claim_check = False
+        self.dedup_key = None
+        self.cache = False
+        self.throttle = None
+        self.partition_key = None
+        self.partitions = None
+        self.tags = ()
 
         if func is not None:
             # Full initialization decorator
@@ -62,45 +161,311 @@ class BaseDecorator(object):
         # Default name as the function's fully qualified name
         kwargs['name'] = kwargs.get('name', '.'.join([func.__module__, func.__qualname__]))
 
+        # Tags of the task, to find it in the register
+        tags = kwargs.pop('tags', ())
+        self.tags = (tags,) if isinstance(tags, str) else tuple(tags)
+
+        # Lanes route messages to a queue of the lane
+        lane = kwargs.pop('lane', None)
+        if lane is not None:
+            queue = getattr(self, 'default_queue', app.conf.task_default_queue)
+            kwargs['queue'] = kwargs.get('queue', lane_queue(lane, queue))
+
+        # Tasks of a group are routed to the queue of the group
+        if 'queue' not in kwargs:
+            group = group_of(kwargs['name'])
+            if group is not None:
+                kwargs['queue'] = group.queue
+
+        # Partitioned tasks are routed to a partition queue by a key of their arguments
+        self.partition_key = kwargs.pop('partition_key', None)
+        self.partitions = kwargs.pop('partitions', None)
+        if self.partition_key is not None:
+            if not self.partitions or self.partitions < 1:
+                raise ValueError('Partitioned tasks must have a positive number of partitions')
+
+            if lane is not None:
+                raise ValueError('Partitioned tasks cannot be assigned to a lane')
+
         # Default queue
         if hasattr(self, 'default_queue'):
             kwargs['queue'] = kwargs.get('queue', self.default_queue)
 
-        self.task = app.task(*args, **kwargs)(func)
+        # Batched tasks
+        if 'batch_size' in kwargs or 'flush_interval' in kwargs:
+            if is_method(func):
+                raise ValueError('Methods cannot be run in batches')
+
+            kwargs['base'] = kwargs.get('base', BatchTask)
+
+        # Generators stream their items to a target consumer
+        target = kwargs.pop('target', None)
+        checkpoint_interval = kwargs.pop('checkpoint_interval', settings.checkpoint_interval)
+        if target is not None:
+            if not inspect.isgeneratorfunction(func):
+                raise ValueError('Only generator functions can have a target')
+
+            kwargs.setdefault('acks_late', True)
+            kwargs.setdefault('reject_on_worker_lost', True)
+            func = streaming.dispatching(func, target, checkpoint_interval)
+
+        # Coroutines are run on the event loop of worker process
+        if inspect.iscoroutinefunction(func):
+            from task_dispatcher import aio
+
+            func = aio.run_async(func)
+
+        # Fire and forget tasks skip result backend and state tracking, and are acknowledged as soon as received
+        self.fire_and_forget = kwargs.pop('fire_and_forget', settings.fire_and_forget)
+        if self.fire_and_forget:
+            kwargs.update(ignore_result=True, store_errors_even_if_ignored=False, track_started=False, acks_late=False)
+
+        # Memoization, counting hits and misses in task stats
+        self.cache = kwargs.pop('cache', False)
+        cache_size = kwargs.pop('cache_size', settings.cache_size)
+        cache_ttl = kwargs.pop('cache_ttl', settings.cache_ttl)
+        if self.cache:
+            from task_dispatcher import memoize, stats
+
+            stats.enable(port=settings.stats_port)
+            func = memoize.memoizing(func, kwargs['name'], cache_size, cache_ttl, stats.stats.register(kwargs['name']))
+
+        # Deduplication, counting hits and misses in task stats
+        self.dedup_key = kwargs.pop('dedup_key', None)
+        dedup_ttl = kwargs.pop('dedup_ttl', settings.dedup_ttl)
+        if self.dedup_key is not None:
+            from task_dispatcher import dedup, stats
+
+            stats.enable(port=settings.stats_port)
+            func = dedup.deduplicating(func, kwargs['name'], self.dedup_key, dedup_ttl,
+                                       stats.stats.register(kwargs['name']))
+
+        # Large arguments are offloaded by producer and resolved by consumer
+        self.claim_check = kwargs.pop('claim_check', settings.claim_check)
+        if self.claim_check:
+            func = claim_check.resolving(func)
+
+        # Instrumentation
+        self.stats = kwargs.pop('stats', settings.stats)
+        if self.stats:
+            from task_dispatcher import stats
+
+            stats.enable(port=settings.stats_port)
+            func = stats.instrument(func, stats.stats.register(kwargs['name']))
+
+        # Cluster-wide throttling, deferring executions before they are instrumented
+        max_rate = kwargs.pop('max_rate', None)
+        max_concurrency = kwargs.pop('max_concurrency', None)
+        if max_rate or max_concurrency:
+            from task_dispatcher import stats, throttle
+
+            stats.enable(port=settings.stats_port)
+            self.throttle = throttle.Throttle(kwargs['name'], max_rate, max_concurrency)
+            func = throttle.throttling(func, self.throttle, stats.stats.register(kwargs['name']))
+
+        self.task = self._create_task(func, *args, **kwargs)
+        if self.claim_check:
+            # Marks the task so blobs of its arguments are deleted once it fails without being retried
+            self.task._claim_check = True
+
         update_wrapper(self, func)
 
+        self._register()
+
+    def _create_task(self, func: Callable, *args, **kwargs) -> Task:
+        """
+        Hook called to create the Celery task of the decorated function.
+
+        :param func: Wrapped function.
+        :param args: Celery task args.
+        :param kwargs: Celery task kwargs.
+        :return: Celery task.
+        """
+        return app.task(*args, **kwargs)(func)
+
+    def _register(self):
+        """
+        Hook called to add the decorated task to the task register.
+        """
         register.register(self)
 
     def __get__(self, instance, owner=None):
         """
-        Make it works with functions and methods.
+        Make it works with functions and methods. When accessed through an instance, a lightweight wrapper bound to
+        that instance is returned, so the decorator itself keeps no state of the instance and can be used from any
+        thread or greenlet.
         """
-        self.instance = instance
-        return self
+        if instance is None:
+            return self
+
+        return BoundDecorator(self, instance)
+
+    def _before_publish(self, options: dict):
+        """
+        Hook called before sending each task message.
+
+        :param options: Celery task execution options.
+        """
+        pass
+
+    def _route(self, args: tuple, kwargs: dict, options: dict) -> dict:
+        """
+        Route a partitioned task message to the queue of the partition of its key, unless a queue is given.
+
+        :param args: Task args.
+        :param kwargs: Task kwargs.
+        :param options: Celery task execution options.
+        :return: Celery task execution options of the message.
+        """
+        if self.partition_key is None or options.get('queue'):
+            return options
+
+        key = self.partition_key(*(args or ()), **(kwargs or {}))
+        return dict(options, queue=partition_queue(self.queue, partition(key, self.partitions)))
+
+    def _apply_async(self, instance, args: tuple, kwargs: dict, options: dict):
+        """
+        Send a task message, giving the instance as first argument of methods.
+
+        :param instance: Instance of a method or None.
+        :param args: Task args.
+        :param kwargs: Task kwargs.
+        :param options: Celery task execution options.
+        :return: Async result.
+        """
+        # Local engine runs the task in a pool of current process, without broker nor serialization
+        if settings.engine == 'local':
+            from task_dispatcher import local
+
+            if instance is not None:
+                args = (instance,) + tuple(args or ())
+
+            return local.get_engine().apply_async(self.task, args, kwargs, **options)
+
+        options = self._route(args, kwargs, options)
+        self._before_publish(options)
+        if self.claim_check:
+            args, kwargs = claim_check.offload(args, kwargs)
+
+        if instance is not None:
+            args = (instance,) + tuple(args or ())
+
+        result = self.task.apply_async(args, kwargs, **options)
+        if self.fire_and_forget:
+            result = FireAndForgetResult(result.id, app=self.task.app)
+
+        return result
+
+    def _apply_many(self, instance, iterable: Iterable[tuple], options: dict) -> int:
+        """
+        Send a task message for each tuple of arguments, giving the instance as first argument of methods.
+
+        :param instance: Instance of a method or None.
+        :param iterable: Iterable of task arguments tuples.
+        :param options: Celery task execution options.
+        :return: Number of messages sent.
+        """
+        count = 0
+        if settings.engine == 'local':
+            from task_dispatcher import local
+
+            engine = local.get_engine()
+            for args in iterable:
+                if instance is not None:
+                    args = (instance,) + tuple(args)
+
+                engine.apply_async(self.task, args, **options)
+                count += 1
+
+            return count
+
+        with self.task.app.producer_or_acquire() as producer:
+            for args in iterable:
+                message_options = self._route(args, None, options)
+                self._before_publish(message_options)
+                if self.claim_check:
+                    args, _ = claim_check.offload(args)
+
+                if instance is not None:
+                    args = (instance,) + tuple(args)
+
+                self.task.apply_async(args, producer=producer, **message_options)
+                count += 1
+
+        return count
+
+    def apply_async(self, args: tuple=None, kwargs: dict=None, **options):
+        """
+        Send a task message, as calling Celery task *apply_async*.
+
+        :param args: Task args.
+        :param kwargs: Task kwargs.
+        :param options: Celery task execution options.
+        :return: Async result.
+        """
+        return self._apply_async(None, args, kwargs, options)
+
+    def delay(self, *args, **kwargs):
+        """
+        Send a task message, as calling Celery task *delay*.
+
+        :return: Async result.
+        """
+        return self._apply_async(None, args, kwargs, {})
+
+    def apply_many(self, iterable: Iterable[tuple], **options) -> int:
+        """
+        Send a task message for each tuple of arguments in given iterable, as calling *apply_async(args, **options)*
+        for each one of them.
+
+        The iterable is consumed lazily, so generators can be used to produce millions of tasks keeping a flat memory
+        footprint. All messages are published through a single producer acquired from the pool and publishing is
+        synchronous, so the iterable is only advanced as fast as the broker accepts messages.
+
+        :param iterable: Iterable of task arguments tuples.
+        :param options: Celery task execution options.
+        :return: Number of messages sent.
+        """
+        return self._apply_many(None, iterable, options)
+
+    def delay_many(self, iterable: Iterable) -> int:
+        """
+        Send a task message for each item in given iterable, as calling *delay(item)* for each one of them. Check
+        *apply_many* for further details.
+
+        :param iterable: Iterable of items.
+        :return: Number of messages sent.
+        """
+        return self.apply_many((i,) for i in iterable)
 
     def __getattr__(self, item):
         """
-        Make this decorator a simple proxy for task instance.
+        Make this decorator a simple proxy for task instance. Methods of the task class and the task name are cached in
+        the decorator on first access, so later accesses are plain attribute lookups. Other attributes, such as the rate
+        limit or the current request, can change during the life of the task, so they are looked up on every access.
         """
         # If looking for an unknown attr, delegates it to task __getattr__
-        if self.task:
-            if self.instance and inspect.ismethod(getattr(self.task, item)):
-                return partial(getattr(self.task, item), self.instance)
-            else:
-                return getattr(self.task, item)
-        else:
-            raise AttributeError
+        task = self.__dict__.get('task')
+        if task is None:
+            raise AttributeError(item)
+
+        # Lazy tasks are resolved, so properties are looked up in the task class instead of in the proxy class
+        if isinstance(task, Proxy):
+            task = task._get_current_object()
+
+        value = getattr(task, item)
+        if item == 'name' or (inspect.ismethod(value) and value.__self__ is task and item not in vars(task)):
+            self.__dict__[item] = value
+
+        return value
 
     def __call__(self, *args, **kwargs):
         """
         Redirect calls to task instance. If decorator is not fully initialized, initialize it.
         """
-        if self.task:
+        if self.task is not None:
             # Decorator behavior
-            if self.instance:
-                return self.task(self.instance, *args, **kwargs)
-            else:
-                return self.task(*args, **kwargs)
+            return self.task(*args, **kwargs)
         else:
             # Decorator is not initialized and now is giving the function to be decorated
             if len(args) == 1 and len(kwargs) == 0 and callable(args[0]):
@@ -110,6 +475,78 @@ class BaseDecorator(object):
                 raise ValueError('Decorator is not initialized')
 
 
+class BoundDecorator(object):
+    """
+    Decorated method bound to an instance, that gives the instance as first argument of calls, messages and task
+    methods. A new one is created on each access to the method through an instance, same as Python bound methods.
+    """
+    __slots__ = ('decorator', 'instance')
+
+    def __init__(self, decorator: BaseDecorator, instance):
+        """
+        Decorated method bound to an instance.
+
+        :param decorator: Decorator of the method.
+        :param instance: Instance.
+        """
+        self.decorator = decorator
+        self.instance = instance
+
+    def apply_async(self, args: tuple=None, kwargs: dict=None, **options):
+        """
+        Send a task message, as calling Celery task *apply_async*.
+
+        :param args: Task args.
+        :param kwargs: Task kwargs.
+        :param options: Celery task execution options.
+        :return: Async result.
+        """
+        return self.decorator._apply_async(self.instance, args, kwargs, options)
+
+    def delay(self, *args, **kwargs):
+        """
+        Send a task message, as calling Celery task *delay*.
+
+        :return: Async result.
+        """
+        return self.decorator._apply_async(self.instance, args, kwargs, {})
+
+    def apply_many(self, iterable: Iterable[tuple], **options) -> int:
+        """
+        Send a task message for each tuple of arguments in given iterable. Check *BaseDecorator.apply_many*.
+
+        :param iterable: Iterable of task arguments tuples.
+        :param options: Celery task execution options.
+        :return: Number of messages sent.
+        """
+        return self.decorator._apply_many(self.instance, iterable, options)
+
+    def delay_many(self, iterable: Iterable) -> int:
+        """
+        Send a task message for each item in given iterable. Check *BaseDecorator.delay_many*.
+
+        :param iterable: Iterable of items.
+        :return: Number of messages sent.
+        """
+        return self.decorator._apply_many(self.instance, ((i,) for i in iterable), {})
+
+    def __getattr__(self, item):
+        """
+        Proxy for decorator and task attributes, binding task methods to the instance.
+        """
+        value = getattr(self.decorator, item)
+        if inspect.ismethod(value) and isinstance(value.__self__, Task):
+            return partial(value, self.instance)
+
+        return value
+
+    def __call__(self, *args, **kwargs):
+        """
+        Call the task with the instance as first argument.
+        """
+        return self.decorator.task(self.instance, *args, **kwargs)
+
+
 class producer(BaseDecorator):  # noqa
     """
     Decorator that creates a Celery task of given function or class method and register it. This tasks acts as a
@@ -122,5 +559,11 @@ class consumer(BaseDecorator):  # noqa
     """
     Decorator that creates a Celery task of given function or class method and register it. This tasks acts as a
     consumer task.
+
+    Sending messages of a consumer task is paused while its queue is over the high watermark defined in flow control
+    settings.
     """
     default_queue = 'consumer'
+
+    def _before_publish(self, options: dict):
+        flow_control.wait(self.name, options.get('queue') or getattr(self, 'queue', None))
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+Deduplication of task executions.
+
+A key is computed from the arguments of each execution and, if the same key ran within the last *ttl* seconds, the
+execution is skipped. Keys are kept in a bounded in-process LRU cache, so only executions of the same process are
+deduplicated unless a key store shared by all workers is set, such as the SQLite store shared by workers of a host.
+"""
+import logging
+import os
+import tempfile
+import time
+from typing import Callable, Optional
+
+from celery import current_task
+from kombu.utils.imports import symbol_by_name
+
+from task_dispatcher.cache import LRUCache
+from task_dispatcher.settings import settings
+from task_dispatcher.sqlite import SQLiteDatabase
+from task_dispatcher.stats import TaskStats
+from task_dispatcher.utils import wraps
+
+__all__ = ['KeyCache', 'KeyStore', 'SQLiteKeyStore', 'get_key_store', 'deduplicating']
+
+logger = logging.getLogger(__name__)
+
+_key_store = None
+
+
+class KeyCache(LRUCache):
+    """
+    Bounded cache of keys that expire after a fixed time. When full, least recently used keys are evicted first.
+    """
+    def __init__(self, maxsize: int=None, ttl: float=None):
+        """
+        Bounded cache of keys that expire after a fixed time.
+
+        :param maxsize: Maximum number of keys. Dedup maxsize setting by default.
+        :param ttl: Seconds that a key is kept. Dedup TTL setting by default.
+        """
+        super().__init__(maxsize if maxsize is not None else settings.dedup_maxsize,
+                         ttl if ttl is not None else settings.dedup_ttl)
+
+
+class KeyStore:
+    """
+    Store of keys shared by all workers. It is created with *dedup_path* setting as only argument.
+    """
+    def add(self, key: str, ttl: float) -> bool:
+        """
+        Atomically add a key unless it is already stored.
+
+        :param key: Key.
+        :param ttl: Seconds that the key is kept.
+        :return: True if key was added.
+        """
+        raise NotImplementedError
+
+    def discard(self, key: str):
+        """
+        Remove a key, if stored.
+
+        :param key: Key.
+        """
+        raise NotImplementedError
+
+
+class SQLiteKeyStore(SQLiteDatabase, KeyStore):
+    """
+    Key store kept in a SQLite database, shared by all workers of a host or of hosts sharing a filesystem that supports
+    file locking.
+    """
+    schema = (
+        'CREATE TABLE IF NOT EXISTS keys (key TEXT PRIMARY KEY, expires REAL NOT NULL)',
+        'CREATE INDEX IF NOT EXISTS keys_expires ON keys (expires)',
+    )
+
+    def __init__(self, path: str=None):
+        """
+        Key store kept in a SQLite database.
+
+        :param path: Database path. A task_dispatcher/dedup.db file in system temp directory by default.
+        """
+        super().__init__(path or os.path.join(tempfile.gettempdir(), 'task_dispatcher', 'dedup.db'))
+
+    def add(self, key: str, ttl: float) -> bool:
+        # Wall clock is used, since keys are shared between processes
+        now = time.time()
+
+        def add(connection):
+            connection.execute('DELETE FROM keys WHERE expires <= ?', (now,))
+            return connection.execute('INSERT OR IGNORE INTO keys (key, expires) VALUES (?, ?)',
+                                      (key, now + ttl)).rowcount == 1
+
+        return self._transaction(add)
+
+    def discard(self, key: str):
+        self._transaction(lambda c: c.execute('DELETE FROM keys WHERE key = ?', (key,)))
+
+
+def get_key_store() -> Optional[KeyStore]:
+    """
+    Get the shared key store defined in settings.
+
+    :return: Key store or None if not defined.
+    """
+    global _key_store
+
+    if _key_store is None and settings.dedup_backend:
+        _key_store = symbol_by_name(settings.dedup_backend)(settings.dedup_path)
+
+    return _key_store
+
+
+def deduplicating(func: Callable, name: str, key: Callable, ttl: float, task_stats: TaskStats) -> Callable:
+    """
+    Wrap a task function, so it is not run again with arguments that give the same key until *ttl* seconds have
+    passed. Keys of failed executions are removed, so retries are run.
+
+    :param func: Task function.
+    :param name: Task name, used as namespace of keys.
+    :param key: Function that computes a key from task arguments.
+    :param ttl: Seconds that a key is kept.
+    :param task_stats: Task stats where hits and misses are counted.
+    :return: Wrapped function.
+    """
+    cache = KeyCache(ttl=ttl)
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        request = current_task.request if current_task else None
+        if request is None or request.called_directly:
+            return func(*args, **kwargs)
+
+        dedup_key = '{}:{}'.format(name, key(*args, **kwargs))
+        key_store = get_key_store()
+        if not cache.add(dedup_key) or (key_store is not None and not key_store.add(dedup_key, ttl)):
+            logger.debug('Skipping task "%s" with duplicated key "%s"', name, dedup_key)
+            task_stats.increment('dedup_hits_total')
+            return None
+
+        task_stats.increment('dedup_misses_total')
+        try:
+            return func(*args, **kwargs)
+        except BaseException:
+            cache.discard(dedup_key)
+            if key_store is not None:
+                key_store.discard(dedup_key)
+            raise
+
+    return wrapper
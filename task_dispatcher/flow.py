@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+Producer flow control.
+
+Publishing a consumer task is paused while the backlog of its queue is over a high watermark, and resumed once it drops
+below a low watermark. Queue depths are cached for *flow_control_interval* seconds, so checking them before each
+publish does not hit the broker.
+"""
+import logging
+import threading
+import time
+from typing import NamedTuple, Optional
+
+from celery import Celery, current_task
+
+from task_dispatcher.queues import QueueDepth
+from task_dispatcher.settings import settings
+
+__all__ = ['FlowControl', 'Watermarks', 'flow_control', 'MODE_BLOCK', 'MODE_RESCHEDULE']
+
+logger = logging.getLogger(__name__)
+
+#: Block the caller until the backlog drops below the low watermark.
+MODE_BLOCK = 'block'
+
+#: Retry the producer task that is publishing, after the refresh interval.
+MODE_RESCHEDULE = 'reschedule'
+
+Watermarks = NamedTuple('Watermarks', [('high', int), ('low', int), ('mode', str)])
+
+
+class FlowControl:
+    """
+    Flow control of messages published to consumer queues.
+    """
+    def __init__(self, app: Celery=None):
+        """
+        Flow control of messages published to consumer queues.
+
+        :param app: Celery app. Task dispatcher app by default.
+        """
+        self._app = app
+        self._queue_depth = None
+        self._lock = threading.Lock()
+        self._paused = set()
+
+    @property
+    def queue_depth(self) -> QueueDepth:
+        if self._queue_depth is None:
+            from task_dispatcher.celery import app
+
+            self._queue_depth = QueueDepth(self._app or app, ttl=settings.flow_control_interval)
+
+        return self._queue_depth
+
+    @staticmethod
+    def watermarks(task_name: str, queue: str) -> Optional[Watermarks]:
+        """
+        Get watermarks defined for a task or, if not defined, for its queue.
+
+        :param task_name: Task name.
+        :param queue: Queue name.
+        :return: Watermarks or None if flow control is disabled for that task.
+        """
+        config = settings.flow_control.get(task_name) or settings.flow_control.get(queue)
+        if not config:
+            return None
+
+        return Watermarks(config['high'], config.get('low', config['high']), config.get('mode', MODE_BLOCK))
+
+    def check(self, queue: str, watermarks: Watermarks) -> bool:
+        """
+        Check whether messages can be published to a queue. Queue is paused when its depth reaches the high watermark
+        and resumed when it drops to the low watermark.
+
+        :param queue: Queue name.
+        :param watermarks: Watermarks.
+        :return: True if messages can be published.
+        """
+        depth = self.queue_depth.get(queue)
+
+        with self._lock:
+            if queue in self._paused and depth <= watermarks.low:
+                logger.info('Resuming publishing to queue "%s", %d messages pending', queue, depth)
+                self._paused.discard(queue)
+            elif queue not in self._paused and depth >= watermarks.high:
+                logger.info('Pausing publishing to queue "%s", %d messages pending', queue, depth)
+                self._paused.add(queue)
+
+            return queue not in self._paused
+
+    def wait(self, task_name: str, queue: str):
+        """
+        Wait until a message of given task can be published. Depending on the mode, the caller is blocked or, if it
+        is running inside a task, that task is retried after the refresh interval.
+
+        :param task_name: Task name.
+        :param queue: Queue name.
+        :raise Retry: Task that is publishing is rescheduled.
+        """
+        watermarks = self.watermarks(task_name, queue)
+        if watermarks is None:
+            return
+
+        while not self.check(queue, watermarks):
+            task = current_task
+            if watermarks.mode == MODE_RESCHEDULE and task and not task.request.called_directly:
+                raise task.retry(countdown=settings.flow_control_interval)
+
+            time.sleep(settings.flow_control_interval)
+
+
+flow_control = FlowControl()
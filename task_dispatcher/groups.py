@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+Task groups.
+
+Tasks are grouped by patterns of their names, and each group is routed to its own queue, *group.<name>*, so a worker
+can be run for each group with a pool sized for its tasks: pool type, concurrency, prefetch, and maximum memory or tasks
+of each pool process before it is recycled. A supervisor runs and restarts those workers on the local node.
+"""
+import fnmatch
+import logging
+import signal
+import subprocess
+import sys
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from task_dispatcher.settings import settings
+
+__all__ = ['Group', 'group_queue', 'get_groups', 'group_of', 'worker_argv', 'Supervisor']
+
+logger = logging.getLogger(__name__)
+
+Group = NamedTuple('Group', [('name', str), ('tasks', List[str]), ('queue', str), ('pool', Optional[str]),
+                             ('concurrency', Optional[int]), ('prefetch', Optional[int]),
+                             ('max_memory_per_child', Optional[int]), ('max_tasks_per_child', Optional[int])])
+
+
+def group_queue(name: str) -> str:
+    """
+    Get the queue of a group.
+
+    :param name: Group name.
+    :return: Queue name.
+    """
+    return 'group.{}'.format(name)
+
+
+def get_groups(names: Iterable[str]=None) -> List[Group]:
+    """
+    Get groups defined in settings.
+
+    :param names: Groups names. All groups by default.
+    :return: Groups.
+    :raise ValueError: Group is not defined.
+    """
+    names = list(names) if names else None
+    unknown = set(names or ()) - set(settings.groups)
+    if unknown:
+        raise ValueError('Groups not defined: {}'.format(', '.join(sorted(unknown))))
+
+    return [
+        Group(name, list(config.get('tasks', [])), config.get('queue') or group_queue(name), config.get('pool'),
+              config.get('concurrency'), config.get('prefetch'), config.get('max_memory_per_child'),
+              config.get('max_tasks_per_child'))
+        for name, config in settings.groups.items() if not names or name in names
+    ]
+
+
+def group_of(task_name: str) -> Optional[Group]:
+    """
+    Get the group of a task, which is the first group with a pattern matching the task name.
+
+    :param task_name: Task name.
+    :return: Group or None if task is not in any group.
+    """
+    for group in get_groups():
+        if any(fnmatch.fnmatchcase(task_name, pattern) for pattern in group.tasks):
+            return group
+
+    return None
+
+
+def worker_argv(group: Group) -> List[str]:
+    """
+    Get the command line of a consumer worker for a group.
+
+    :param group: Group.
+    :return: Command line arguments.
+    """
+    argv = [sys.executable, '-m', 'task_dispatcher', 'consumer', '-Q', group.queue, '-n', '{}@%h'.format(group.name)]
+    options = (('-P', group.pool), ('-c', group.concurrency), ('--prefetch-multiplier', group.prefetch),
+               ('--max-memory-per-child', group.max_memory_per_child),
+               ('--max-tasks-per-child', group.max_tasks_per_child))
+    for option, value in options:
+        if value is not None:
+            argv += [option, str(value)]
+
+    return argv
+
+
+class Supervisor:
+    """
+    Supervisor that runs a worker process for each group and restarts workers that exit, waiting an exponential
+    backoff between restarts of workers that keep failing.
+    """
+    def __init__(self, groups: List[Group]):
+        """
+        Supervisor that runs a worker process for each group.
+
+        :param groups: Groups.
+        """
+        self.groups = groups
+        self.processes = {}  # type: Dict[str, subprocess.Popen]
+        self._started = {}  # type: Dict[str, float]
+        self._failures = {}  # type: Dict[str, int]
+        self._restart_at = {}  # type: Dict[str, float]
+        self._stopping = False
+
+    def start(self, group: Group):
+        """
+        Start the worker of a group.
+
+        :param group: Group.
+        """
+        argv = worker_argv(group)
+        logger.info('Starting worker of group "%s": %s', group.name, ' '.join(argv))
+        self.processes[group.name] = subprocess.Popen(argv)
+        self._started[group.name] = time.monotonic()
+
+    def check(self):
+        """
+        Restart workers that exited, once their backoff has elapsed. Workers that ran for longer than the maximum
+        backoff are considered healthy, so their backoff is reset.
+        """
+        now = time.monotonic()
+        for group in self.groups:
+            process = self.processes.get(group.name)
+            if process is None or self._stopping:
+                continue
+
+            if process.poll() is None:
+                if now - self._started[group.name] >= settings.supervise_max_backoff:
+                    self._failures[group.name] = 0
+                continue
+
+            if group.name not in self._restart_at:
+                failures = self._failures.get(group.name, 0) + 1
+                self._failures[group.name] = failures
+                backoff = min(settings.supervise_max_backoff, settings.supervise_interval * 2 ** (failures - 1))
+                logger.warning('Worker of group "%s" exited with code %s, restarting in %.1f seconds', group.name,
+                               process.returncode, backoff)
+                self._restart_at[group.name] = now + backoff
+
+            if now >= self._restart_at[group.name]:
+                del self._restart_at[group.name]
+                self.start(group)
+
+    def stop(self, signum: int=None, frame=None):
+        """
+        Stop all workers, forwarding the signal received so they shut down gracefully.
+
+        :param signum: Signal number. SIGTERM by default.
+        :param frame: Current stack frame.
+        """
+        self._stopping = True
+        for process in self.processes.values():
+            if process.poll() is None:
+                process.send_signal(signum or signal.SIGTERM)
+
+    def run(self) -> int:
+        """
+        Run workers of all groups until a termination signal is received, and wait for them to exit.
+
+        :return: Exit code.
+        """
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        for group in self.groups:
+            self.start(group)
+
+        while not self._stopping:
+            time.sleep(settings.supervise_interval)
+            self.check()
+
+        for process in self.processes.values():
+            process.wait()
+
+        return 0
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+Priority lanes.
+
+Consumers declare a lane, that routes their messages to a queue of that lane. A worker consuming from several lanes
+hands requests waiting for a pool process to the pool using smooth weighted round robin between lanes, so a lane with
+weight 10 gets ten processes for each one given to a lane with weight 1 while both have requests waiting, and a lane
+stops being consumed from the broker while it has *prefetch* requests waiting in the worker.
+"""
+import logging
+from collections import deque
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional
+
+from task_dispatcher.settings import settings
+
+__all__ = ['Lane', 'LaneQueue', 'lane_queue', 'get_lanes']
+
+logger = logging.getLogger(__name__)
+
+Lane = NamedTuple('Lane', [('name', str), ('queue', str), ('weight', int), ('prefetch', Optional[int])])
+
+
+def lane_queue(lane: str, queue: str='consumer') -> str:
+    """
+    Get the queue of a lane.
+
+    :param lane: Lane name.
+    :param queue: Base queue name.
+    :return: Queue name.
+    """
+    return '{}.{}'.format(queue, lane)
+
+
+def get_lanes(names: Iterable[str], queue: str='consumer') -> List[Lane]:
+    """
+    Get lanes with weight and prefetch defined in settings. Lanes not defined have weight 1 and unbounded prefetch.
+
+    :param names: Lanes names.
+    :param queue: Base queue name.
+    :return: Lanes.
+    """
+    lanes = []
+    for name in names:
+        config = settings.lanes.get(name, {})
+        lanes.append(Lane(name, lane_queue(name, queue), config.get('weight', 1), config.get('prefetch')))
+
+    return lanes
+
+
+class LaneQueue:
+    """
+    Weighted fair queue of requests waiting for a pool process. It replaces the FIFO queue of waiters of the pool
+    semaphore, whose waiters are tuples of callback, args and kwargs where first arg is the request.
+    """
+    def __init__(self, lanes: List[Lane], on_pause: Callable[[str], None]=None,
+                 on_resume: Callable[[str], None]=None):
+        """
+        Weighted fair queue of requests waiting for a pool process.
+
+        :param lanes: Lanes. Requests from other queues go to a default lane with weight 1.
+        :param on_pause: Called with lane queue when the lane reaches its prefetch.
+        :param on_resume: Called with lane queue when the lane drains below half its prefetch.
+        """
+        self.lanes = {l.queue: l for l in lanes}
+        self.on_pause = on_pause
+        self.on_resume = on_resume
+        self._waiting = {q: deque() for q in self.lanes}  # type: Dict[Optional[str], deque]
+        self._waiting[None] = deque()
+        self._current = {q: 0 for q in self._waiting}
+        self._paused = set()
+
+    def __len__(self):
+        return sum(len(w) for w in self._waiting.values())
+
+    def _weight(self, queue: Optional[str]) -> int:
+        return self.lanes[queue].weight if queue in self.lanes else 1
+
+    def append(self, waiter: tuple):
+        """
+        Add a waiter to the lane of its request.
+
+        :param waiter: Callback, args and kwargs.
+        """
+        queue = (waiter[1][0].delivery_info or {}).get('routing_key') if waiter[1] else None
+        queue = queue if queue in self.lanes else None
+        self._waiting[queue].append(waiter)
+
+        lane = self.lanes.get(queue)
+        if lane and lane.prefetch and queue not in self._paused and len(self._waiting[queue]) >= lane.prefetch:
+            logger.debug('Pausing lane "%s", %d requests waiting', lane.name, len(self._waiting[queue]))
+            self._paused.add(queue)
+            if self.on_pause:
+                self.on_pause(queue)
+
+    def popleft(self) -> tuple:
+        """
+        Pop the next waiter, choosing its lane by smooth weighted round robin between lanes with waiters.
+
+        :return: Callback, args and kwargs.
+        :raise IndexError: There are no waiters.
+        """
+        candidates = [q for q, waiting in self._waiting.items() if waiting]
+        if not candidates:
+            raise IndexError('pop from an empty lane queue')
+
+        total = 0
+        for queue in candidates:
+            weight = self._weight(queue)
+            total += weight
+            self._current[queue] += weight
+
+        chosen = max(candidates, key=self._current.__getitem__)
+
+        self._current[chosen] -= total
+        waiter = self._waiting[chosen].popleft()
+
+        if chosen in self._paused and len(self._waiting[chosen]) <= self.lanes[chosen].prefetch // 2:
+            logger.debug('Resuming lane "%s", %d requests waiting', self.lanes[chosen].name,
+                         len(self._waiting[chosen]))
+            self._paused.discard(chosen)
+            if self.on_resume:
+                self.on_resume(chosen)
+
+        return waiter
+
+    def clear(self):
+        """
+        Remove all waiters, resuming paused lanes.
+        """
+        for waiting in self._waiting.values():
+            waiting.clear()
+
+        for queue in list(self._paused):
+            self._paused.discard(queue)
+            if self.on_resume:
+                self.on_resume(queue)
+
+    def install(self, semaphore):
+        """
+        Replace the queue of waiters of a pool semaphore.
+
+        :param semaphore: Pool semaphore.
+        """
+        semaphore._waiting = self
+        semaphore._add_waiter = self.append
+        semaphore._pop_waiter = self.popleft
@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+"""
+Local execution engine.
+
+Tasks are run by a pool of threads or processes of current process instead of being sent to a broker, through the same
+*delay* and *apply_async* API, returning a future of their result. Each execution goes through Celery's eager tracing,
+so task wrappers and retries behave as in a worker. Threads receive arguments by reference, without serializing them.
+
+Batch tasks are run with a batch of a single item for each execution, so they receive the same items as in a worker.
+
+Pending executions are bounded, so sending tasks blocks while *local_queue_size* executions are waiting for the pool,
+the same way flow control pauses producers while a queue is over its high watermark. Tasks sent by executions running in
+the pool, such as items of streaming producers, are not bounded, since the pool would deadlock once all its threads were
+waiting for themselves.
+"""
+import logging
+import threading
+import uuid
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Optional
+
+from celery import Task
+from celery.exceptions import TimeoutError
+
+from task_dispatcher.batches import BatchItem, BatchTask
+from task_dispatcher.celery import app
+from task_dispatcher.settings import settings
+
+__all__ = ['LocalResult', 'LocalEngine', 'get_engine', 'reset_engine']
+
+logger = logging.getLogger(__name__)
+
+POOLS = {
+    'threads': ThreadPoolExecutor,
+    'processes': ProcessPoolExecutor,
+}
+
+_engine = None
+
+# Whether current thread is running an execution of a pool
+_state = threading.local()
+
+
+class LocalResult(Future):
+    """
+    Result of a task run by the local engine. It is a future that also provides the methods of Celery results most
+    commonly used, so code waiting for results works with both engines.
+    """
+    def __init__(self, id: str):
+        """
+        Result of a task run by the local engine.
+
+        :param id: Task id.
+        """
+        super().__init__()
+        self.id = id
+
+    def get(self, timeout: float=None, propagate: bool=True, **kwargs):
+        """
+        Wait for the task result.
+
+        :param timeout: Seconds to wait.
+        :param propagate: Raise the exception of failed tasks instead of returning it.
+        :return: Task result.
+        :raise TimeoutError: Task did not finish in time.
+        """
+        try:
+            exception = self.exception(timeout)
+        except FutureTimeoutError:
+            raise TimeoutError('The operation timed out.')
+
+        if exception is None:
+            return self.result()
+
+        if propagate:
+            raise exception
+
+        return exception
+
+    wait = get
+
+    def ready(self) -> bool:
+        return self.done()
+
+    def successful(self) -> bool:
+        return self.done() and not self.cancelled() and self.exception() is None
+
+    def failed(self) -> bool:
+        return self.done() and not self.cancelled() and self.exception() is not None
+
+
+def _execute(name: str, args: tuple, kwargs: dict, options: dict):
+    """
+    Run a task eagerly, looking it up by name so it can be run by a process pool. Batch tasks are run with a batch of
+    a single item.
+
+    :param name: Task name.
+    :param args: Task args.
+    :param kwargs: Task kwargs.
+    :param options: Celery task execution options.
+    :return: Task result.
+    :raise Exception: Task failed.
+    """
+    task = app.tasks[name]
+    _state.executing = True
+    try:
+        if not isinstance(task, BatchTask):
+            return task.apply(args, kwargs, **options).get(disable_sync_subtasks=False)
+
+        results = task.apply(([BatchItem(args=args, kwargs=kwargs).item],), **options).get(disable_sync_subtasks=False)
+        if results is None:
+            return None
+
+        if len(results) != 1:
+            raise ValueError('Task "{}" returned {} results for a batch of a single item'.format(name, len(results)))
+
+        return results[0]
+    finally:
+        _state.executing = False
+
+
+class LocalEngine:
+    """
+    Engine that runs tasks in a pool of current process, with a bounded number of pending executions.
+    """
+    def __init__(self, pool: str='threads', concurrency: int=None, queue_size: int=1000):
+        """
+        Engine that runs tasks in a pool of current process.
+
+        :param pool: Pool type, threads or processes.
+        :param concurrency: Number of threads or processes. Pool default if not given.
+        :param queue_size: Maximum number of executions waiting for the pool.
+        :raise ValueError: Unknown pool type.
+        """
+        if pool not in POOLS:
+            raise ValueError('Unknown local pool "{}", choices are: {}'.format(pool, ', '.join(sorted(POOLS))))
+
+        self.pool = pool
+        self.executor = POOLS[pool](concurrency)  # type: Executor
+        # Executions being run are not waiting, so they are not counted against the queue size
+        self._pending = threading.BoundedSemaphore(queue_size + self.executor._max_workers)
+
+    def apply_async(self, task: Task, args: tuple=None, kwargs: dict=None, task_id: str=None, **options) -> LocalResult:
+        """
+        Run a task in the pool. Execution options that only apply to brokers, such as queue or countdown, are ignored.
+        Sending blocks while the queue is full, unless sent by an execution running in the pool.
+
+        :param task: Task.
+        :param args: Task args.
+        :param kwargs: Task kwargs.
+        :param task_id: Task id. A new one by default.
+        :param options: Celery task execution options.
+        :return: Future of task result.
+        """
+        result = LocalResult(task_id or str(uuid.uuid4()))
+        options = {k: v for k, v in options.items() if k in ('headers', 'retries', 'throw')}
+
+        bounded = not getattr(_state, 'executing', False)
+        if bounded:
+            self._pending.acquire()
+
+        try:
+            future = self.executor.submit(_execute, task.name, tuple(args or ()), dict(kwargs or {}),
+                                          dict(options, task_id=result.id))
+        except BaseException:
+            if bounded:
+                self._pending.release()
+            raise
+
+        future.add_done_callback(lambda f: self._done(f, result, bounded))
+        return result
+
+    def _done(self, future: Future, result: LocalResult, bounded: bool=True):
+        if bounded:
+            self._pending.release()
+        if future.cancelled():
+            result.cancel()
+
+        if not result.set_running_or_notify_cancel():
+            return
+
+        exception = future.exception()
+        if exception is not None:
+            logger.debug('Local task "%s" failed: %r', result.id, exception)
+            result.set_exception(exception)
+        else:
+            result.set_result(future.result())
+
+    def shutdown(self, wait: bool=True):
+        """
+        Stop the pool, once pending executions finish if *wait*.
+
+        :param wait: Wait for pending executions.
+        """
+        self.executor.shutdown(wait=wait)
+
+
+def get_engine() -> LocalEngine:
+    """
+    Get the local engine defined in settings.
+
+    :return: Local engine.
+    """
+    global _engine
+
+    if _engine is None:
+        _engine = LocalEngine(settings.local_pool, settings.local_concurrency, settings.local_queue_size)
+
+    return _engine
+
+
+def reset_engine(wait: bool=True) -> Optional[LocalEngine]:
+    """
+    Shut down the local engine, so a new one is created from current settings on next use.
+
+    :param wait: Wait for pending executions.
+    :return: Engine shut down, if any.
+    """
+    global _engine
+
+    engine, _engine = _engine, None
+    if engine is not None:
+        engine.shutdown(wait=wait)
+
+    return engine
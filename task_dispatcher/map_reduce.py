@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+Chunked map-reduce over consumers.
+
+Items are grouped in chunks that are sent as a single message each. Workers apply the consumer task to every item of a
+chunk, so each item goes through the same wrappers as a message would, such as deduplication, memoization, throttling
+and stats, and reduce their results, so only one partial result per chunk is stored in the result backend, and the
+final reduction only receives those partial results.
+"""
+import functools
+import itertools
+from importlib import import_module
+from typing import Any, Callable, Iterable, List, Union
+
+from celery.result import AsyncResult
+
+from task_dispatcher.batches import BatchTask
+from task_dispatcher.celery import app
+from task_dispatcher.decorators import consumer as consumer_decorator
+from task_dispatcher.register import register
+from task_dispatcher.utils import is_method
+
+__all__ = ['map_reduce', 'map_chunk', 'MapReduceResult']
+
+_NOTHING = object()
+
+
+def _qualified_name(func: Callable) -> str:
+    """
+    Get the path of a function, so it can be imported by workers.
+
+    :param func: Function.
+    :return: Function path.
+    :raise ValueError: Function cannot be imported.
+    """
+    if '<' in func.__qualname__:
+        raise ValueError('Reducer "{}" must be importable, not a lambda or a local function'.format(func.__qualname__))
+
+    return '{}:{}'.format(func.__module__, func.__qualname__)
+
+
+def _import(path: str) -> Callable:
+    module, qualname = path.split(':')
+    return functools.reduce(getattr, qualname.split('.'), import_module(module))
+
+
+@app.task(name='task_dispatcher.map_reduce.map_chunk', ignore_result=False, shared=False)
+def map_chunk(consumer_name: str, reducer: str, items: List[Any]) -> Any:
+    """
+    Apply a consumer task to each item of a chunk and reduce their results.
+
+    :param consumer_name: Consumer name.
+    :param reducer: Reducer path.
+    :param items: Chunk of items.
+    :return: Partial result.
+    :raise Exception: Consumer failed for an item.
+    """
+    task = app.tasks[consumer_name]
+    return functools.reduce(_import(reducer),
+                            (task.apply((item,)).get(disable_sync_subtasks=False) for item in items))
+
+
+class MapReduceResult:
+    """
+    Result of a map-reduce, that reduces partial results of chunks in the order chunks were sent, so the reducer does
+    not need to be commutative.
+    """
+    def __init__(self, results: List[AsyncResult], reducer: Callable, initial: Any=_NOTHING):
+        """
+        Result of a map-reduce.
+
+        :param results: Results of chunks.
+        :param reducer: Reducer function.
+        :param initial: Initial value of the reduction.
+        """
+        self.results = results
+        self.reducer = reducer
+        self.initial = initial
+
+    def get(self, timeout: float=None) -> Any:
+        """
+        Wait for each chunk in the order they were sent and reduce their partial results. Each partial result is removed
+        from the result backend once reduced.
+
+        :param timeout: Seconds to wait for each chunk.
+        :return: Final result.
+        :raise TypeError: There are no items and no initial value.
+        """
+        value = self.initial
+        for result in self.results:
+            partial = result.get(timeout=timeout)
+            result.forget()
+            value = partial if value is _NOTHING else self.reducer(value, partial)
+
+        if value is _NOTHING:
+            raise TypeError('map_reduce() of empty iterable with no initial value')
+
+        return value
+
+
+def map_reduce(consumer: Union[str, consumer_decorator], iterable: Iterable, reducer: Callable, chunk_size: int=1000,
+               initial: Any=_NOTHING, **options) -> MapReduceResult:
+    """
+    Call a consumer for each item of an iterable and reduce their results, as calling
+    *functools.reduce(reducer, map(consumer, iterable))*, sending chunks of items as single messages to the consumer
+    queue. Reducer must be associative and importable by workers, since it reduces results of each chunk in workers
+    and their partial results in the caller.
+
+    The iterable is consumed lazily and chunks are published through a single producer, waiting while the consumer
+    queue is over its flow control high watermark.
+
+    :param consumer: Consumer or consumer name.
+    :param iterable: Iterable of items, each one given as the single argument of a consumer call.
+    :param reducer: Reducer function.
+    :param chunk_size: Items in each chunk.
+    :param initial: Initial value of the final reduction.
+    :param options: Celery task execution options.
+    :return: Map-reduce result.
+    :raise ValueError: Consumer is not registered, cannot be mapped or reducer cannot be imported.
+    """
+    if isinstance(consumer, str):
+        if consumer not in register.consumers:
+            register.load(consumer)
+
+        try:
+            consumer = register.consumers[consumer]
+        except KeyError:
+            raise ValueError('Task "{}" is not a registered consumer'.format(consumer))
+    elif not isinstance(consumer, consumer_decorator):
+        raise ValueError('Task "{}" is not a registered consumer'.format(consumer))
+
+    # Chunks are single messages of plain items, so items cannot be batched, bound to an instance nor partitioned
+    if isinstance(consumer.task, BatchTask) or is_method(consumer) or consumer.partition_key is not None:
+        raise ValueError('Batch, method and partitioned consumers cannot be mapped, such as "{}"'.format(consumer.name))
+
+    reducer_path = _qualified_name(reducer)
+    options.setdefault('queue', consumer.queue)
+
+    results = []
+    iterator = iter(iterable)
+    with app.producer_or_acquire() as producer:
+        for chunk in iter(lambda: list(itertools.islice(iterator, chunk_size)), []):
+            consumer._before_publish(options)
+            results.append(map_chunk.apply_async((consumer.name, reducer_path, chunk), producer=producer, **options))
+
+    return MapReduceResult(results, reducer, initial)
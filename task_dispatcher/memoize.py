@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+Memoization of task results.
+
+Results of pure tasks are cached by their serialized arguments, in a bounded in-process LRU cache, so only executions
+of the same process share results unless a result store shared by all workers is set, such as the SQLite store shared by
+workers of a host. Arguments are serialized using pickle, so methods are keyed on the state of their instance instead of
+its identity, and executions whose arguments cannot be serialized are not cached. Direct calls are not cached.
+"""
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+import time
+from typing import Any, Callable, Optional
+
+from celery import current_task
+from kombu.serialization import dumps, loads, prepare_accept_content
+from kombu.utils.imports import symbol_by_name
+
+from task_dispatcher.cache import LRUCache
+from task_dispatcher.celery import app
+from task_dispatcher.settings import settings
+from task_dispatcher.sqlite import SQLiteDatabase
+from task_dispatcher.stats import TaskStats
+from task_dispatcher.utils import wraps
+
+__all__ = ['ResultStore', 'SQLiteResultStore', 'get_result_store', 'memoize_key', 'memoizing']
+
+logger = logging.getLogger(__name__)
+
+_result_store = None
+
+
+class ResultStore:
+    """
+    Store of task results shared by all workers. It is created with *cache_path* setting as only argument.
+    """
+    def get(self, key: str) -> tuple:
+        """
+        Get a stored result.
+
+        :param key: Key.
+        :return: Whether the result was found and its value.
+        """
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any, ttl: float):
+        """
+        Store a result.
+
+        :param key: Key.
+        :param value: Result.
+        :param ttl: Seconds that the result is kept.
+        """
+        raise NotImplementedError
+
+
+class SQLiteResultStore(SQLiteDatabase, ResultStore):
+    """
+    Result store kept in a SQLite database, shared by all workers of a host or of hosts sharing a filesystem that
+    supports file locking. Results are serialized with the result serializer of the app, and results that cannot be
+    serialized are not stored.
+    """
+    schema = (
+        'CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value BLOB NOT NULL, content_type TEXT NOT NULL, '
+        'content_encoding TEXT NOT NULL, expires REAL NOT NULL)',
+        'CREATE INDEX IF NOT EXISTS results_expires ON results (expires)',
+    )
+
+    def __init__(self, path: str=None):
+        """
+        Result store kept in a SQLite database.
+
+        :param path: Database path. A task_dispatcher/cache.db file in system temp directory by default.
+        """
+        super().__init__(path or os.path.join(tempfile.gettempdir(), 'task_dispatcher', 'cache.db'))
+
+    def get(self, key: str) -> tuple:
+        row = self._transaction(lambda c: c.execute(
+            'SELECT value, content_type, content_encoding FROM results WHERE key = ? AND expires > ?',
+            (key, time.time())).fetchone())
+        if row is None:
+            return False, None
+
+        value, content_type, content_encoding = row
+        accept = prepare_accept_content(app.conf.result_accept_content or app.conf.accept_content)
+        return True, loads(value, content_type, content_encoding, accept=accept)
+
+    def set(self, key: str, value: Any, ttl: float):
+        try:
+            content_type, content_encoding, data = dumps(value, serializer=app.conf.result_serializer)
+        except Exception as exc:
+            logger.debug('Cannot store cached result "%s": %r', key, exc)
+            return
+
+        # Wall clock is used, since results are shared between processes
+        now = time.time()
+
+        def set(connection):
+            connection.execute('DELETE FROM results WHERE expires <= ?', (now,))
+            connection.execute('INSERT OR REPLACE INTO results (key, value, content_type, content_encoding, expires) '
+                               'VALUES (?, ?, ?, ?, ?)', (key, data, content_type, content_encoding, now + ttl))
+
+        self._transaction(set)
+
+
+def get_result_store() -> Optional[ResultStore]:
+    """
+    Get the shared result store defined in settings.
+
+    :return: Result store or None if not defined.
+    """
+    global _result_store
+
+    if _result_store is None and settings.cache_backend:
+        _result_store = symbol_by_name(settings.cache_backend)(settings.cache_path)
+
+    return _result_store
+
+
+def memoize_key(name: str, args: tuple, kwargs: dict) -> Optional[str]:
+    """
+    Compute the key of a task execution from its serialized arguments.
+
+    :param name: Task name.
+    :param args: Task args.
+    :param kwargs: Task kwargs.
+    :return: Key or None if arguments cannot be serialized.
+    """
+    try:
+        data = pickle.dumps((args, sorted(kwargs.items())), protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception as exc:
+        logger.debug('Cannot compute cache key of task "%s": %r', name, exc)
+        return None
+
+    return '{}:{}'.format(name, hashlib.sha1(data).hexdigest())
+
+
+def memoizing(func: Callable, name: str, maxsize: int, ttl: float, task_stats: TaskStats) -> Callable:
+    """
+    Wrap a task function, so its results are cached for *ttl* seconds and reused when called with same arguments.
+    Failed executions and direct calls are not cached.
+
+    :param func: Task function.
+    :param name: Task name, used as namespace of keys.
+    :param maxsize: Maximum number of results cached in process.
+    :param ttl: Seconds that a result is kept.
+    :param task_stats: Task stats where hits and misses are counted.
+    :return: Wrapped function.
+    """
+    cache = LRUCache(maxsize, ttl)
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        request = current_task.request if current_task else None
+        if request is None or request.called_directly:
+            return func(*args, **kwargs)
+
+        key = memoize_key(name, args, kwargs)
+        if key is None:
+            return func(*args, **kwargs)
+
+        found, result = cache.get(key)
+        result_store = get_result_store()
+        if not found and result_store is not None:
+            found, result = result_store.get(key)
+            if found:
+                cache.set(key, result)
+
+        if found:
+            task_stats.increment('cache_hits_total')
+            return result
+
+        task_stats.increment('cache_misses_total')
+        result = func(*args, **kwargs)
+        cache.set(key, result)
+        if result_store is not None:
+            result_store.set(key, result, ttl)
+
+        return result
+
+    return wrapper
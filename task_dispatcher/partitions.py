@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+Partitioned consumers.
+
+Messages of a partitioned consumer are routed to one of its partition queues, *<queue>.p<index>*, by a consistent hash
+of a key computed from their arguments, so every message with the same key is consumed by the workers serving that
+partition and per-process caches keyed by it stay hot. Partitions are chosen by jump consistent hash, so growing from N
+to N + 1 partitions only moves 1 / (N + 1) of the keys, all of them to the new partition.
+"""
+import hashlib
+from typing import Any, List
+
+__all__ = ['jump_hash', 'partition', 'partition_queue', 'parse_partitions']
+
+
+def jump_hash(key: int, buckets: int) -> int:
+    """
+    Jump consistent hash, as described by Lamping and Veach in "A Fast, Minimal Memory, Consistent Hash Algorithm".
+
+    :param key: 64 bits key.
+    :param buckets: Number of buckets.
+    :return: Bucket index.
+    """
+    b, j = -1, 0
+    while j < buckets:
+        b = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((b + 1) * ((1 << 31) / ((key >> 33) + 1)))
+
+    return b
+
+
+def partition(key: Any, partitions: int) -> int:
+    """
+    Get the partition of a key. Keys are hashed from their bytes, or from their string representation if they are not
+    bytes, so they are routed to the same partition by every process.
+
+    :param key: Partition key.
+    :param partitions: Number of partitions.
+    :return: Partition index.
+    """
+    data = key if isinstance(key, bytes) else str(key).encode('utf-8')
+    return jump_hash(int.from_bytes(hashlib.sha1(data).digest()[:8], 'big'), partitions)
+
+
+def partition_queue(queue: str, index: int) -> str:
+    """
+    Get the queue of a partition.
+
+    :param queue: Base queue name.
+    :param index: Partition index.
+    :return: Queue name.
+    """
+    return '{}.p{}'.format(queue, index)
+
+
+def parse_partitions(spec: str) -> List[int]:
+    """
+    Parse a comma separated list of partitions and ranges of partitions, such as '0-3,7'.
+
+    :param spec: Partitions.
+    :return: Sorted partition indexes.
+    :raise ValueError: Invalid partitions.
+    """
+    indexes = set()
+    for item in spec.split(','):
+        first, separator, last = item.strip().partition('-')
+        try:
+            first, last = int(first), int(last if separator else first)
+        except ValueError:
+            raise ValueError('Invalid partitions "{}"'.format(spec))
+
+        if first < 0 or last < first:
+            raise ValueError('Invalid partitions "{}"'.format(spec))
+
+        indexes.update(range(first, last + 1))
+
+    return sorted(indexes)
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+Broker queues inspection.
+"""
+import logging
+import threading
+import time
+from typing import Dict
+
+from celery import Celery
+
+__all__ = ['QueueDepth']
+
+logger = logging.getLogger(__name__)
+
+
+class QueueDepth:
+    """
+    Number of messages waiting in broker queues. Depths are cached for a few seconds, so it can be queried frequently
+    without hitting the broker on every call.
+    """
+    def __init__(self, app: Celery, ttl: float=1.0):
+        """
+        Number of messages waiting in broker queues.
+
+        :param app: Celery app.
+        :param ttl: Seconds that a queue depth is cached.
+        """
+        self.app = app
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._connection = None
+        self._cache = {}  # type: Dict[str, tuple]
+
+    def __call__(self, *queues: str) -> int:
+        """
+        Get the total number of messages waiting in given queues.
+
+        :param queues: Queues names.
+        :return: Number of messages.
+        """
+        return sum(self.get(q) for q in queues)
+
+    def get(self, queue: str) -> int:
+        """
+        Get the number of messages waiting in a queue. Queues that do not exist or cannot be inspected are empty.
+
+        :param queue: Queue name.
+        :return: Number of messages.
+        """
+        now = time.monotonic()
+        with self._lock:
+            depth, expires = self._cache.get(queue, (0, 0.0))
+            if expires <= now:
+                depth = self._fetch(queue)
+                self._cache[queue] = (depth, now + self.ttl)
+
+        return depth
+
+    def clear(self):
+        """
+        Clear cached depths and release broker connection.
+        """
+        with self._lock:
+            self._cache.clear()
+            if self._connection is not None:
+                self._connection.release()
+                self._connection = None
+
+    def _fetch(self, queue: str) -> int:
+        # A failed passive declare closes the channel, so a new one is used for each query
+        if self._connection is None:
+            self._connection = self.app.connection_for_read()
+
+        try:
+            channel = self._connection.channel()
+            try:
+                return channel.queue_declare(queue=queue, passive=True).message_count
+            finally:
+                channel.close()
+        except self._connection.channel_errors as exc:
+            logger.debug('Cannot get depth of queue "%s": %r', queue, exc)
+        except Exception as exc:
+            logger.warning('Cannot get depth of queue "%s": %r', queue, exc)
+            self._connection.release()
+            self._connection = None
+
+        return 0
@@ -1,10 +1,12 @@
 # -*- coding: utf-8 -*-
 import json
-from collections import OrderedDict
+from collections import OrderedDict, defaultdict
+from importlib import import_module
+from typing import Any, Dict, Set
 
-import yaml
+from celery.app.registry import TaskRegistry
 
-__all__ = ['register', 'TaskRegister', 'Register']
+__all__ = ['register', 'TaskRegister', 'Register', 'LazyTaskRegistry']
 
 
 class Register(dict):
@@ -27,6 +29,10 @@ class Register(dict):
 class TaskRegister:
     """
     Register for producer and consumer tasks.
+
+    Descriptions of tasks, either registered or listed in a loaded manifest, are indexed by type, queue, module and
+    tag, so tasks can be found without scanning the whole register, and serialized outputs are cached until a new task
+    is registered or a manifest is loaded.
     """
     def __init__(self):
         """
@@ -34,6 +40,55 @@ class TaskRegister:
         """
         self._producers = Register()
         self._consumers = Register()
+        self._manifest = {}
+        self._entries = {'consumer': {}, 'producer': {}}  # type: Dict[str, Dict[str, dict]]
+        self._indexes = {'queue': defaultdict(set), 'module': defaultdict(set), 'tag': defaultdict(set)}
+        self._cache = {}
+
+    @staticmethod
+    def _describe(task) -> dict:
+        return {
+            'description': task.description or task.__doc__ or 'Description not found',
+            'module': task.__module__,
+            'name': task.__qualname__,
+            'queue': getattr(task, 'queue', None),
+            'serializer': task.serializer,
+            'tags': list(task.tags),
+        }
+
+    def _index(self, type_: str, name: str, entry: dict):
+        """
+        Add the description of a task to the indexes, replacing any previous description of that task.
+
+        :param type_: Task type.
+        :param name: Task name.
+        :param entry: Task description.
+        """
+        previous = self._entries[type_].get(name)
+        if previous is not None:
+            self._unindex(name, previous)
+
+        self._entries[type_][name] = entry
+        self._indexes['queue'][entry.get('queue')].add(name)
+        for tag in entry.get('tags') or ():
+            self._indexes['tag'][tag].add(name)
+
+        # Modules are indexed along with their parent packages, so they can be found by prefix
+        parts = entry['module'].split('.')
+        for i in range(1, len(parts) + 1):
+            self._indexes['module']['.'.join(parts[:i])].add(name)
+
+        self._cache.clear()
+
+    def _unindex(self, name: str, entry: dict):
+        values = {
+            'queue': [entry.get('queue')],
+            'tag': entry.get('tags') or (),
+            'module': ['.'.join(entry['module'].split('.')[:i]) for i in range(1, entry['module'].count('.') + 2)],
+        }
+        for index, keys in values.items():
+            for key in keys:
+                self._indexes[index][key].discard(name)
 
     def register(self, item):
         """
@@ -46,11 +101,41 @@ class TaskRegister:
 
         if isinstance(item, producer):
             self._producers[item.name] = item
+            self._index('producer', item.name, self._describe(item))
         elif isinstance(item, consumer):
             self._consumers[item.name] = item
+            self._index('consumer', item.name, self._describe(item))
         else:
             raise TypeError(item)
 
+    def find(self, type_: str=None, queue: str=None, module: str=None, tag: str=None) -> Set[str]:
+        """
+        Find tasks matching all given filters.
+
+        :param type_: Task type, either consumer or producer.
+        :param queue: Queue name.
+        :param module: Module name or prefix of packages, such as "myapp.billing" for "myapp.billing.tasks".
+        :param tag: Tag.
+        :return: Tasks names.
+        """
+        matches = [self._indexes[index].get(key, set())
+                   for index, key in (('queue', queue), ('module', module), ('tag', tag)) if key is not None]
+        if not matches:
+            types = [type_] if type_ else list(self._entries)
+            return {n for t in types for n in self._entries.get(t, ())}
+
+        # Intersection starts from the smallest index set, so its cost depends on matching tasks, not on register size
+        matches.sort(key=len)
+        names = set(matches[0])
+        for match in matches[1:]:
+            names &= match
+
+        if type_:
+            entries = self._entries.get(type_, {})
+            names = {n for n in names if n in entries}
+
+        return names
+
     @property
     def producers(self):
         """
@@ -69,39 +154,163 @@ class TaskRegister:
         """
         return self._consumers
 
-    def to_dict(self) -> dict:
+    def to_dict(self, queue: str=None, module: str=None, tag: str=None) -> dict:
         """
-        Transform the task register to a dictionary.
+        Transform the task register to a dictionary. Tasks from a loaded manifest whose modules are not imported yet
+        are included.
 
+        :param queue: Only include tasks of this queue.
+        :param module: Only include tasks of this module or package.
+        :param tag: Only include tasks with this tag.
         :return: Task register transformed.
         """
-        def get_description(task):
+        names = self.find(queue=queue, module=module, tag=tag)
+        return OrderedDict(
+            (t + 's', {k: dict(v) for k, v in self._entries[t].items() if k in names}) for t in ('consumer', 'producer')
+        )
+
+    def to_manifest(self, tasks: Dict[str, Any]=None) -> dict:
+        """
+        Build a manifest of registered tasks, that maps each task name to its type, module, name, queue, description,
+        serializer and whether it is instrumented. Other Celery tasks given, except Celery builtin ones, are included
+        with *task* type so workers are able to import them on demand too.
+
+        :param tasks: Celery tasks.
+        :return: Tasks manifest.
+        """
+        def get_entry(task, type_):
             return {
-                'description': task.description or task.__doc__ or 'Description not found',
+                'type': type_,
                 'module': task.__module__,
                 'name': task.__qualname__,
+                'queue': task.queue,
+                'description': task.description or task.__doc__ or 'Description not found',
+                'serializer': task.serializer,
+                'tags': list(task.tags),
+                'stats': bool(task.stats or task.dedup_key or task.cache or task.throttle),
+                'throttled': task.throttle is not None,
             }
 
-        return OrderedDict([
-            ('consumers', {k: get_description(v) for k, v in self._consumers.items()}),
-            ('producers', {k: get_description(v) for k, v in self._producers.items()}),
-        ])
+        manifest = {k: get_entry(v, 'consumer') for k, v in self._consumers.items()}
+        manifest.update({k: get_entry(v, 'producer') for k, v in self._producers.items()})
+
+        for k, v in (tasks or {}).items():
+            if k not in manifest and not k.startswith('celery.'):
+                manifest[k] = {
+                    'type': 'task',
+                    'module': v.__module__,
+                    'name': type(v).__qualname__,
+                    'queue': getattr(v, 'queue', None),
+                    'description': v.__doc__ or 'Description not found',
+                    'serializer': getattr(v, 'serializer', None),
+                    'tags': [],
+                    'stats': False,
+                    'throttled': False,
+                }
+
+        return manifest
 
-    def to_json(self) -> str:
+    def dump_manifest(self, path: str, tasks: Dict[str, Any]=None):
         """
-        Transform the task register to a JSON string.
+        Write a manifest of registered tasks to a JSON file.
 
+        :param path: Manifest file path.
+        :param tasks: Celery tasks.
+        """
+        with open(path, 'w') as f:
+            json.dump(self.to_manifest(tasks), f, indent=2, sort_keys=True)
+
+    def load_manifest(self, path: str):
+        """
+        Load a manifest of tasks from a JSON file, so tasks can be resolved without importing their modules until
+        one of them is needed.
+
+        :param path: Manifest file path.
+        """
+        with open(path) as f:
+            self._manifest = json.load(f)
+
+        # Descriptions from a previous manifest of tasks that are not registered are replaced
+        registers = {'consumer': self._consumers, 'producer': self._producers}
+        for type_, entries in self._entries.items():
+            for name in [k for k in entries if k not in registers[type_]]:
+                self._unindex(name, entries.pop(name))
+        self._cache.clear()
+
+        for k, v in self._manifest.items():
+            if v['type'] in registers and k not in registers[v['type']]:
+                self._index(v['type'], k, {'description': v['description'], 'module': v['module'], 'name': v['name'],
+                                           'queue': v.get('queue'), 'serializer': v.get('serializer'),
+                                           'tags': v.get('tags', [])})
+
+    def load(self, name: str) -> bool:
+        """
+        Import the module of a task from the loaded manifest, that registers the task.
+
+        :param name: Task name.
+        :return: True if the task is found in the manifest.
+        """
+        try:
+            module = self._manifest[name]['module']
+        except KeyError:
+            return False
+
+        import_module(module)
+        return True
+
+    @property
+    def manifest(self) -> dict:
+        """
+        Loaded tasks manifest.
+
+        :return: Tasks manifest.
+        """
+        return self._manifest
+
+    def to_json(self, **filters) -> str:
+        """
+        Transform the task register to a JSON string. Output is cached until the register changes.
+
+        :param filters: Filters, as in *to_dict*.
         :return: Task register transformed.
         """
-        return json.dumps(self.to_dict())
+        key = ('json',) + tuple(sorted(filters.items()))
+        if key not in self._cache:
+            self._cache[key] = json.dumps(self.to_dict(**filters))
+
+        return self._cache[key]
 
-    def to_yaml(self) -> str:
+    def to_yaml(self, **filters) -> str:
         """
-        Transform the task register to a YAML string.
+        Transform the task register to a YAML string. Output is cached until the register changes.
 
+        :param filters: Filters, as in *to_dict*.
         :return: Task register transformed.
         """
-        return yaml.dump(dict(self.to_dict()), default_flow_style=False)
+        import yaml
+
+        key = ('yaml',) + tuple(sorted(filters.items()))
+        if key not in self._cache:
+            self._cache[key] = yaml.dump(dict(self.to_dict(**filters)), default_flow_style=False)
+
+        return self._cache[key]
+
+
+class LazyTaskRegistry(TaskRegistry):
+    """
+    Celery task registry that imports the module of unknown tasks from the manifest loaded in task register.
+    """
+    def __missing__(self, key):
+        if register.load(key) and dict.__contains__(self, key):
+            task = dict.__getitem__(self, key)
+            if task.__trace__ is None:
+                from celery.app.trace import build_tracer
+
+                task.__trace__ = build_tracer(task.name, task, app=task.app)
+
+            return task
+
+        raise self.NotRegistered(key)
 
 
 register = TaskRegister()
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+"""
+Task results.
+"""
+from celery.exceptions import CeleryError
+from celery.result import AsyncResult
+
+__all__ = ['ResultNotStored', 'FireAndForgetResult']
+
+
+class ResultNotStored(CeleryError, RuntimeError):
+    """
+    The result of a task is never stored, so it cannot be waited for.
+    """
+
+
+class FireAndForgetResult(AsyncResult):
+    """
+    Result of a fire and forget task, whose state and result are never stored. Waiting for it raises an error instead
+    of blocking forever.
+    """
+    def get(self, *args, **kwargs):
+        raise ResultNotStored('Task "{}" is fire and forget, so its result is never stored'.format(self.id))
+
+    wait = get
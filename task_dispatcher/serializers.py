@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+Compact serializers for task payloads, that can be selected per task through *serializer* option.
+
+* **msgpack**: Registered by kombu, requires msgpack package.
+* **pickle5**: Pickle protocol 5, available in Python 3.8+ or through pickle5 package. Objects that support out-of-band
+  pickling, such as numpy arrays or *PickleBuffer*, are appended to the message body as raw buffers instead of being
+  copied into the pickle stream, and they are decoded as zero-copy views of the received body.
+* **<serializer>+zlib**: Compressed variant of json, msgpack and pickle5 serializers. Payloads are only compressed when
+  they are larger than *compress_threshold* setting.
+
+Pickle serializers can run arbitrary code when decoding, so they should only be used with trusted brokers. Workers
+accept the serializers declared by their tasks when they start, but pickle serializers are only accepted when allowed
+through *accept_pickle* setting. Once accepted, workers decode them for every task of every queue.
+"""
+import struct
+import zlib
+from typing import Any, List
+
+from celery import Celery
+from celery.exceptions import ImproperlyConfigured
+
+from kombu.serialization import dumps, loads, register, registry
+
+from task_dispatcher.settings import settings
+
+__all__ = ['PICKLE5', 'COMPRESSED', 'PICKLE_SERIALIZERS', 'pickle5_dumps', 'pickle5_loads', 'content_type', 'accept',
+           'register_serializers']
+
+try:
+    import pickle
+
+    pickle.PickleBuffer
+except AttributeError:
+    try:
+        import pickle5 as pickle
+    except ImportError:  # pragma: no cover
+        pickle = None
+
+#: Pickle protocol 5 serializer name.
+PICKLE5 = 'pickle5'
+
+#: Suffix of compressed serializers.
+COMPRESSED = '+zlib'
+
+#: Serializers that run arbitrary code when decoding.
+PICKLE_SERIALIZERS = ('pickle', PICKLE5, PICKLE5 + COMPRESSED)
+
+_COMPRESSED_FLAG, _RAW_FLAG = b'\x01', b'\x00'
+
+
+def pickle5_dumps(obj: Any) -> bytes:
+    """
+    Serialize an object using pickle protocol 5, keeping out-of-band buffers out of the pickle stream. Message body is
+    formed by the number of buffers and their sizes, followed by the pickle stream and the raw buffers.
+
+    :param obj: Object.
+    :return: Message body.
+    """
+    buffers = []
+    data = pickle.dumps(obj, protocol=5, buffer_callback=buffers.append)
+    raws = [b.raw() for b in buffers]
+    header = struct.pack('!I{}Q'.format(len(raws)), len(raws), *(r.nbytes for r in raws))
+    return b''.join([header, data] + raws)
+
+
+def pickle5_loads(body: bytes) -> Any:
+    """
+    Deserialize a message body serialized by *pickle5_dumps*. Out-of-band buffers are views of the body.
+
+    :param body: Message body.
+    :return: Object.
+    """
+    view = memoryview(body)
+    count, = struct.unpack_from('!I', view)
+    sizes = struct.unpack_from('!{}Q'.format(count), view, 4)
+
+    end = len(view)
+    buffers = []  # type: List[memoryview]
+    for size in reversed(sizes):
+        buffers.insert(0, view[end - size:end])
+        end -= size
+
+    return pickle.loads(view[4 + 8 * count:end], buffers=buffers)
+
+
+def _compressed_serializer(name: str):
+    """
+    Build encoder and decoder of the compressed variant of a serializer.
+
+    :param name: Serializer name.
+    :return: Encoder and decoder.
+    """
+    def encode(obj):
+        _, encoding, data = dumps(obj, serializer=name)
+        data = data.encode(encoding) if isinstance(data, str) else data
+        if len(data) > settings.compress_threshold:
+            return _COMPRESSED_FLAG + zlib.compress(data)
+
+        return _RAW_FLAG + data
+
+    def decode(body):
+        view = memoryview(body)
+        data = zlib.decompress(view[1:]) if view[:1] == _COMPRESSED_FLAG else view[1:]
+        # Accept and untrusted content checks were already done for the compressed content type
+        return loads(data, content_type(name), 'binary', accept=None, force=True)
+
+    return encode, decode
+
+
+def content_type(name: str) -> str:
+    """
+    Get content type of a serializer.
+
+    :param name: Serializer name.
+    :return: Content type.
+    """
+    return registry.name_to_type[name]
+
+
+def accept(app: Celery, *names: str, allow_pickle: bool=None):
+    """
+    Add serializers to content accepted by workers of an app. Pickle serializers not accepted yet are only added when
+    allowed.
+
+    :param app: Celery app.
+    :param names: Serializers names.
+    :param allow_pickle: Allow pickle serializers. Allowed by *accept_pickle* setting by default.
+    :raise ImproperlyConfigured: A pickle serializer is not allowed.
+    """
+    allow_pickle = settings.accept_pickle if allow_pickle is None else allow_pickle
+    accept_content = list(app.conf.accept_content)
+    for name in names:
+        if name not in accept_content and content_type(name) not in accept_content:
+            if name in PICKLE_SERIALIZERS and not allow_pickle:
+                raise ImproperlyConfigured('Serializer "{}" can run arbitrary code when decoding, so it is only '
+                                           'accepted if TASK_DISPATCHER_ACCEPT_PICKLE setting is enabled'.format(name))
+
+            accept_content.append(content_type(name))
+
+    app.conf.accept_content = accept_content
+
+
+def register_serializers():
+    """
+    Register pickle5 serializer, if available, and compressed variants of json, msgpack and pickle5 serializers.
+    """
+    names = ['json', 'msgpack']
+    if pickle is not None:
+        register(PICKLE5, pickle5_dumps, pickle5_loads, content_type='application/x-python-pickle5',
+                 content_encoding='binary')
+        names.append(PICKLE5)
+
+    for name in names:
+        encode, decode = _compressed_serializer(name)
+        register(name + COMPRESSED, encode, decode, content_type='{}{}'.format(content_type(name), COMPRESSED),
+                 content_encoding='binary')
+
+    # Same as kombu does with insecure serializers, they are only decoded when explicitly accepted
+    if pickle is not None:
+        registry.disable(PICKLE5)
+        registry.disable(PICKLE5 + COMPRESSED)
+
+
+register_serializers()
@@ -25,6 +25,46 @@ class reset:  # noqa
 
 class Settings:
     run_at_startup = []
+    stats = False
+    stats_port = None
+    max_memory_per_child = None
+    manifest = None
+    autoscale_drain_time = 10.0
+    autoscale_hysteresis = 0.25
+    autoscale_cpu_threshold = 0.9
+    flow_control = {}
+    flow_control_interval = 1.0
+    fire_and_forget = False
+    compress_threshold = 4096
+    accept_pickle = False
+    claim_check = False
+    claim_check_threshold = 1048576
+    claim_check_store = 'task_dispatcher.claim_check:FileBlobStore'
+    claim_check_path = None
+    dedup_ttl = 60.0
+    dedup_maxsize = 10000
+    dedup_backend = None
+    dedup_path = None
+    cache_size = 1024
+    cache_ttl = 300.0
+    cache_backend = None
+    cache_path = None
+    checkpoint_interval = 1000
+    checkpoint_store = 'task_dispatcher.streaming:FileCheckpointStore'
+    checkpoint_path = None
+    lanes = {}
+    throttle_backend = 'task_dispatcher.throttle:SQLiteThrottleBackend'
+    throttle_path = None
+    throttle_cache_time = 0.1
+    throttle_interval = 1.0
+    throttle_slot_ttl = 3600.0
+    groups = {}
+    supervise_interval = 1.0
+    supervise_max_backoff = 60.0
+    engine = 'celery'
+    local_pool = 'threads'
+    local_concurrency = None
+    local_queue_size = 1000
 
     def __init__(self):
         self.reset_default()
@@ -37,6 +77,46 @@ class Settings:
         Reset settings to default values.
         """
         self.run_at_startup = []
+        self.stats = False
+        self.stats_port = None
+        self.max_memory_per_child = None
+        self.manifest = None
+        self.autoscale_drain_time = 10.0
+        self.autoscale_hysteresis = 0.25
+        self.autoscale_cpu_threshold = 0.9
+        self.flow_control = {}
+        self.flow_control_interval = 1.0
+        self.fire_and_forget = False
+        self.compress_threshold = 4096
+        self.accept_pickle = False
+        self.claim_check = False
+        self.claim_check_threshold = 1048576
+        self.claim_check_store = 'task_dispatcher.claim_check:FileBlobStore'
+        self.claim_check_path = None
+        self.dedup_ttl = 60.0
+        self.dedup_maxsize = 10000
+        self.dedup_backend = None
+        self.dedup_path = None
+        self.cache_size = 1024
+        self.cache_ttl = 300.0
+        self.cache_backend = None
+        self.cache_path = None
+        self.checkpoint_interval = 1000
+        self.checkpoint_store = 'task_dispatcher.streaming:FileCheckpointStore'
+        self.checkpoint_path = None
+        self.lanes = {}
+        self.throttle_backend = 'task_dispatcher.throttle:SQLiteThrottleBackend'
+        self.throttle_path = None
+        self.throttle_cache_time = 0.1
+        self.throttle_interval = 1.0
+        self.throttle_slot_ttl = 3600.0
+        self.groups = {}
+        self.supervise_interval = 1.0
+        self.supervise_max_backoff = 60.0
+        self.engine = 'celery'
+        self.local_pool = 'threads'
+        self.local_concurrency = None
+        self.local_queue_size = 1000
 
     @staticmethod
     def import_settings(path):
@@ -86,5 +166,48 @@ class Settings:
 
         # Builder args
         self.run_at_startup = self.get(module, 'task_dispatcher_run_at_startup', [])
+        self.stats = self.get(module, 'task_dispatcher_stats', False)
+        self.stats_port = self.get(module, 'task_dispatcher_stats_port', None)
+        self.max_memory_per_child = self.get(module, 'task_dispatcher_max_memory_per_child', None)
+        self.manifest = self.get(module, 'task_dispatcher_manifest', None)
+        self.autoscale_drain_time = self.get(module, 'task_dispatcher_autoscale_drain_time', 10.0)
+        self.autoscale_hysteresis = self.get(module, 'task_dispatcher_autoscale_hysteresis', 0.25)
+        self.autoscale_cpu_threshold = self.get(module, 'task_dispatcher_autoscale_cpu_threshold', 0.9)
+        self.flow_control = self.get(module, 'task_dispatcher_flow_control', {})
+        self.flow_control_interval = self.get(module, 'task_dispatcher_flow_control_interval', 1.0)
+        self.fire_and_forget = self.get(module, 'task_dispatcher_fire_and_forget', False)
+        self.compress_threshold = self.get(module, 'task_dispatcher_compress_threshold', 4096)
+        self.accept_pickle = self.get(module, 'task_dispatcher_accept_pickle', False)
+        self.claim_check = self.get(module, 'task_dispatcher_claim_check', False)
+        self.claim_check_threshold = self.get(module, 'task_dispatcher_claim_check_threshold', 1048576)
+        self.claim_check_store = self.get(module, 'task_dispatcher_claim_check_store',
+                                          'task_dispatcher.claim_check:FileBlobStore')
+        self.claim_check_path = self.get(module, 'task_dispatcher_claim_check_path', None)
+        self.dedup_ttl = self.get(module, 'task_dispatcher_dedup_ttl', 60.0)
+        self.dedup_maxsize = self.get(module, 'task_dispatcher_dedup_maxsize', 10000)
+        self.dedup_backend = self.get(module, 'task_dispatcher_dedup_backend', None)
+        self.dedup_path = self.get(module, 'task_dispatcher_dedup_path', None)
+        self.cache_size = self.get(module, 'task_dispatcher_cache_size', 1024)
+        self.cache_ttl = self.get(module, 'task_dispatcher_cache_ttl', 300.0)
+        self.cache_backend = self.get(module, 'task_dispatcher_cache_backend', None)
+        self.cache_path = self.get(module, 'task_dispatcher_cache_path', None)
+        self.checkpoint_interval = self.get(module, 'task_dispatcher_checkpoint_interval', 1000)
+        self.checkpoint_store = self.get(module, 'task_dispatcher_checkpoint_store',
+                                         'task_dispatcher.streaming:FileCheckpointStore')
+        self.checkpoint_path = self.get(module, 'task_dispatcher_checkpoint_path', None)
+        self.lanes = self.get(module, 'task_dispatcher_lanes', {})
+        self.throttle_backend = self.get(module, 'task_dispatcher_throttle_backend',
+                                         'task_dispatcher.throttle:SQLiteThrottleBackend')
+        self.throttle_path = self.get(module, 'task_dispatcher_throttle_path', None)
+        self.throttle_cache_time = self.get(module, 'task_dispatcher_throttle_cache_time', 0.1)
+        self.throttle_interval = self.get(module, 'task_dispatcher_throttle_interval', 1.0)
+        self.throttle_slot_ttl = self.get(module, 'task_dispatcher_throttle_slot_ttl', 3600.0)
+        self.groups = self.get(module, 'task_dispatcher_groups', {})
+        self.supervise_interval = self.get(module, 'task_dispatcher_supervise_interval', 1.0)
+        self.supervise_max_backoff = self.get(module, 'task_dispatcher_supervise_max_backoff', 60.0)
+        self.engine = self.get(module, 'task_dispatcher_engine', 'celery')
+        self.local_pool = self.get(module, 'task_dispatcher_local_pool', 'threads')
+        self.local_concurrency = self.get(module, 'task_dispatcher_local_concurrency', None)
+        self.local_queue_size = self.get(module, 'task_dispatcher_local_queue_size', 1000)
 
 settings = Settings()
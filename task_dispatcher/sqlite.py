@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+SQLite databases shared by all workers of a host, or of hosts sharing a filesystem that supports file locking.
+"""
+import os
+import sqlite3
+import threading
+from typing import Any, Callable, Iterable
+
+__all__ = ['SQLiteDatabase']
+
+
+class SQLiteDatabase:
+    """
+    SQLite database opened lazily by each process, whose operations are run in immediate transactions so they are atomic
+    across processes.
+    """
+    #: Statements that create the tables of the database.
+    schema = ()  # type: Iterable[str]
+
+    def __init__(self, path: str):
+        """
+        SQLite database opened lazily by each process.
+
+        :param path: Database path.
+        """
+        self.path = path
+        self._connection = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        # Connections cannot be shared with forked processes
+        if self._connection is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._connection = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            for statement in self.schema:
+                self._connection.execute(statement)
+            self._pid = os.getpid()
+
+        return self._connection
+
+    def _transaction(self, func: Callable[[sqlite3.Connection], Any]) -> Any:
+        """
+        Run a function in a transaction, rolling it back if the function fails.
+
+        :param func: Function that receives the connection.
+        :return: Function result.
+        """
+        with self._lock:
+            connection = self.connection
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                result = func(connection)
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+            connection.execute('COMMIT')
+
+        return result
@@ -0,0 +1,358 @@
+# -*- coding: utf-8 -*-
+"""
+Task instrumentation.
+
+Histograms have fixed buckets and are stored in shared memory, so tasks decorated before the worker pool forks record
+their stats in memory that is visible to the worker main process, where they are exposed through a remote control
+command and an optional Prometheus endpoint.
+"""
+import ctypes
+import logging
+import threading
+import time
+from bisect import bisect_left
+from multiprocessing import Lock
+from multiprocessing.sharedctypes import RawArray, RawValue
+from typing import Callable, Dict, Iterable, Optional, Sequence
+
+from celery import current_task, signals
+from celery.exceptions import Retry
+
+from task_dispatcher.utils import rss_kb, wraps
+
+__all__ = ['stats', 'Histogram', 'TaskStats', 'StatsRegister', 'instrument', 'queue_wait', 'enable', 'merge',
+           'summary', 'to_prometheus']
+
+logger = logging.getLogger(__name__)
+
+#: Time buckets, from 1ms to ~9 minutes.
+TIME_BUCKETS = tuple(0.001 * 2 ** i for i in range(20))
+
+#: Size buckets, from 64B to 256MB.
+SIZE_BUCKETS = tuple(64 * 4 ** i for i in range(12))
+
+#: Header that stores the timestamp when a task message is published.
+PUBLISHED_HEADER = 'published_at'
+
+#: Remote control command that returns worker stats.
+CONTROL_COMMAND = 'dispatcher_stats'
+
+
+class Histogram:
+    """
+    Histogram with fixed buckets stored in shared memory, so recording a value does not allocate memory.
+    """
+    __slots__ = ('bounds', '_counts', '_sum')
+
+    def __init__(self, bounds: Sequence[float]):
+        """
+        Histogram with fixed buckets stored in shared memory.
+
+        :param bounds: Sorted upper bounds of buckets. An extra bucket for values over the last bound is added.
+        """
+        self.bounds = tuple(bounds)
+        self._counts = RawArray(ctypes.c_uint64, len(self.bounds) + 1)
+        self._sum = RawValue(ctypes.c_double, 0.0)
+
+    def observe(self, value: float):
+        """
+        Record a value.
+
+        :param value: Value.
+        """
+        self._counts[bisect_left(self.bounds, value)] += 1
+        self._sum.value += value
+
+    def to_dict(self) -> dict:
+        return {'bounds': list(self.bounds), 'counts': list(self._counts), 'sum': self._sum.value}
+
+
+class TaskStats:
+    """
+    Stats of a single task.
+    """
+    #: Histograms names and buckets.
+    histograms = (
+        ('queue_wait_seconds', TIME_BUCKETS),
+        ('execution_seconds', TIME_BUCKETS),
+        ('payload_size_bytes', SIZE_BUCKETS),
+        ('memory_growth_bytes', SIZE_BUCKETS),
+    )
+
+    #: Counters names.
+    counters = ('retries_total', 'dedup_hits_total', 'dedup_misses_total', 'cache_hits_total', 'cache_misses_total',
+                'throttled_total')
+
+    def __init__(self, name: str, lock: Lock=None):
+        """
+        Stats of a single task.
+
+        :param name: Task name.
+        :param lock: Process shared lock that guards updates. A new one by default.
+        """
+        self.name = name
+        self._lock = lock or Lock()
+        self._histograms = {n: Histogram(b) for n, b in self.histograms}
+        self._counters = RawArray(ctypes.c_uint64, len(self.counters))
+
+    def observe(self, histogram: str, value: float):
+        """
+        Record a value in a histogram.
+
+        :param histogram: Histogram name.
+        :param value: Value.
+        """
+        with self._lock:
+            self._histograms[histogram].observe(value)
+
+    def increment(self, counter: str, value: int=1):
+        """
+        Increment a counter.
+
+        :param counter: Counter name.
+        :param value: Increment.
+        """
+        with self._lock:
+            self._counters[self.counters.index(counter)] += value
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                'histograms': {n: self._histograms[n].to_dict() for n, _ in self.histograms},
+                'counters': dict(zip(self.counters, self._counters)),
+            }
+
+
+class StatsRegister(dict):
+    """
+    Register of stats for each task. Stats of all tasks share a single lock, so instrumenting many tasks does not
+    allocate an OS semaphore for each one of them.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lock = None
+
+    def register(self, name: str) -> TaskStats:
+        """
+        Get stats of a task, creating them if necessary.
+
+        :param name: Task name.
+        :return: Task stats.
+        """
+        if name not in self:
+            # Lock is created along with first stats, so it is allocated before the pool forks too
+            if self._lock is None:
+                self._lock = Lock()
+
+            self[name] = TaskStats(name, self._lock)
+
+        return self[name]
+
+    def to_dict(self) -> dict:
+        return {k: v.to_dict() for k, v in self.items()}
+
+
+def queue_wait(request) -> Optional[float]:
+    """
+    Get the time that a request spent waiting in the queue, from the timestamp added when its message was published.
+
+    :param request: Task request.
+    :return: Seconds waiting in the queue or None if message has no publish timestamp.
+    """
+    published = getattr(request, PUBLISHED_HEADER, None) or (request.headers or {}).get(PUBLISHED_HEADER)
+    if published is None:
+        return None
+
+    return max(time.time() - published, 0.0)
+
+
+def instrument(func: Callable, task_stats: TaskStats) -> Callable:
+    """
+    Wrap a task function to record queue wait time, execution time, retries and growth of resident memory of the
+    worker process during each execution, so tasks that leak memory can be found.
+
+    :param func: Task function.
+    :param task_stats: Task stats.
+    :return: Wrapped function.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        request = current_task.request if current_task else None
+        if request is None or request.called_directly:
+            return func(*args, **kwargs)
+
+        wait = queue_wait(request)
+        if wait is not None:
+            task_stats.observe('queue_wait_seconds', wait)
+
+        rss = rss_kb()
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except Retry:
+            task_stats.increment('retries_total')
+            raise
+        finally:
+            task_stats.observe('execution_seconds', time.perf_counter() - start)
+            task_stats.observe('memory_growth_bytes', max(rss_kb() - rss, 0) * 1024)
+
+    return wrapper
+
+
+def merge(items: Iterable[dict]) -> dict:
+    """
+    Merge stats of several workers.
+
+    :param items: Stats of each worker, as returned by *StatsRegister.to_dict*.
+    :return: Merged stats.
+    """
+    result = {}
+    for item in items:
+        for name, task_stats in item.items():
+            merged = result.setdefault(name, {'histograms': {}, 'counters': {}})
+            for k, v in task_stats['histograms'].items():
+                h = merged['histograms'].setdefault(k, {'bounds': v['bounds'], 'counts': [0] * len(v['counts']),
+                                                        'sum': 0.0})
+                h['counts'] = [a + b for a, b in zip(h['counts'], v['counts'])]
+                h['sum'] += v['sum']
+            for k, v in task_stats['counters'].items():
+                merged['counters'][k] = merged['counters'].get(k, 0) + v
+
+    return result
+
+
+def _percentile(histogram: dict, p: float) -> float:
+    """
+    Estimate a percentile as the upper bound of the bucket that contains it.
+    """
+    total = sum(histogram['counts'])
+    if not total:
+        return 0.0
+
+    rank, cumulative = p / 100 * total, 0
+    for bound, count in zip(histogram['bounds'] + [histogram['bounds'][-1]], histogram['counts']):
+        cumulative += count
+        if cumulative >= rank:
+            return bound
+
+    return histogram['bounds'][-1]  # pragma: no cover
+
+
+def summary(items: Dict[str, dict]) -> dict:
+    """
+    Summarize stats, giving count, mean, p50 and p99 of each histogram along with counters.
+
+    :param items: Stats.
+    :return: Stats summary.
+    """
+    result = {}
+    for name, task_stats in items.items():
+        task_summary = dict(task_stats['counters'])
+        for k, h in task_stats['histograms'].items():
+            count = sum(h['counts'])
+            task_summary[k] = {
+                'count': count,
+                'mean': h['sum'] / count if count else 0.0,
+                'p50': _percentile(h, 50),
+                'p99': _percentile(h, 99),
+            }
+        result[name] = task_summary
+
+    return result
+
+
+def to_prometheus(items: Dict[str, dict]) -> str:
+    """
+    Transform stats into Prometheus text format.
+
+    :param items: Stats.
+    :return: Stats in Prometheus text format.
+    """
+    def label(name):
+        return 'task="{}"'.format(name.replace('\\', '\\\\').replace('"', '\\"'))
+
+    lines = []
+    histograms = sorted({k for s in items.values() for k in s['histograms']})
+    for metric in histograms:
+        lines.append('# TYPE task_dispatcher_{} histogram'.format(metric))
+        for name, task_stats in sorted(items.items()):
+            h = task_stats['histograms'][metric]
+            cumulative = 0
+            for bound, count in zip(h['bounds'] + ['+Inf'], h['counts']):
+                cumulative += count
+                lines.append('task_dispatcher_{}_bucket{{{},le="{}"}} {}'.format(metric, label(name), bound,
+                                                                                 cumulative))
+            lines.append('task_dispatcher_{}_sum{{{}}} {}'.format(metric, label(name), h['sum']))
+            lines.append('task_dispatcher_{}_count{{{}}} {}'.format(metric, label(name), cumulative))
+
+    counters = sorted({k for s in items.values() for k in s['counters']})
+    for metric in counters:
+        lines.append('# TYPE task_dispatcher_{} counter'.format(metric))
+        for name, task_stats in sorted(items.items()):
+            lines.append('task_dispatcher_{}{{{}}} {}'.format(metric, label(name), task_stats['counters'][metric]))
+
+    return '\n'.join(lines) + '\n'
+
+
+def start_http_server(port: int, address: str='') -> 'HTTPServer':
+    """
+    Serve stats of current process in Prometheus text format from a daemon thread.
+
+    :param port: Port.
+    :param address: Address.
+    :return: HTTP server.
+    """
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+
+    class PrometheusHandler(BaseHTTPRequestHandler):
+        def do_GET(self):  # noqa
+            body = to_prometheus(stats.to_dict()).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):  # noqa
+            logger.debug(format, *args)
+
+    server = HTTPServer((address, port), PrometheusHandler)
+    thread = threading.Thread(target=server.serve_forever, name='task_dispatcher_stats', daemon=True)
+    thread.start()
+    return server
+
+
+def _on_before_task_publish(sender=None, headers=None, **kwargs):
+    if sender in stats:
+        headers[PUBLISHED_HEADER] = time.time()
+
+
+def _on_task_received(request=None, **kwargs):
+    task_stats = stats.get(request.name)
+    if task_stats is not None and isinstance(request.body, (bytes, bytearray, memoryview)):
+        task_stats.observe('payload_size_bytes', len(request.body))
+
+
+def _control_stats(state, **kwargs):
+    return stats.to_dict()
+
+
+def enable(port: int=None):
+    """
+    Enable instrumentation, adding a publish timestamp to messages of instrumented tasks, recording payload size of
+    messages received by workers and registering a remote control command that returns worker stats.
+
+    :param port: If given, workers serve stats in Prometheus text format in this port.
+    """
+    from celery.worker.control import inspect_command
+
+    inspect_command(name=CONTROL_COMMAND)(_control_stats)
+    signals.before_task_publish.connect(_on_before_task_publish, weak=False, dispatch_uid=__name__ + '.publish')
+    signals.task_received.connect(_on_task_received, weak=False, dispatch_uid=__name__ + '.received')
+
+    if port:
+        signals.worker_ready.connect(lambda **kwargs: start_http_server(port), weak=False,
+                                     dispatch_uid=__name__ + '.http')
+
+
+stats = StatsRegister()
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+Streaming producers.
+
+Items yielded by a producer generator are sent to a target consumer as they are produced, so memory stays flat no
+matter how many items are produced. The number of items sent is saved as a checkpoint every *checkpoint_interval*
+items, keyed by the producer task id, so a producer whose message is delivered again after being killed resumes from
+its last checkpoint instead of starting over. Items sent after the last checkpoint are sent again in that case.
+
+Generators receive the position to resume from in a reserved *stream_checkpoint* keyword-only argument, if declared, so
+it cannot be confused with arguments given by callers.
+"""
+import inspect
+import itertools
+import logging
+import os
+import tempfile
+from typing import Callable, Optional
+
+from celery import current_task
+from kombu.utils.imports import symbol_by_name
+
+from task_dispatcher.settings import settings
+from task_dispatcher.utils import wraps
+
+__all__ = ['CHECKPOINT', 'CheckpointStore', 'FileCheckpointStore', 'get_checkpoint_store', 'dispatching']
+
+logger = logging.getLogger(__name__)
+
+#: Reserved argument that receives the position to resume from.
+CHECKPOINT = 'stream_checkpoint'
+
+_checkpoint_store = None
+
+
+class CheckpointStore:
+    """
+    Storage of producers positions.
+    """
+    def get(self, key: str) -> Optional[int]:
+        """
+        Get a checkpoint.
+
+        :param key: Checkpoint key.
+        :return: Position or None if there is no checkpoint.
+        """
+        raise NotImplementedError
+
+    def set(self, key: str, position: int):
+        """
+        Save a checkpoint.
+
+        :param key: Checkpoint key.
+        :param position: Position.
+        """
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        """
+        Delete a checkpoint, if exists.
+
+        :param key: Checkpoint key.
+        """
+        raise NotImplementedError
+
+
+class FileCheckpointStore(CheckpointStore):
+    """
+    Checkpoint store that keeps each checkpoint in a file of a directory.
+    """
+    def __init__(self, path: str=None):
+        """
+        Checkpoint store that keeps each checkpoint in a file of a directory.
+
+        :param path: Directory path. A task_dispatcher/checkpoints directory in system temp directory by default.
+        """
+        self.path = path or os.path.join(tempfile.gettempdir(), 'task_dispatcher', 'checkpoints')
+
+    def get(self, key: str) -> Optional[int]:
+        try:
+            with open(os.path.join(self.path, key)) as f:
+                return int(f.read())
+        except FileNotFoundError:
+            return None
+
+    def set(self, key: str, position: int):
+        os.makedirs(self.path, exist_ok=True)
+
+        # Checkpoints are written to a temporary file and renamed, so a partial checkpoint is never read
+        path = os.path.join(self.path, key)
+        with open(path + '.tmp', 'w') as f:
+            f.write(str(position))
+        os.replace(path + '.tmp', path)
+
+    def delete(self, key: str):
+        try:
+            os.remove(os.path.join(self.path, key))
+        except FileNotFoundError:
+            pass
+
+
+def get_checkpoint_store() -> CheckpointStore:
+    """
+    Get the checkpoint store defined in settings.
+
+    :return: Checkpoint store.
+    """
+    global _checkpoint_store
+
+    if _checkpoint_store is None:
+        _checkpoint_store = symbol_by_name(settings.checkpoint_store)(settings.checkpoint_path)
+
+    return _checkpoint_store
+
+
+def dispatching(func: Callable, target, interval: int) -> Callable:
+    """
+    Wrap a generator function, so calling it sends each yielded item to a target consumer, as calling
+    *target.delay_many*, and returns the number of items sent.
+
+    When running as a task, a checkpoint is saved every *interval* items. Generators that declare a *stream_checkpoint*
+    keyword-only argument are called with the position to resume from, so they can seek to it, and the first items of
+    other generators are skipped up to that position.
+
+    :param func: Generator function.
+    :param target: Target consumer.
+    :param interval: Items sent between checkpoints.
+    :return: Wrapped function.
+    :raise ValueError: Checkpoint argument is not keyword-only.
+    """
+    parameter = inspect.signature(func).parameters.get(CHECKPOINT)
+    if parameter is not None and parameter.kind != parameter.KEYWORD_ONLY:
+        raise ValueError('Argument "{}" of streaming producers must be keyword-only'.format(CHECKPOINT))
+
+    seeks = parameter is not None
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if CHECKPOINT in kwargs:
+            raise TypeError('Argument "{}" is reserved for checkpoints of streaming producers'.format(CHECKPOINT))
+
+        request = current_task.request if current_task else None
+        store = get_checkpoint_store() if request is not None and not request.called_directly else None
+        position = (store.get(request.id) or 0) if store else 0
+        if position:
+            logger.info('Resuming producer "%s" from item %d', current_task.name, position)
+
+        if seeks:
+            items = func(*args, **dict(kwargs, **{CHECKPOINT: position}))
+        else:
+            items = itertools.islice(func(*args, **kwargs), position, None)
+
+        def checkpointed():
+            nonlocal position
+            for item in items:
+                yield (item,)
+
+                # Generator is resumed once previous item was sent
+                position += 1
+                if store and not position % interval:
+                    store.set(request.id, position)
+
+        target.apply_many(checkpointed())
+        if store:
+            store.delete(request.id)
+
+        return position
+
+    return wrapper
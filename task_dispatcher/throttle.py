@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+"""
+Cluster-wide throttling of task executions.
+
+Rate limits are enforced by a token bucket and concurrency caps by a counting semaphore, both kept in a backend shared
+by all workers. Each process takes tokens from the shared bucket in batches of up to *throttle_cache_time* seconds worth
+of rate, and spends them locally, so a single round-trip to the backend is needed per batch instead of per task. Cached
+tokens expire after that time, so they never add up to more than the configured rate.
+
+Throttled executions are published again with a countdown and their current execution finishes right away, so they do
+not occupy a pool process while waiting.
+"""
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from typing import Callable, Optional, Tuple, Union
+
+from celery import current_task
+from celery.exceptions import Ignore
+from celery.utils.time import rate as parse_rate
+from kombu.utils.imports import symbol_by_name
+
+from task_dispatcher.settings import settings
+from task_dispatcher.sqlite import SQLiteDatabase
+from task_dispatcher.stats import TaskStats
+from task_dispatcher.utils import wraps
+
+__all__ = ['ThrottleBackend', 'LocalThrottleBackend', 'SQLiteThrottleBackend', 'get_throttle_backend', 'Throttle',
+           'throttling']
+
+logger = logging.getLogger(__name__)
+
+_throttle_backend = None
+
+
+class ThrottleBackend:
+    """
+    Storage of token buckets and semaphores shared by all workers.
+    """
+    #: Whether the backend is shared by processes, or limits only apply to each process.
+    shared = True
+
+    def take(self, key: str, rate: float, count: int) -> Tuple[int, float]:
+        """
+        Take up to *count* tokens from a bucket that is refilled at *rate* tokens per second and holds up to one
+        second worth of tokens.
+
+        :param key: Bucket key.
+        :param rate: Tokens per second.
+        :param count: Maximum number of tokens to take.
+        :return: Number of tokens taken and, if none, seconds until next token is available.
+        """
+        raise NotImplementedError
+
+    def acquire(self, key: str, limit: int, ttl: float) -> Optional[str]:
+        """
+        Acquire a slot of a semaphore. Slots not released are released after *ttl* seconds, so slots of killed workers
+        are not held forever.
+
+        :param key: Semaphore key.
+        :param limit: Maximum number of slots.
+        :param ttl: Seconds that a slot is held.
+        :return: Slot id or None if all slots are held.
+        """
+        raise NotImplementedError
+
+    def release(self, key: str, slot: str):
+        """
+        Release a slot of a semaphore.
+
+        :param key: Semaphore key.
+        :param slot: Slot id.
+        """
+        raise NotImplementedError
+
+
+def _refill(tokens: float, updated: float, rate: float, now: float) -> float:
+    return min(max(rate, 1.0), tokens + (now - updated) * rate)
+
+
+class LocalThrottleBackend(ThrottleBackend):
+    """
+    Throttle backend kept in memory of current process, only suitable for single process workers and tests.
+    """
+    shared = False
+
+    def __init__(self, path: str=None):
+        """
+        Throttle backend kept in memory of current process.
+
+        :param path: Ignored.
+        """
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._slots = {}
+
+    def take(self, key: str, rate: float, count: int) -> Tuple[int, float]:
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (max(rate, 1.0), now))
+            tokens = _refill(tokens, updated, rate, now)
+            taken = min(count, int(tokens))
+            self._buckets[key] = (tokens - taken, now)
+
+        return taken, 0.0 if taken else (1.0 - tokens) / rate
+
+    def acquire(self, key: str, limit: int, ttl: float) -> Optional[str]:
+        now = time.monotonic()
+        with self._lock:
+            slots = {k: v for k, v in self._slots.get(key, {}).items() if v > now}
+            slot = None
+            if len(slots) < limit:
+                slot = uuid.uuid4().hex
+                slots[slot] = now + ttl
+            self._slots[key] = slots
+
+        return slot
+
+    def release(self, key: str, slot: str):
+        with self._lock:
+            self._slots.get(key, {}).pop(slot, None)
+
+
+class SQLiteThrottleBackend(SQLiteDatabase, ThrottleBackend):
+    """
+    Throttle backend kept in a SQLite database, shared by all workers of a host or of hosts sharing a filesystem that
+    supports file locking.
+    """
+    schema = (
+        'CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)',
+        'CREATE TABLE IF NOT EXISTS slots '
+        '(key TEXT NOT NULL, slot TEXT NOT NULL, expires REAL NOT NULL, PRIMARY KEY (key, slot))',
+    )
+
+    def __init__(self, path: str=None):
+        """
+        Throttle backend kept in a SQLite database.
+
+        :param path: Database path. A task_dispatcher/throttle.db file in system temp directory by default.
+        """
+        super().__init__(path or os.path.join(tempfile.gettempdir(), 'task_dispatcher', 'throttle.db'))
+
+    def take(self, key: str, rate: float, count: int) -> Tuple[int, float]:
+        # Wall clock is used, since buckets are shared between processes
+        now = time.time()
+
+        def take(connection):
+            row = connection.execute('SELECT tokens, updated FROM buckets WHERE key = ?', (key,)).fetchone()
+            tokens = _refill(*row, rate, now) if row else max(rate, 1.0)
+            taken = min(count, int(tokens))
+            connection.execute('INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)',
+                               (key, tokens - taken, now))
+            return taken, 0.0 if taken else (1.0 - tokens) / rate
+
+        return self._transaction(take)
+
+    def acquire(self, key: str, limit: int, ttl: float) -> Optional[str]:
+        now = time.time()
+
+        def acquire(connection):
+            connection.execute('DELETE FROM slots WHERE key = ? AND expires <= ?', (key, now))
+            held, = connection.execute('SELECT COUNT(*) FROM slots WHERE key = ?', (key,)).fetchone()
+            if held >= limit:
+                return None
+
+            slot = uuid.uuid4().hex
+            connection.execute('INSERT INTO slots (key, slot, expires) VALUES (?, ?, ?)', (key, slot, now + ttl))
+            return slot
+
+        return self._transaction(acquire)
+
+    def release(self, key: str, slot: str):
+        self._transaction(lambda c: c.execute('DELETE FROM slots WHERE key = ? AND slot = ?', (key, slot)))
+
+
+def get_throttle_backend() -> ThrottleBackend:
+    """
+    Get the throttle backend defined in settings.
+
+    :return: Throttle backend.
+    """
+    global _throttle_backend
+
+    if _throttle_backend is None:
+        _throttle_backend = symbol_by_name(settings.throttle_backend)(settings.throttle_path)
+
+    return _throttle_backend
+
+
+class Throttle:
+    """
+    Rate limit and concurrency cap of a task, shared by all workers.
+    """
+    def __init__(self, name: str, max_rate: Union[str, float]=None, max_concurrency: int=None,
+                 backend: ThrottleBackend=None):
+        """
+        Rate limit and concurrency cap of a task, shared by all workers.
+
+        :param name: Task name, used as key in backend.
+        :param max_rate: Executions per second, or a rate string such as '100/m'.
+        :param max_concurrency: Maximum number of executions running at the same time.
+        :param backend: Throttle backend. Backend defined in settings by default.
+        """
+        self.name = name
+        self.max_rate = parse_rate(max_rate)
+        self.max_concurrency = max_concurrency
+        self._backend = backend
+        self._lock = threading.Lock()
+        self._tokens = 0
+        self._expires = 0.0
+
+    @property
+    def backend(self) -> ThrottleBackend:
+        return self._backend or get_throttle_backend()
+
+    def _take(self) -> float:
+        """
+        Take a token, from local cache if possible.
+
+        :return: Seconds to wait until a token is available, 0 if taken.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._tokens and now < self._expires:
+                self._tokens -= 1
+                return 0.0
+
+            batch = max(1, int(self.max_rate * settings.throttle_cache_time))
+            taken, wait = self.backend.take(self.name, self.max_rate, batch)
+            if not taken:
+                self._tokens = 0
+                return wait
+
+            self._tokens, self._expires = taken - 1, now + settings.throttle_cache_time
+            return 0.0
+
+    def acquire(self) -> Tuple[Optional[str], float]:
+        """
+        Acquire permission to run an execution.
+
+        :return: Concurrency slot, if any, and seconds to wait before trying again, 0 if acquired.
+        """
+        slot = None
+        if self.max_concurrency:
+            slot = self.backend.acquire(self.name, self.max_concurrency, settings.throttle_slot_ttl)
+            if slot is None:
+                return None, settings.throttle_interval
+
+        wait = self._take() if self.max_rate else 0.0
+        if wait and slot is not None:
+            self.release(slot)
+            slot = None
+
+        return slot, wait
+
+    def release(self, slot: Optional[str]):
+        """
+        Release a concurrency slot.
+
+        :param slot: Slot, as returned by acquire.
+        """
+        if slot is not None:
+            self.backend.release(self.name, slot)
+
+
+def throttling(func: Callable, throttle: Throttle, task_stats: TaskStats) -> Callable:
+    """
+    Wrap a task function, so executions over its rate limit or concurrency cap are deferred. Worker executions are
+    published again with a countdown, while eager executions wait. Direct calls are not throttled.
+
+    :param func: Task function.
+    :param throttle: Task throttle.
+    :param task_stats: Task stats where throttled executions are counted.
+    :return: Wrapped function.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        task = current_task
+        if not task or task.request.called_directly:
+            return func(*args, **kwargs)
+
+        slot, wait = throttle.acquire()
+        while wait:
+            task_stats.increment('throttled_total')
+            if not task.request.is_eager:
+                logger.debug('Throttled task "%s" deferred %.3f seconds', throttle.name, wait)
+                task.signature_from_request(task.request, countdown=wait).apply_async()
+                raise Ignore()
+
+            time.sleep(wait)
+            slot, wait = throttle.acquire()
+
+        try:
+            return func(*args, **kwargs)
+        finally:
+            throttle.release(slot)
+
+    return wrapper
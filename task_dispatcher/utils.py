@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+Utilities.
+"""
+import functools
+import inspect
+import os
+import resource
+import sys
+from typing import Callable
+
+__all__ = ['wraps', 'is_method', 'rss_kb']
+
+
+def wraps(wrapped: Callable) -> Callable:
+    """
+    Same as functools.wraps but also keeping the signature of wrapped function, so Celery is still able to check the
+    arguments given when calling a task whose function is wrapped.
+
+    :param wrapped: Wrapped function.
+    :return: Decorator that updates the wrapper function.
+    """
+    def decorator(wrapper):
+        wrapper = functools.wraps(wrapped)(wrapper)
+        wrapper.__signature__ = inspect.signature(wrapped)
+        return wrapper
+
+    return decorator
+
+
+def is_method(func: Callable) -> bool:
+    """
+    Check if a function is defined in a class, from its qualified name, since methods are still plain functions when
+    their class body is run.
+
+    :param func: Function.
+    :return: True if function is a method.
+    """
+    # Qualified name of methods ends with its class name, e.g: Foo.bar or foo.<locals>.Foo.bar
+    return func.__qualname__.split('.')[-2:-1] not in ([], ['<locals>'])
+
+
+def rss_kb() -> int:
+    """
+    Get current resident set size of this process. Where current RSS is not available, peak RSS of the process is
+    returned instead.
+
+    :return: RSS in KB.
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+    except (OSError, ValueError, IndexError):
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Peak RSS is given in bytes on macOS and in KB everywhere else
+        return max_rss // 1024 if sys.platform == 'darwin' else max_rss
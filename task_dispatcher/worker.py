@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+Worker components.
+"""
+import logging
+
+from celery.app.trace import build_tracer
+from celery.worker.consumer import Consumer as CeleryConsumer
+
+from task_dispatcher.lanes import LaneQueue
+
+__all__ = ['Consumer', 'LazyStrategies']
+
+logger = logging.getLogger(__name__)
+
+
+class LazyStrategies(dict):
+    """
+    Execution strategies of tasks, that are started the first time a task is received.
+    """
+    def __init__(self, consumer, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.consumer = consumer
+
+    def __missing__(self, key):
+        app, consumer = self.consumer.app, self.consumer
+
+        # Raises NotRegistered, a KeyError, if the task cannot be found
+        task = app.tasks[key]
+
+        self[key] = task.start_strategy(app, consumer)
+        task.__trace__ = build_tracer(key, task, app.loader, consumer.hostname, app=app)
+        return self[key]
+
+
+class Consumer(CeleryConsumer):
+    """
+    Worker consumer that starts execution strategies of tasks the first time they are received, so tasks modules can be
+    imported on demand from a tasks manifest.
+
+    When the worker is given priority lanes, requests waiting for a pool process are handed to the pool by weighted fair
+    queuing between lanes.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.strategies = LazyStrategies(self)
+
+        lanes = getattr(self.controller, 'options', {}).get('lanes')
+        if lanes:
+            semaphore = getattr(self.controller, 'semaphore', None)
+            if semaphore is None:
+                logger.warning('Lanes are consumed in arrival order, since pool does not queue waiting requests')
+            else:
+                self.lanes = LaneQueue(lanes, on_pause=self.pause_lane, on_resume=self.resume_lane)
+                self.lanes.install(semaphore)
+
+    def pause_lane(self, queue: str):
+        """
+        Stop consuming messages from the queue of a lane.
+
+        :param queue: Queue name.
+        """
+        if self.task_consumer is not None:
+            self.task_consumer.cancel_by_queue(queue)
+
+    def resume_lane(self, queue: str):
+        """
+        Resume consuming messages from the queue of a lane.
+
+        :param queue: Queue name.
+        """
+        if self.task_consumer is not None:
+            self.add_task_queue(queue)
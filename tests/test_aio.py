@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import inspect
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.case import TestCase
+from unittest.mock import patch
+
+import pytest
+
+from task_dispatcher.aio import EventLoop, run_async
+
+
+async def sleep_and_return(value, delay=0.0):
+    await asyncio.sleep(delay)
+    return value
+
+
+class EventLoopTestCase(TestCase):
+    def setUp(self):
+        self.event_loop = EventLoop()
+
+    def tearDown(self):
+        self.event_loop.stop()
+
+    @pytest.mark.high
+    def test_run(self):
+        self.assertEqual(self.event_loop.run(sleep_and_return(1)), 1)
+        self.assertIs(self.event_loop.loop, self.event_loop.loop)
+
+    @pytest.mark.high
+    def test_run_raises(self):
+        async def fail():
+            raise ValueError
+
+        with self.assertRaises(ValueError):
+            self.event_loop.run(fail())
+
+    @pytest.mark.high
+    def test_run_concurrently(self):
+        with ThreadPoolExecutor(max_workers=20) as executor:
+            start = time.perf_counter()
+            results = list(executor.map(lambda i: self.event_loop.run(sleep_and_return(i, 0.2)), range(20)))
+            elapsed = time.perf_counter() - start
+
+        self.assertEqual(results, list(range(20)))
+        self.assertLess(elapsed, 2.0)
+
+    @pytest.mark.mid
+    def test_new_loop_after_fork(self):
+        loop = self.event_loop.loop
+
+        with patch('task_dispatcher.aio.os.getpid', return_value=-1):
+            self.assertIsNot(self.event_loop.loop, loop)
+
+        loop.call_soon_threadsafe(loop.stop)
+
+    @pytest.mark.low
+    def test_stop(self):
+        loop = self.event_loop.loop
+
+        self.event_loop.stop()
+        self.event_loop.stop()
+
+        for _ in range(100):
+            if not loop.is_running():
+                break
+            time.sleep(0.01)
+        self.assertFalse(loop.is_running())
+
+
+class RunAsyncTestCase(TestCase):
+    @pytest.mark.high
+    def test_run_async(self):
+        func = run_async(sleep_and_return)
+
+        self.assertFalse(inspect.iscoroutinefunction(func))
+        self.assertEqual(str(inspect.signature(func)), '(value, delay=0.0)')
+        self.assertEqual(func(2), 2)
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+from unittest.case import TestCase
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from task_dispatcher.autoscale import Autoscaler
+from task_dispatcher.stats import StatsRegister
+
+
+class AutoscalerTestCase(TestCase):
+    def setUp(self):
+        self.pool = MagicMock(num_processes=2)
+        self.worker = MagicMock()
+        self.worker.app.amqp.queues.consume_from = {'consumer': MagicMock()}
+        self.autoscaler = Autoscaler(self.pool, 10, 1, worker=self.worker, keepalive=30, drain_time=1.0,
+                                     hysteresis=0.5, cpu_threshold=0.9)
+        self.autoscaler.queue_depth = MagicMock(return_value=0)
+        self.stats = StatsRegister()
+
+        self.stats_patcher = patch('task_dispatcher.autoscale.stats.stats', self.stats)
+        self.stats_patcher.start()
+        self.load_patcher = patch('task_dispatcher.autoscale.os.getloadavg', return_value=(0.0, 0.0, 0.0))
+        self.load_mock = self.load_patcher.start()
+        self.logger_patcher = patch('celery.worker.autoscale.info')
+        self.logger_patcher.start()
+
+    def tearDown(self):
+        self.stats_patcher.stop()
+        self.load_patcher.stop()
+        self.logger_patcher.stop()
+
+    @pytest.mark.high
+    def test_qty_without_execution_time(self):
+        self.autoscaler.queue_depth.return_value = 7
+
+        self.assertEqual(self.autoscaler.qty, 7)
+        self.assertEqual(self.autoscaler.queue_depth.call_args[0], ('consumer',))
+
+    @pytest.mark.high
+    def test_qty_with_execution_time(self):
+        self.autoscaler.queue_depth.return_value = 30
+        task_stats = self.stats.register('foo')
+        for _ in range(4):
+            task_stats.observe('execution_seconds', 0.1)
+
+        self.assertEqual(self.autoscaler.qty, 3)
+
+    @pytest.mark.high
+    def test_execution_time_window(self):
+        task_stats = self.stats.register('foo')
+        task_stats.observe('execution_seconds', 1.0)
+        self.assertAlmostEqual(self.autoscaler.execution_time, 1.0)
+
+        task_stats.observe('execution_seconds', 0.5)
+        task_stats.observe('execution_seconds', 0.5)
+        self.assertAlmostEqual(self.autoscaler.execution_time, 0.5)
+
+        self.assertAlmostEqual(self.autoscaler.execution_time, 0.5)
+
+    @pytest.mark.high
+    def test_scale_up(self):
+        self.autoscaler.queue_depth.return_value = 5
+
+        self.autoscaler.maybe_scale()
+
+        self.pool.grow.assert_called_once_with(3)
+
+    @pytest.mark.high
+    def test_scale_up_bounded(self):
+        self.autoscaler.queue_depth.return_value = 100
+
+        self.autoscaler.maybe_scale()
+
+        self.pool.grow.assert_called_once_with(8)
+
+    @pytest.mark.high
+    def test_scale_up_cpu_saturated(self):
+        self.autoscaler.queue_depth.return_value = 5
+        self.load_mock.return_value = (1000.0, 0.0, 0.0)
+
+        self.autoscaler.maybe_scale()
+
+        self.assertEqual(self.pool.grow.call_count, 0)
+
+    @pytest.mark.high
+    def test_scale_down(self):
+        self.pool.num_processes = 6
+
+        self.autoscaler.maybe_scale()
+
+        self.pool.shrink.assert_called_once_with(5)
+
+    @pytest.mark.high
+    def test_scale_down_hysteresis(self):
+        self.pool.num_processes = 6
+        self.autoscaler.queue_depth.return_value = 4
+
+        self.autoscaler.maybe_scale()
+
+        self.assertEqual(self.pool.shrink.call_count, 0)
+
+    @pytest.mark.high
+    def test_scale_down_keepalive(self):
+        self.autoscaler.queue_depth.return_value = 6
+        self.autoscaler.maybe_scale()
+        self.pool.num_processes = 6
+        self.autoscaler.queue_depth.return_value = 0
+
+        self.autoscaler.maybe_scale()
+
+        self.assertEqual(self.pool.shrink.call_count, 0)
+
+    @pytest.mark.mid
+    def test_info(self):
+        info = self.autoscaler.info()
+
+        self.assertEqual(info['current'], 2)
+        self.assertEqual(info['drain_time'], 1.0)
+        self.assertEqual(info['hysteresis'], 0.5)
+
+    @pytest.mark.mid
+    def test_defaults_from_settings(self):
+        with patch('task_dispatcher.autoscale.settings') as settings_mock:
+            settings_mock.autoscale_drain_time = 5.0
+            settings_mock.autoscale_hysteresis = 0.1
+            settings_mock.autoscale_cpu_threshold = 0.5
+            autoscaler = Autoscaler(self.pool, 10, 1, worker=self.worker)
+
+        self.assertEqual(autoscaler.drain_time, 5.0)
+        self.assertEqual(autoscaler.hysteresis, 0.1)
+        self.assertEqual(autoscaler.cpu_threshold, 0.5)
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+from unittest.case import TestCase
+from unittest.mock import MagicMock, patch, call
+
+import pytest
+
+from task_dispatcher import stats
+from task_dispatcher.batches import BatchItem, BatchTask, apply_batch
+
+
+class BatchItemTestCase(TestCase):
+    @pytest.mark.high
+    def test_item_single_arg(self):
+        item = BatchItem(id='1', args=(1,), kwargs={})
+
+        self.assertEqual(item.item, 1)
+
+    @pytest.mark.high
+    def test_item_several_args(self):
+        item = BatchItem(id='1', args=(1, 2), kwargs={})
+
+        self.assertEqual(item.item, (1, 2))
+
+    @pytest.mark.high
+    def test_item_kwargs(self):
+        item = BatchItem(id='1', args=(1,), kwargs={'y': 2})
+
+        self.assertEqual(item.item, ((1,), {'y': 2}))
+
+    @pytest.mark.high
+    def test_from_request(self):
+        request = MagicMock(request_dict={'id': '1', 'args': (1,), 'kwargs': {}})
+
+        item = BatchItem.from_request(request)
+
+        self.assertEqual(item.id, '1')
+        self.assertEqual(item.item, 1)
+        self.assertIsNone(item.chord)
+
+
+class ApplyBatchTestCase(TestCase):
+    def setUp(self):
+        self.task = MagicMock(ignore_result=False)
+        self.batch = [BatchItem(id=str(i), args=(i,), kwargs={}) for i in range(3)]
+
+    @pytest.mark.high
+    def test_apply_batch(self):
+        self.task.return_value = [0, 1, 4]
+
+        with patch('task_dispatcher.batches.app') as celery_app_mock:
+            celery_app_mock.tasks = {'foo': self.task}
+            apply_batch('foo', self.batch)
+
+        self.assertEqual(self.task.call_args_list, [call([0, 1, 2])])
+        self.assertEqual(self.task.backend.mark_as_done.call_args_list, [
+            call('0', 0, request=self.batch[0]),
+            call('1', 1, request=self.batch[1]),
+            call('2', 4, request=self.batch[2]),
+        ])
+
+    @pytest.mark.high
+    def test_apply_batch_stats(self):
+        self.task.return_value = [0, 1, 4]
+        task_stats = stats.TaskStats('foo')
+        self.batch[0].update({stats.PUBLISHED_HEADER: 1.0})
+
+        with patch('task_dispatcher.batches.app') as celery_app_mock, \
+                patch.dict(stats.stats, {'foo': task_stats}):
+            celery_app_mock.tasks = {'foo': self.task}
+            apply_batch('foo', self.batch)
+
+        histograms = task_stats.to_dict()['histograms']
+        self.assertEqual(sum(histograms['queue_wait_seconds']['counts']), 1)
+        self.assertEqual(sum(histograms['execution_seconds']['counts']), 1)
+
+    @pytest.mark.high
+    def test_apply_batch_without_results(self):
+        self.task.return_value = None
+
+        with patch('task_dispatcher.batches.app') as celery_app_mock:
+            celery_app_mock.tasks = {'foo': self.task}
+            apply_batch('foo', self.batch)
+
+        self.assertEqual(self.task.backend.mark_as_done.call_count, 3)
+
+    @pytest.mark.high
+    def test_apply_batch_wrong_results(self):
+        self.task.return_value = [0]
+
+        with patch('task_dispatcher.batches.app') as celery_app_mock, patch('task_dispatcher.batches.logger'):
+            celery_app_mock.tasks = {'foo': self.task}
+            apply_batch('foo', self.batch)
+
+        self.assertEqual(self.task.backend.mark_as_done.call_count, 0)
+        self.assertEqual(self.task.backend.mark_as_failure.call_count, 3)
+        self.assertIsInstance(self.task.backend.mark_as_failure.call_args[0][1], ValueError)
+
+    @pytest.mark.high
+    def test_apply_batch_ignore_result(self):
+        self.task.ignore_result = True
+
+        with patch('task_dispatcher.batches.app') as celery_app_mock:
+            celery_app_mock.tasks = {'foo': self.task}
+            apply_batch('foo', self.batch)
+
+        self.assertEqual(self.task.backend.mark_as_done.call_count, 0)
+
+    @pytest.mark.high
+    def test_apply_batch_fails(self):
+        self.task.side_effect = ValueError
+
+        with patch('task_dispatcher.batches.app') as celery_app_mock, patch('task_dispatcher.batches.logger'):
+            celery_app_mock.tasks = {'foo': self.task}
+            apply_batch('foo', self.batch)
+
+        self.assertEqual(self.task.backend.mark_as_failure.call_count, 3)
+
+
+class BatchTaskTestCase(TestCase):
+    def setUp(self):
+        self.task = BatchTask()
+        self.task.name = 'foo'
+        self.task.batch_size = 2
+        self.consumer = MagicMock()
+        self.consumer.qos.value = 8
+        self.requests = []
+
+        def request(message, **kwargs):
+            r = MagicMock(request_dict={'id': str(len(self.requests)), 'args': (message.value,), 'kwargs': {}})
+            self.requests.append(r)
+            return r
+
+        with patch('task_dispatcher.batches.symbol_by_name') as symbol_mock:
+            symbol_mock.return_value = request
+            self.handler = self.task.Strategy(self.task, MagicMock(), self.consumer)
+
+    @pytest.mark.high
+    def test_buffer(self):
+        self.handler(MagicMock(value=1), None, MagicMock(), MagicMock(), [])
+
+        self.assertEqual(self.consumer.pool.apply_async.call_count, 0)
+        self.assertEqual(self.consumer.timer.call_repeatedly.call_args_list, [call(1.0, self.task.flush)])
+
+    @pytest.mark.high
+    def test_flush_on_batch_size(self):
+        for i in range(3):
+            self.handler(MagicMock(value=i), None, MagicMock(), MagicMock(), [])
+
+        self.assertEqual(self.consumer.pool.apply_async.call_count, 1)
+        target, (name, batch) = self.consumer.pool.apply_async.call_args[0]
+        self.assertEqual(target, apply_batch)
+        self.assertEqual(name, 'foo')
+        self.assertEqual([i.item for i in batch], [0, 1])
+        self.assertEqual(self.consumer.timer.call_repeatedly.call_count, 1)
+
+    @pytest.mark.high
+    def test_flush(self):
+        self.handler(MagicMock(value=1), None, MagicMock(), MagicMock(), [])
+
+        self.task.flush()
+
+        self.assertEqual(self.consumer.pool.apply_async.call_count, 1)
+        self.assertEqual(len(self.task._buffer), 0)
+
+    @pytest.mark.high
+    def test_acknowledge_on_accepted(self):
+        self.handler(MagicMock(value=1), None, MagicMock(), MagicMock(), [])
+        self.handler(MagicMock(value=2), None, MagicMock(), MagicMock(), [])
+        kwargs = self.consumer.pool.apply_async.call_args[1]
+
+        kwargs['callback']()
+        self.assertEqual(sum(r.acknowledge.call_count for r in self.requests), 0)
+
+        kwargs['accept_callback'](1, 0)
+        self.assertEqual(sum(r.acknowledge.call_count for r in self.requests), 2)
+
+    @pytest.mark.high
+    def test_acknowledge_late(self):
+        self.task.acks_late = True
+        self.handler(MagicMock(value=1), None, MagicMock(), MagicMock(), [])
+        self.handler(MagicMock(value=2), None, MagicMock(), MagicMock(), [])
+        kwargs = self.consumer.pool.apply_async.call_args[1]
+
+        kwargs['accept_callback'](1, 0)
+        self.assertEqual(sum(r.acknowledge.call_count for r in self.requests), 0)
+
+        kwargs['callback']()
+        self.assertEqual(sum(r.acknowledge.call_count for r in self.requests), 2)
+
+    @pytest.mark.high
+    def test_reject_on_error(self):
+        self.handler(MagicMock(value=1), None, MagicMock(), MagicMock(), [])
+        self.handler(MagicMock(value=2), None, MagicMock(), MagicMock(), [])
+        kwargs = self.consumer.pool.apply_async.call_args[1]
+
+        kwargs['error_callback'](ValueError())
+
+        self.assertEqual([r.reject.call_args_list for r in self.requests], [[call(requeue=False)]] * 2)
+
+    @pytest.mark.high
+    def test_prefetch_raised_for_full_batch(self):
+        self.handler(MagicMock(value=1), None, MagicMock(), MagicMock(), [])
+        self.handler(MagicMock(value=2), None, MagicMock(), MagicMock(), [])
+
+        self.assertEqual(self.consumer.qos.increment_eventually.call_args_list, [call(2)])
+
+    @pytest.mark.high
+    def test_prefetch_raised_after_reconnection(self):
+        self.handler(MagicMock(value=1), None, MagicMock(), MagicMock(), [])
+        self.consumer.qos = MagicMock()
+
+        self.handler(MagicMock(value=2), None, MagicMock(), MagicMock(), [])
+
+        self.assertEqual(self.consumer.qos.increment_eventually.call_args_list, [call(2)])
+
+    @pytest.mark.mid
+    def test_batch_size_over_prefetch(self):
+        from kombu.common import QoS
+
+        # Prefetch of a worker with concurrency 1 is lower than batch size
+        self.task.batch_size = 10
+        self.consumer.qos = QoS(MagicMock(), 4)
+
+        for i in range(10):
+            self.handler(MagicMock(value=i), None, MagicMock(), MagicMock(), [])
+
+        self.assertEqual(self.consumer.qos.value, 14)
+        self.assertEqual(self.consumer.pool.apply_async.call_count, 1)
+        self.assertEqual(len(self.consumer.pool.apply_async.call_args[0][1][1]), 10)
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+from unittest.case import TestCase
+from unittest.mock import patch
+
+import pytest
+
+from task_dispatcher.bench import app as bench_app, codec, percentile, pipeline, proxy, rss_kb, run
+from task_dispatcher.celery import app as task_dispatcher_app
+from task_dispatcher.register import register
+
+
+class PercentileTestCase(TestCase):
+    @pytest.mark.low
+    def test_percentile(self):
+        values = list(range(101))
+
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile(values, 100), 100)
+
+    @pytest.mark.low
+    def test_percentile_empty(self):
+        self.assertEqual(percentile([], 50), 0.0)
+
+
+class RssTestCase(TestCase):
+    @pytest.mark.low
+    def test_rss(self):
+        self.assertGreater(rss_kb(), 0)
+
+    @pytest.mark.low
+    def test_rss_without_proc(self):
+        with patch('task_dispatcher.utils.open', side_effect=OSError, create=True), \
+                patch('task_dispatcher.utils.resource.getrusage') as getrusage_mock, \
+                patch('task_dispatcher.utils.sys') as sys_mock:
+            getrusage_mock.return_value.ru_maxrss = 2048
+            sys_mock.platform = 'darwin'
+
+            self.assertEqual(rss_kb(), 2)
+
+
+class BenchTestCase(TestCase):
+    @pytest.mark.low
+    def test_pipeline(self):
+        expected_keys = {'payload_size', 'concurrency', 'serializer', 'messages', 'tasks_per_second', 'enqueue_us',
+                         'latency_p50_ms', 'latency_p99_ms', 'rss_kb', 'rss_delta_kb', 'encode_us', 'decode_us',
+                         'message_bytes'}
+
+        result = pipeline(messages=50, payload_size=8, concurrency=2)
+
+        self.assertEqual(set(result.keys()), expected_keys)
+        self.assertEqual(result['messages'], 50)
+        self.assertGreater(result['tasks_per_second'], 0)
+        self.assertLessEqual(result['latency_p50_ms'], result['latency_p99_ms'])
+
+    @pytest.mark.low
+    def test_pipeline_serializer(self):
+        result = pipeline(messages=20, payload_size=8, concurrency=1, serializer='pickle5+zlib')
+
+        self.assertEqual(result['serializer'], 'pickle5+zlib')
+        self.assertEqual(result['messages'], 20)
+
+    @pytest.mark.low
+    def test_pipeline_consumer_fails(self):
+        with patch('task_dispatcher.bench.prepare_accept_content', side_effect=ValueError('foo')):
+            with self.assertRaises(ValueError):
+                pipeline(messages=20, payload_size=8, concurrency=2, timeout=5.0)
+
+    @pytest.mark.low
+    def test_pipeline_timeout(self):
+        with patch('task_dispatcher.bench._consumer'):
+            with self.assertRaises(TimeoutError):
+                pipeline(messages=20, payload_size=8, concurrency=2, timeout=0.1)
+
+    @pytest.mark.low
+    def test_codec(self):
+        raw = codec('x' * 8192, 'json', 5)
+        compressed = codec('x' * 8192, 'json+zlib', 5)
+
+        self.assertLess(compressed['message_bytes'], raw['message_bytes'])
+        self.assertGreater(raw['encode_us'], 0)
+        self.assertGreater(raw['decode_us'], 0)
+
+    @pytest.mark.low
+    def test_proxy(self):
+        result = proxy(10)
+
+        self.assertEqual(set(result.keys()), {'delay_us', 'method_delay_us', 'attribute_us', 'method_attribute_us'})
+        self.assertTrue(all(v > 0 for v in result.values()))
+
+    @pytest.mark.mid
+    def test_proxy_tasks_not_registered(self):
+        proxy(1)
+
+        self.assertFalse(any(name.startswith('task_dispatcher.bench') for name in register.consumers))
+        self.assertNotIn('task_dispatcher.bench.proxied', task_dispatcher_app.tasks)
+        self.assertIn('task_dispatcher.bench.proxied', bench_app.tasks)
+
+    @pytest.mark.low
+    def test_run(self):
+        result = run(messages=10, payload_sizes=(8, 16), concurrency=(1, 2), serializers=('json', 'msgpack'))
+
+        self.assertEqual(len(result['pipelines']), 8)
+        self.assertIn('delay_us', result['proxy'])
+        self.assertIn('celery', result)
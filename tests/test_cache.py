@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+from unittest.case import TestCase
+from unittest.mock import patch
+
+import pytest
+
+from task_dispatcher.cache import LRUCache
+
+
+class LRUCacheTestCase(TestCase):
+    @pytest.mark.high
+    def test_get_set(self):
+        cache = LRUCache(maxsize=10, ttl=60.0)
+
+        self.assertEqual(cache.get('foo'), (False, None))
+        cache.set('foo', None)
+        self.assertEqual(cache.get('foo'), (True, None))
+        cache.set('foo', 1)
+        self.assertEqual(cache.get('foo'), (True, 1))
+
+    @pytest.mark.high
+    def test_get_expired(self):
+        cache = LRUCache(maxsize=10, ttl=1.0)
+
+        with patch('task_dispatcher.cache.time.monotonic', side_effect=[0.0, 0.5, 2.0]):
+            cache.set('foo', 1)
+            self.assertEqual(cache.get('foo'), (True, 1))
+            self.assertEqual(cache.get('foo'), (False, None))
+
+    @pytest.mark.high
+    def test_evict_least_recently_used(self):
+        cache = LRUCache(maxsize=2, ttl=60.0)
+
+        cache.set('foo', 1)
+        cache.set('bar', 2)
+        cache.get('foo')
+        cache.set('baz', 3)
+
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get('foo'), (True, 1))
+        self.assertEqual(cache.get('bar'), (False, None))
+
+    @pytest.mark.mid
+    def test_add(self):
+        cache = LRUCache(maxsize=10, ttl=60.0)
+
+        self.assertTrue(cache.add('foo', 1))
+        self.assertFalse(cache.add('foo', 2))
+        self.assertEqual(cache.get('foo'), (True, 1))
+
+    @pytest.mark.mid
+    def test_discard(self):
+        cache = LRUCache(maxsize=10, ttl=60.0)
+        cache.set('foo', 1)
+
+        cache.discard('foo')
+        cache.discard('foo')
+
+        self.assertEqual(cache.get('foo'), (False, None))
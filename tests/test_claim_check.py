@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+import array
+import inspect
+import os
+import tempfile
+from unittest.case import TestCase
+from unittest.mock import MagicMock, patch
+
+import pytest
+from celery.exceptions import Retry
+
+from task_dispatcher import claim_check
+from task_dispatcher.celery import app
+from task_dispatcher.claim_check import (REFERENCE, BlobStore, FileBlobStore, get_store, offload, references, resolve,
+                                         resolving)
+
+
+class FileBlobStoreTestCase(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = FileBlobStore(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    @pytest.mark.high
+    def test_put_get_delete(self):
+        key = self.store.put(memoryview(b'foo'))
+
+        self.assertEqual(bytes(self.store.get(key)), b'foo')
+        self.assertEqual(os.listdir(self.directory.name), [key])
+
+        self.store.delete(key)
+        self.store.delete(key)
+
+        self.assertEqual(os.listdir(self.directory.name), [])
+
+    @pytest.mark.mid
+    def test_get_empty(self):
+        key = self.store.put(memoryview(b''))
+
+        self.assertEqual(bytes(self.store.get(key)), b'')
+
+    @pytest.mark.high
+    def test_invalid_key(self):
+        with open(os.path.join(self.directory.name, 'foo'), 'wb') as f:
+            f.write(b'foo')
+
+        for key in ('foo', '../' + 'a' * 32, 'A' * 32, 'a' * 33, None):
+            self.assertRaises(ValueError, self.store.get, key)
+            self.assertRaises(ValueError, self.store.delete, key)
+
+        self.assertEqual(os.listdir(self.directory.name), ['foo'])
+
+    @pytest.mark.mid
+    def test_key_outside_directory(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        key = self.store.put(memoryview(b'foo'))
+        os.rename(os.path.join(self.directory.name, key), os.path.join(directory.name, key))
+        os.symlink(os.path.join(directory.name, key), os.path.join(self.directory.name, key))
+
+        self.assertRaises(ValueError, self.store.get, key)
+
+    @pytest.mark.low
+    def test_default_path(self):
+        self.assertEqual(FileBlobStore().path, os.path.join(tempfile.gettempdir(), 'task_dispatcher'))
+
+
+class BlobStoreTestCase(TestCase):
+    @pytest.mark.low
+    def test_not_implemented(self):
+        store = BlobStore()
+
+        self.assertRaises(NotImplementedError, store.put, memoryview(b''))
+        self.assertRaises(NotImplementedError, store.get, 'foo')
+        self.assertRaises(NotImplementedError, store.delete, 'foo')
+
+
+class ClaimCheckTestCase(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.settings_patcher = patch('task_dispatcher.claim_check.settings')
+        self.settings_mock = self.settings_patcher.start()
+        self.settings_mock.claim_check_threshold = 4
+        self.settings_mock.claim_check_store = 'task_dispatcher.claim_check:FileBlobStore'
+        self.settings_mock.claim_check_path = self.directory.name
+        claim_check._store = None
+
+    def tearDown(self):
+        claim_check._store = None
+        self.settings_patcher.stop()
+        self.directory.cleanup()
+
+    @pytest.mark.high
+    def test_offload(self):
+        args, kwargs = offload((b'foo', b'foobar', 'foobar', 1), {'foo': bytearray(b'foobar'), 'bar': 'bar'})
+
+        self.assertEqual(args[0], b'foo')
+        self.assertEqual(args[1]['type'], 'buffer')
+        self.assertEqual(args[2]['type'], 'str')
+        self.assertEqual(args[3], 1)
+        self.assertIn(REFERENCE, kwargs['foo'])
+        self.assertEqual(kwargs['bar'], 'bar')
+        self.assertEqual(len(os.listdir(self.directory.name)), 3)
+
+    @pytest.mark.high
+    def test_resolve(self):
+        args, kwargs = offload((b'foobar', 'foobar'), {'foo': array.array('d', [1.0, 2.0])})
+
+        keys = []
+        result = resolve([args, kwargs], keys)
+
+        self.assertEqual(bytes(result[0][0]), b'foobar')
+        self.assertEqual(result[0][1], 'foobar')
+        self.assertEqual(result[1]['foo'].tolist(), [1.0, 2.0])
+        self.assertEqual(len(keys), 3)
+
+    @pytest.mark.mid
+    def test_resolve_cannot_cast(self):
+        args, _ = offload((array.array('d', [1.0, 2.0]),))
+        args[0]['format'] = 'foo'
+
+        self.assertEqual(resolve(args)[0].nbytes, 16)
+
+    @pytest.mark.mid
+    def test_offload_not_contiguous(self):
+        args, _ = offload((memoryview(b'foobarbaz')[::2],))
+
+        self.assertEqual(bytes(resolve(args)[0]), b'foabz')
+
+    @pytest.mark.high
+    def test_resolving_deletes_on_success(self):
+        func = MagicMock(return_value='result')
+        args, kwargs = offload((b'foobar',), {'foo': 'foobar'})
+
+        result = resolving(func)(*args, **kwargs)
+
+        self.assertEqual(result, 'result')
+        self.assertEqual(bytes(func.call_args[0][0]), b'foobar')
+        self.assertEqual(func.call_args[1], {'foo': 'foobar'})
+        self.assertEqual(os.listdir(self.directory.name), [])
+
+    @pytest.mark.high
+    def test_resolving_keeps_on_failure(self):
+        func = MagicMock(side_effect=ValueError)
+        args, _ = offload((b'foobar',))
+
+        with self.assertRaises(ValueError):
+            resolving(func)(*args)
+
+        self.assertEqual(len(os.listdir(self.directory.name)), 1)
+
+    @pytest.mark.mid
+    def test_resolving_keeps_signature(self):
+        def func(foo, bar=None):
+            pass
+
+        self.assertEqual(str(inspect.signature(resolving(func))), '(foo, bar=None)')
+
+    @pytest.mark.low
+    def test_get_store(self):
+        self.assertIs(get_store(), get_store())
+        self.assertEqual(get_store().path, self.directory.name)
+
+    @pytest.mark.mid
+    def test_references(self):
+        args, kwargs = offload((b'foobar', b'foobar'), {'foo': 'foobar'})
+
+        self.assertEqual(len(references([args[0], [args[1], 1], {'foo': kwargs}])), 3)
+        self.assertEqual(references((1, {'foo': 'bar'})), [])
+
+    @pytest.mark.high
+    def test_deletes_on_final_failure(self):
+        def fail(data):
+            raise ValueError
+
+        task = app.task(resolving(fail), name='tests.claim_check.fail', shared=False)
+        task._claim_check = True
+        args, _ = offload((b'foobar',))
+
+        self.assertTrue(task.apply(args).failed())
+        self.assertEqual(os.listdir(self.directory.name), [])
+
+    @pytest.mark.high
+    def test_keeps_on_retry(self):
+        def retry(data):
+            raise Retry()
+
+        task = app.task(resolving(retry), name='tests.claim_check.retry', shared=False)
+        task._claim_check = True
+        args, _ = offload((b'foobar',))
+
+        self.assertEqual(task.apply(args).state, 'RETRY')
+
+        self.assertEqual(len(os.listdir(self.directory.name)), 1)
+
+    @pytest.mark.mid
+    def test_keeps_without_claim_check(self):
+        task = app.task(resolving(MagicMock(side_effect=ValueError)), name='tests.claim_check.other', shared=False)
+        args, _ = offload((b'foobar',))
+
+        self.assertTrue(task.apply(args).failed())
+        self.assertEqual(len(os.listdir(self.directory.name)), 1)
+
+    @pytest.mark.low
+    def test_delete_fails_on_final_failure(self):
+        sender = MagicMock(_claim_check=True)
+        args, _ = offload((b'foobar',))
+
+        with patch.object(FileBlobStore, 'delete', side_effect=OSError), \
+                self.assertLogs('task_dispatcher.claim_check', 'ERROR'):
+            claim_check._on_task_failure(sender=sender, args=args, kwargs={})
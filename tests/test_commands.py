@@ -1,13 +1,20 @@
 # -*- coding: utf-8 -*-
+import json
 import os
+import tempfile
+from argparse import ArgumentParser
 from unittest.case import TestCase
-from unittest.mock import patch, call, MagicMock
+from unittest.mock import ANY, patch, call, MagicMock
 
 import pytest
+import yaml
+from celery.exceptions import ImproperlyConfigured as CeleryImproperlyConfigured
 from clinner.exceptions import ImproperlyConfigured
 from clinner.settings import settings
 
-from task_dispatcher.commands import TaskDispatcherCommand, consumer, producer, scheduler, show, flower
+from task_dispatcher.commands import TaskDispatcherCommand, bench, consumer, producer, scheduler, show, flower, \
+    supervise, _add_worker_arguments, _celery_arguments, _CommandParser
+from task_dispatcher.lanes import Lane
 from task_dispatcher.management.commands.task_dispatcher import Command
 
 
@@ -27,6 +34,184 @@ class TaskDispatcherCommandTestCase(TestCase):
         self.assertIn(expected_kwarg, celery_app_mock.Worker.call_args[1])
         self.assertCountEqual(expected_queues, celery_app_mock.Worker.call_args[1]['queues'])
 
+    @pytest.mark.mid
+    def test_consumer_command_line(self):
+        with patch('task_dispatcher.commands.app') as celery_app_mock:
+            TaskDispatcherCommand(['-q', 'consumer', '-Q', 'foo', '-c', '3', '--adaptive-autoscale', '4,1']).run()
+
+        kwargs = celery_app_mock.Worker.call_args[1]
+        self.assertEqual(kwargs['queues'], 'foo')
+        self.assertEqual(kwargs['concurrency'], 3)
+        self.assertEqual(kwargs['autoscale'], '4,1')
+
+    @pytest.mark.mid
+    def test_consumer_async_concurrency(self):
+        with patch('task_dispatcher.commands.app') as celery_app_mock:
+            TaskDispatcherCommand(['-q', 'consumer', '--async-concurrency', '100']).run()
+
+        kwargs = celery_app_mock.Worker.call_args[1]
+        self.assertEqual(kwargs['pool_cls'], 'threads')
+        self.assertEqual(kwargs['concurrency'], 100)
+        self.assertNotIn('async_concurrency', kwargs)
+
+    @pytest.mark.mid
+    def test_consumer_max_memory_per_child(self):
+        with patch('task_dispatcher.commands.app') as celery_app_mock, \
+                patch('task_dispatcher.commands.settings') as task_dispatcher_settings:
+            task_dispatcher_settings.manifest = None
+            task_dispatcher_settings.max_memory_per_child = 524288
+            TaskDispatcherCommand(['-q', 'consumer']).run()
+            TaskDispatcherCommand(['-q', 'consumer', '--max-memory-per-child', '1024']).run()
+
+        self.assertEqual([c[1]['max_memory_per_child'] for c in celery_app_mock.Worker.call_args_list], [524288, 1024])
+
+    @pytest.mark.mid
+    def test_consumer_partitions(self):
+        with patch('task_dispatcher.commands.app') as celery_app_mock:
+            TaskDispatcherCommand(['-q', 'consumer', '-Q', 'consumer,tenants', '--partitions', '0-1,3']).run()
+
+        kwargs = celery_app_mock.Worker.call_args[1]
+        self.assertEqual(kwargs['queues'], ['consumer', 'tenants', 'consumer.p0', 'consumer.p1', 'consumer.p3',
+                                            'tenants.p0', 'tenants.p1', 'tenants.p3'])
+        self.assertNotIn('partitions', kwargs)
+
+    @pytest.mark.mid
+    def test_consumer_lanes(self):
+        with patch('task_dispatcher.commands.app') as celery_app_mock, \
+                patch('task_dispatcher.lanes.settings') as settings_mock:
+            settings_mock.lanes = {'interactive': {'weight': 10, 'prefetch': 100}}
+            TaskDispatcherCommand(['-q', 'consumer', '-Q', 'consumer', '--lanes', 'interactive', 'bulk']).run()
+
+        kwargs = celery_app_mock.Worker.call_args[1]
+        self.assertEqual(kwargs['queues'], ['consumer', 'consumer.interactive', 'consumer.bulk'])
+        self.assertEqual(kwargs['lanes'], [Lane('interactive', 'consumer.interactive', 10, 100),
+                                           Lane('bulk', 'consumer.bulk', 1, None)])
+        self.assertEqual(kwargs['consumer_cls'], 'task_dispatcher.worker:Consumer')
+
+    @pytest.mark.mid
+    def test_celery_arguments_deferred(self):
+        parser = _CommandParser(MagicMock(), add_help=False)
+
+        _celery_arguments(_add_worker_arguments)(parser)
+
+        self.assertEqual(parser._actions, [])
+
+    @pytest.mark.mid
+    def test_celery_arguments(self):
+        parser = ArgumentParser(add_help=False)
+
+        _celery_arguments(_add_worker_arguments)(parser)
+
+        options = parser.parse_args(['-Q', 'foo'])
+        self.assertEqual(options.queues, 'foo')
+
+    @pytest.mark.mid
+    def test_consumer_manifest(self):
+        with patch('task_dispatcher.commands.app') as celery_app_mock, \
+                patch('task_dispatcher.commands.register') as register_mock, \
+                patch('task_dispatcher.commands.settings') as task_dispatcher_settings:
+            task_dispatcher_settings.manifest = 'manifest.json'
+            consumer(queues=None)
+
+        self.assertEqual(register_mock.load_manifest.call_args_list, [call('manifest.json')])
+        self.assertEqual(celery_app_mock.conf.update.call_args_list, [call(imports=(), include=())])
+        self.assertEqual(celery_app_mock.Worker.call_args[1]['consumer_cls'], 'task_dispatcher.worker:Consumer')
+
+    @pytest.mark.mid
+    def test_consumer_manifest_stats(self):
+        with patch('task_dispatcher.commands.app'), \
+                patch('task_dispatcher.commands.register') as register_mock, \
+                patch('task_dispatcher.stats') as stats_mock, \
+                patch('task_dispatcher.commands.settings') as task_dispatcher_settings:
+            task_dispatcher_settings.manifest = 'manifest.json'
+            task_dispatcher_settings.stats_port = 9999
+            register_mock.manifest = {'foo': {'stats': True}, 'bar': {'stats': False}}
+            consumer(queues=None)
+
+        self.assertEqual(stats_mock.stats.register.call_args_list, [call('foo')])
+        self.assertEqual(stats_mock.enable.call_args_list, [call(port=9999)])
+
+    @pytest.mark.mid
+    def test_consumer_manifest_serializers(self):
+        with patch('task_dispatcher.commands.app') as celery_app_mock, \
+                patch('task_dispatcher.commands.register') as register_mock, \
+                patch('task_dispatcher.commands.settings') as task_dispatcher_settings:
+            task_dispatcher_settings.manifest = 'manifest.json'
+            celery_app_mock.conf.accept_content = ['json']
+            register_mock.manifest = {'foo': {'serializer': 'msgpack'}, 'bar': {'serializer': 'json'}, 'baz': {}}
+            consumer(queues=None)
+
+        self.assertEqual(celery_app_mock.conf.accept_content, ['json', 'application/x-msgpack'])
+
+    @pytest.mark.high
+    def test_consumer_pickle_not_allowed(self):
+        with patch('task_dispatcher.commands.app') as celery_app_mock, \
+                patch('task_dispatcher.commands.register') as register_mock, \
+                patch('task_dispatcher.commands.settings') as task_dispatcher_settings, \
+                patch('task_dispatcher.serializers.settings') as serializers_settings:
+            task_dispatcher_settings.manifest = 'manifest.json'
+            serializers_settings.accept_pickle = False
+            celery_app_mock.conf.accept_content = ['json']
+            register_mock.manifest = {'foo': {'serializer': 'pickle5'}}
+
+            with self.assertRaises(CeleryImproperlyConfigured):
+                consumer(queues=None)
+
+            serializers_settings.accept_pickle = True
+            consumer(queues=None)
+
+        self.assertEqual(celery_app_mock.conf.accept_content, ['json', 'application/x-python-pickle5'])
+        self.assertEqual(celery_app_mock.Worker.call_count, 1)
+
+    @pytest.mark.high
+    def test_consumer_throttle_backend_not_shared(self):
+        with patch('task_dispatcher.commands.app'), \
+                patch('task_dispatcher.commands.register') as register_mock, \
+                patch('task_dispatcher.commands.settings') as task_dispatcher_settings:
+            task_dispatcher_settings.manifest = 'manifest.json'
+            task_dispatcher_settings.throttle_backend = 'task_dispatcher.throttle:LocalThrottleBackend'
+            register_mock.manifest = {'foo': {'throttled': True}, 'bar': {'throttled': False}}
+
+            with self.assertLogs('task_dispatcher.commands', 'WARNING') as logs:
+                consumer(queues=None)
+
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('foo', logs.output[0])
+        self.assertNotIn('bar', logs.output[0])
+
+    @pytest.mark.mid
+    def test_consumer_throttle_backend_shared(self):
+        throttled = MagicMock(throttle=MagicMock())
+        with patch('task_dispatcher.commands.app') as celery_app_mock, \
+                patch('task_dispatcher.commands.register') as register_mock, \
+                patch('task_dispatcher.commands.settings') as task_dispatcher_settings, \
+                patch('task_dispatcher.commands.logger') as logger_mock:
+            task_dispatcher_settings.manifest = None
+            celery_app_mock.tasks = {}
+            register_mock.consumers = {'foo': throttled}
+            register_mock.producers = {}
+
+            task_dispatcher_settings.throttle_backend = 'task_dispatcher.throttle:SQLiteThrottleBackend'
+            consumer(queues=None)
+            logger_mock.warning.assert_not_called()
+
+            task_dispatcher_settings.throttle_backend = 'task_dispatcher.throttle:LocalThrottleBackend'
+            consumer(queues=None)
+            self.assertEqual(logger_mock.warning.call_count, 1)
+
+    @pytest.mark.mid
+    def test_consumer_task_serializers(self):
+        task = MagicMock(serializer='msgpack+zlib')
+        with patch('task_dispatcher.commands.app') as celery_app_mock, \
+                patch('task_dispatcher.commands.settings') as task_dispatcher_settings:
+            task_dispatcher_settings.manifest = None
+            celery_app_mock.conf.accept_content = ['json']
+            celery_app_mock.tasks = {'foo': task}
+            consumer(queues=None)
+
+        celery_app_mock.loader.import_default_modules.assert_called_once_with()
+        self.assertEqual(celery_app_mock.conf.accept_content, ['json', 'application/x-msgpack+zlib'])
+
     @pytest.mark.mid
     def test_producer(self):
         expected_kwarg = 'queues'
@@ -64,7 +249,7 @@ class TaskDispatcherCommandTestCase(TestCase):
         task_kwargs = {'foo': 'bar'}
         scheduled_tasks = {'a': [{'name': task, 'id': '1'}]}
         expected_revoke_calls = [call(['1'])]
-        expected_delay_calls = [call(1, 2, foo='bar')]
+        expected_apply_calls = [call((1, 2), {'foo': 'bar'}, producer=ANY)]
         task_mock = MagicMock()
 
         with patch('task_dispatcher.commands.app') as celery_app_mock, \
@@ -77,7 +262,39 @@ class TaskDispatcherCommandTestCase(TestCase):
 
             self.assertCountEqual(celery_app_mock.control.revoke.call_args_list, expected_revoke_calls)
 
-        self.assertCountEqual(task_mock.delay.call_args_list, expected_delay_calls)
+        self.assertCountEqual(task_mock.apply_async.call_args_list, expected_apply_calls)
+        self.assertEqual(celery_app_mock.Beat().run.call_count, 1)
+
+    @pytest.mark.mid
+    def test_scheduler_inspects_workers_once(self):
+        tasks = {
+            'scheduled': {'a': [{'eta': None, 'request': {'name': 'foo.bar', 'id': '1'}}]},
+            'active': {'a': [{'name': 'foo.bar', 'id': '2'}, {'name': 'foo.baz', 'id': '3'}]},
+            'reserved': None,
+        }
+
+        with patch('task_dispatcher.commands.app') as celery_app_mock, \
+                patch('task_dispatcher.commands.import_module'), \
+                patch('task_dispatcher.commands.settings') as task_dispatcher_settings:
+            task_dispatcher_settings.run_at_startup = [('foo.bar', (), {})]
+            inspect_mock = celery_app_mock.control.inspect.return_value
+            for method, reply in tasks.items():
+                getattr(inspect_mock, method).return_value = reply
+            scheduler()
+
+        for method in tasks:
+            self.assertEqual(getattr(inspect_mock, method).call_count, 1)
+        self.assertEqual(celery_app_mock.control.revoke.call_args_list, [call(['1', '2'])])
+
+    @pytest.mark.mid
+    def test_scheduler_without_startup_tasks(self):
+        with patch('task_dispatcher.commands.app') as celery_app_mock, \
+                patch('task_dispatcher.commands.settings') as task_dispatcher_settings:
+            task_dispatcher_settings.run_at_startup = []
+            scheduler()
+
+        self.assertEqual(celery_app_mock.control.inspect.call_count, 0)
+        self.assertEqual(celery_app_mock.control.revoke.call_count, 0)
         self.assertEqual(celery_app_mock.Beat().run.call_count, 1)
 
     @pytest.mark.mid
@@ -106,7 +323,7 @@ class TaskDispatcherCommandTestCase(TestCase):
         expected_calls = [call(app=celery_app_mock)]
         expected_calls_cmdline = [call(argv=('flower',))]
 
-        with patch('task_dispatcher.commands.FlowerCommand') as flower_mock:
+        with patch('flower.command.FlowerCommand') as flower_mock:
             flower()
 
         self.assertEqual(flower_mock.call_count, 1)
@@ -122,6 +339,57 @@ class TaskDispatcherCommandTestCase(TestCase):
 
         self.assertEqual(register_mock.to_yaml.call_count, 1)
 
+    @pytest.mark.mid
+    def test_show_stats(self):
+        task_stats = {'foo': {'histograms': {}, 'counters': {'retries_total': 1}}}
+
+        with patch('task_dispatcher.commands.app') as celery_app_mock, patch('builtins.print') as print_mock:
+            celery_app_mock.control.broadcast.return_value = [{'w1': task_stats}, {'w2': task_stats}]
+            show(format='json', stats=True)
+
+        self.assertEqual(celery_app_mock.control.broadcast.call_args_list,
+                         [call('dispatcher_stats', reply=True, timeout=1.0)])
+        self.assertEqual(json.loads(print_mock.call_args[0][0]), {'foo': {'retries_total': 2}})
+
+    @pytest.mark.mid
+    def test_show_stats_yaml(self):
+        task_stats = {'foo': {'histograms': {}, 'counters': {'retries_total': 1}}}
+
+        with patch('task_dispatcher.commands.app') as celery_app_mock, patch('builtins.print') as print_mock:
+            celery_app_mock.control.broadcast.return_value = [{'w1': task_stats}]
+            show(format='yaml', stats=True)
+
+        self.assertEqual(yaml.safe_load(print_mock.call_args[0][0]), {'foo': {'retries_total': 1}})
+
+    @pytest.mark.mid
+    def test_show_write_manifest(self):
+        with patch('task_dispatcher.commands.app') as celery_app_mock, \
+                patch('task_dispatcher.commands.register') as register_mock:
+            show(manifest='manifest.json')
+
+        self.assertEqual(celery_app_mock.loader.import_default_modules.call_count, 1)
+        self.assertEqual(register_mock.dump_manifest.call_args_list, [call('manifest.json', celery_app_mock.tasks)])
+        self.assertEqual(register_mock.to_yaml.call_count, 0)
+
+    @pytest.mark.mid
+    def test_show_from_manifest(self):
+        with patch('task_dispatcher.commands.register') as register_mock, \
+                patch('task_dispatcher.commands.settings') as task_dispatcher_settings:
+            task_dispatcher_settings.manifest = 'manifest.json'
+            show(format='yaml')
+
+        self.assertEqual(register_mock.load_manifest.call_args_list, [call('manifest.json')])
+        self.assertEqual(register_mock.to_yaml.call_count, 1)
+
+    @pytest.mark.mid
+    def test_show_filtered(self):
+        with patch('task_dispatcher.commands.register') as register_mock, patch('builtins.print'):
+            show(format='json', queue='consumer', module='myapp', tag=None)
+            show(format='yaml', tag='nightly')
+
+        self.assertEqual(register_mock.to_json.call_args, call(queue='consumer', module='myapp'))
+        self.assertEqual(register_mock.to_yaml.call_args, call(tag='nightly'))
+
     @pytest.mark.mid
     def test_show_json(self):
         with patch('task_dispatcher.commands.register') as register_mock:
@@ -129,6 +397,46 @@ class TaskDispatcherCommandTestCase(TestCase):
 
         self.assertEqual(register_mock.to_json.call_count, 1)
 
+    @pytest.mark.low
+    def test_bench(self):
+        with patch('task_dispatcher.bench.run') as run_mock, patch('builtins.print') as print_mock:
+            run_mock.return_value = {'pipelines': []}
+            bench(messages=10, payload_sizes=[8], concurrency=[1], serializers=['msgpack'])
+
+        self.assertEqual(run_mock.call_args_list,
+                         [call(messages=10, payload_sizes=[8], concurrency=[1], serializers=['msgpack'])])
+        self.assertEqual(json.loads(print_mock.call_args[0][0]), {'pipelines': []})
+
+    @pytest.mark.low
+    def test_bench_output(self):
+        with patch('task_dispatcher.bench.run') as run_mock, tempfile.NamedTemporaryFile('r') as output:
+            run_mock.return_value = {'pipelines': []}
+            bench(output=output.name)
+
+            self.assertEqual(json.load(output), {'pipelines': []})
+
+    @pytest.mark.mid
+    def test_supervise(self):
+        with patch('task_dispatcher.groups.settings') as settings_mock, \
+                patch('task_dispatcher.commands.Supervisor') as supervisor_mock:
+            settings_mock.groups = {'heavy': {}, 'light': {}}
+            supervisor_mock.return_value.run.return_value = 0
+            TaskDispatcherCommand(['-q', 'supervise', 'light']).run()
+
+        groups = supervisor_mock.call_args[0][0]
+        self.assertEqual([g.name for g in groups], ['light'])
+        supervisor_mock.return_value.run.assert_called_once_with()
+
+    @pytest.mark.mid
+    def test_supervise_without_groups(self):
+        with patch('task_dispatcher.groups.settings') as settings_mock, \
+                patch('task_dispatcher.commands.Supervisor') as supervisor_mock:
+            settings_mock.groups = {}
+            with self.assertRaises(ImproperlyConfigured):
+                supervise()
+
+        supervisor_mock.assert_not_called()
+
     @pytest.mark.low
     def test_run_no_args(self):
         command = TaskDispatcherCommand(parse_args=False)
@@ -1,11 +1,18 @@
 # -*- coding: utf-8 -*-
+import inspect
 from unittest.case import TestCase
-from unittest.mock import MagicMock, patch, call
+from unittest.mock import ANY, MagicMock, patch, call
 
 import pytest
+from celery import Celery
 from celery.app.task import Task
+from celery.local import Proxy
 
-from task_dispatcher.decorators import BaseDecorator
+from task_dispatcher import dedup, memoize, stats, throttle  # noqa: imported so lazily imported modules can be patched
+from task_dispatcher.batches import BatchTask
+from task_dispatcher.decorators import BaseDecorator, BoundDecorator, consumer, producer
+from task_dispatcher.results import FireAndForgetResult, ResultNotStored
+from task_dispatcher.settings import settings
 
 
 class TestMock(MagicMock):
@@ -48,8 +55,106 @@ class BaseDecoratorTestCase(TestCase):
 
             decorator = BaseDecorator(self.task_mock)
 
-        self.assertTrue(isinstance(decorator.__get__(decorator), BaseDecorator))
-        self.assertEqual(decorator.instance, decorator)
+        bound = decorator.__get__('instance')
+
+        self.assertIsInstance(bound, BoundDecorator)
+        self.assertEqual((bound.decorator, bound.instance), (decorator, 'instance'))
+        self.assertIs(decorator.__get__(None, BaseDecorator), decorator)
+        self.assertNotIn('instance', decorator.__dict__)
+
+    @pytest.mark.high
+    def test_get_does_not_share_instance(self):
+        with patch('task_dispatcher.decorators.app') as celery_app_mock, \
+                patch('task_dispatcher.decorators.register'):
+            celery_app_mock.task().return_value = self.task_mock
+            decorator = BaseDecorator(self.task_mock)
+
+        first, second = decorator.__get__('first'), decorator.__get__('second')
+        first.delay(1)
+        second.delay(2)
+        first(3)
+        decorator.delay(4)
+
+        self.assertEqual(self.task_mock.apply_async.call_args_list,
+                         [call(('first', 1), {}), call(('second', 2), {}), call((4,), {})])
+        self.task_mock.assert_called_once_with('first', 3)
+
+    @pytest.mark.high
+    def test_bound_getattr(self):
+        with patch('task_dispatcher.decorators.app') as celery_app_mock, \
+                patch('task_dispatcher.decorators.register'):
+            celery_app_mock.task().return_value = self.task_mock
+            decorator = BaseDecorator(description='description')(self.task_mock)
+
+        bound = decorator.__get__('instance')
+
+        self.assertEqual(bound.foo_method(), 'instance')
+        self.assertEqual(bound.description, 'description')
+        self.assertEqual(bound._route.__self__, decorator)
+
+    @pytest.mark.mid
+    def test_bound_delay_many(self):
+        with patch('task_dispatcher.decorators.app') as celery_app_mock, \
+                patch('task_dispatcher.decorators.register'):
+            celery_app_mock.task().return_value = self.task_mock
+            decorator = BaseDecorator(self.task_mock)
+
+            count = decorator.__get__('instance').delay_many(range(2))
+
+        self.assertEqual(count, 2)
+        self.assertEqual(self.task_mock.apply_async.call_args_list,
+                         [call(('instance', 0), producer=ANY), call(('instance', 1), producer=ANY)])
+
+    @pytest.mark.high
+    def test_getattr_cached(self):
+        def foo():
+            pass
+
+        app = Celery(set_as_current=False)
+        with patch('task_dispatcher.decorators.app', app), \
+                patch('task_dispatcher.decorators.register'):
+            decorator = BaseDecorator(name='foo', shared=False)(foo)
+
+        method = decorator.retry
+
+        self.assertIs(decorator.__dict__['retry'], method)
+        self.assertEqual(decorator.name, 'foo')
+        self.assertIn('name', decorator.__dict__)
+
+    @pytest.mark.high
+    def test_getattr_mutable_not_cached(self):
+        def foo():
+            pass
+
+        app = Celery(set_as_current=False)
+        with patch('task_dispatcher.decorators.app', app), \
+                patch('task_dispatcher.decorators.register'):
+            decorator = BaseDecorator(name='foo', shared=False)(foo)
+
+        self.assertIsNone(decorator.rate_limit)
+        decorator.task.rate_limit = '10/s'
+        decorator.task.retry = 'bar'
+
+        self.assertEqual(decorator.rate_limit, '10/s')
+        self.assertEqual(decorator.retry, 'bar')
+        self.assertNotIn('rate_limit', decorator.__dict__)
+        self.assertNotIn('retry', decorator.__dict__)
+
+    @pytest.mark.high
+    def test_getattr_property_not_cached(self):
+        def foo():
+            pass
+
+        app = Celery(set_as_current=False)
+        with patch('task_dispatcher.decorators.app', app), \
+                patch('task_dispatcher.decorators.register'):
+            decorator = BaseDecorator(name='foo', shared=False)(foo)
+
+        self.assertIsInstance(decorator.task, Proxy)
+        self.assertEqual(decorator.name, 'foo')
+        self.assertIsNotNone(decorator.request)
+        self.assertNotIn('request', decorator.__dict__)
+        self.assertNotIn('backend', decorator.__dict__)
 
     @pytest.mark.high
     def test_getattr_decorator_attr(self):
@@ -106,6 +211,35 @@ class BaseDecoratorTestCase(TestCase):
             self.assertIn('name', celery_app_mock.task.call_args[1])
             self.assertEqual(celery_app_mock.task.call_args[1]['name'], expected_task_name)
 
+    @pytest.mark.high
+    def test_decorate_batch(self):
+        with patch('task_dispatcher.decorators.app') as celery_app_mock, \
+                patch('task_dispatcher.decorators.register') as register_mock:
+            celery_app_mock.task().return_value = self.task_mock
+
+            BaseDecorator(batch_size=10)(self.task_mock)
+
+            self.assertEqual(celery_app_mock.task.call_args[1]['base'], BatchTask)
+            self.assertEqual(celery_app_mock.task.call_args[1]['batch_size'], 10)
+
+    @pytest.mark.high
+    def test_decorate_batch_method(self):
+        self.task_mock.__qualname__ = 'Foo.bar'
+
+        with patch('task_dispatcher.decorators.app'), patch('task_dispatcher.decorators.register'):
+            with self.assertRaises(ValueError):
+                BaseDecorator(batch_size=10)(self.task_mock)
+
+    @pytest.mark.high
+    def test_decorate_batch_local_function(self):
+        self.task_mock.__qualname__ = 'foo.<locals>.bar'
+
+        with patch('task_dispatcher.decorators.app') as celery_app_mock, \
+                patch('task_dispatcher.decorators.register'):
+            BaseDecorator(batch_size=10)(self.task_mock)
+
+            self.assertEqual(celery_app_mock.task.call_args[1]['base'], BatchTask)
+
     @pytest.mark.high
     def test_call(self):
         expected_call_args = [call('foo', bar='bar')]
@@ -123,6 +257,372 @@ class BaseDecoratorTestCase(TestCase):
             self.assertEqual(self.task_mock.call_count, 1)
             self.assertCountEqual(expected_call_args, self.task_mock.call_args_list)
 
+    @pytest.mark.high
+    def test_decorate_stats(self):
+        with patch('task_dispatcher.decorators.app') as celery_app_mock, \
+                patch('task_dispatcher.decorators.register') as register_mock, \
+                patch('task_dispatcher.stats') as stats_mock:
+            celery_app_mock.task().return_value = self.task_mock
+
+            BaseDecorator(stats=True)(self.task_mock)
+
+            self.assertEqual(stats_mock.enable.call_count, 1)
+            self.assertEqual(stats_mock.instrument.call_args[0][0], self.task_mock)
+            self.assertEqual(celery_app_mock.task.return_value.call_args[0][0], stats_mock.instrument())
+            self.assertNotIn('stats', celery_app_mock.task.call_args[1])
+
+    @pytest.mark.high
+    def test_apply_many(self):
+        expected_calls = [call((1, 2), producer=ANY, countdown=1), call((3, 4), producer=ANY, countdown=1)]
+
+        with patch('task_dispatcher.decorators.app') as celery_app_mock, \
+                patch('task_dispatcher.decorators.register') as register_mock:
+            celery_app_mock.task().return_value = self.task_mock
+            decorator = BaseDecorator(self.task_mock)
+
+            count = decorator.apply_many(iter([(1, 2), (3, 4)]), countdown=1)
+
+        self.assertEqual(count, 2)
+        self.assertEqual(self.task_mock.app.producer_or_acquire.call_count, 1)
+        self.assertEqual(self.task_mock.apply_async.call_args_list, expected_calls)
+
+    @pytest.mark.high
+    def test_apply_many_partitioned(self):
+        with patch('task_dispatcher.decorators.app') as celery_app_mock, \
+                patch('task_dispatcher.decorators.register'), \
+                patch('task_dispatcher.decorators.flow_control') as flow_control_mock:
+            celery_app_mock.task().return_value = self.task_mock
+            self.task_mock.queue = 'consumer'
+            decorator = consumer(partition_key=lambda tenant, item: tenant, partitions=4)(self.task_mock)
+
+            decorator.apply_many([('foo', 1), ('bar', 2)], countdown=1)
+            decorator.apply_async(('foo', 3), queue='other')
+
+        self.assertEqual(self.task_mock.apply_async.call_args_list, [
+            call(('foo', 1), producer=ANY, countdown=1, queue='consumer.p2'),
+            call(('bar', 2), producer=ANY, countdown=1, queue='consumer.p0'),
+            call(('foo', 3), None, queue='other'),
+        ])
+        self.assertEqual(flow_control_mock.wait.call_args_list[0], call('task_name', 'consumer.p2'))
+
+    @pytest.mark.high
+    def test_apply_async_partitioned(self):
+        with patch('task_dispatcher.decorators.app') as celery_app_mock, \
+                patch('task_dispatcher.decorators.register'):
+            celery_app_mock.task().return_value = self.task_mock
+            self.task_mock.queue = 'consumer'
+            decorator = BaseDecorator(partition_key=lambda item, tenant: tenant, partitions=4)(self.task_mock)
+
+            decorator.delay(1, tenant='foo')
+
+        self.assertEqual(self.task_mock.apply_async.call_args, call((1,), {'tenant': 'foo'}, queue='consumer.p2'))
+        for option in ('partition_key', 'partitions'):
+            self.assertNotIn(option, celery_app_mock.task.call_args[1])
+
+    @pytest.mark.mid
+    def test_partitioned_invalid(self):
+        with patch('task_dispatcher.decorators.app'), \
+                patch('task_dispatcher.decorators.register'):
+            with self.assertRaises(ValueError):
+                BaseDecorator(partition_key=lambda x: x)(self.task_mock)
+            with self.assertRaises(ValueError):
+                BaseDecorator(partition_key=lambda x: x, partitions=2, lane='foo')(self.task_mock)
+
+    @pytest.mark.high
+    def test_apply_many_method(self):
+        with patch('task_dispatcher.decorators.app') as celery_app_mock, \
+                patch('task_dispatcher.decorators.register') as register_mock:
+            celery_app_mock.task().return_value = self.task_mock
+            decorator = BaseDecorator(self.task_mock)
+
+            decorator.__get__('instance').apply_many([(1, 2)])
+
+        self.assertEqual(self.task_mock.apply_async.call_args_list, [call(('instance', 1, 2), producer=ANY)])
+
+    @pytest.mark.high
+    def test_apply_async(self):
+        with patch('task_dispatcher.decorators.app') as celery_app_mock, \
+                patch('task_dispatcher.decorators.register'):
+            celery_app_mock.task.return_value.return_value = self.task_mock
+            decorator = BaseDecorator(self.task_mock)
+            decorator.delay(1, foo='bar')
+            decorator.__get__('instance').apply_async((2,), countdown=1)
+
+        self.assertEqual(self.task_mock.apply_async.call_args_list, [
+            call((1,), {'foo': 'bar'}),
+            call(('instance', 2), None, countdown=1),
+        ])
+
+    @pytest.mark.high
+    def test_consumer_flow_control(self):
+        self.task_mock.queue = 'consumer'
+
+        with patch('task_dispatcher.decorators.app') as celery_app_mock, \
+                patch('task_dispatcher.decorators.register'), \
+                patch('task_dispatcher.decorators.flow_control') as flow_control_mock:
+            celery_app_mock.task.return_value.return_value = self.task_mock
+            decorator = consumer(self.task_mock)
+            decorator.delay(1)
+            decorator.apply_async((2,), queue='foo')
+            decorator.delay_many([3])
+
+        self.assertEqual(flow_control_mock.wait.call_args_list, [
+            call('task_name', 'consumer'), call('task_name', 'foo'), call('task_name', 'consumer'),
+        ])
+
+    @pytest.mark.high
+    def test_producer_without_flow_control(self):
+        with patch('task_dispatcher.decorators.app') as celery_app_mock, \
+                patch('task_dispatcher.decorators.register'), \
+                patch('task_dispatcher.decorators.flow_control') as flow_control_mock:
+            celery_app_mock.task.return_value.return_value = self.task_mock
+            producer(self.task_mock).delay(1)
+
+        self.assertEqual(flow_control_mock.wait.call_count, 0)
+
+    @pytest.mark.high
+    def test_fire_and_forget(self):
+        with patch('task_dispatcher.decorators.app') as celery_app_mock, \
+                patch('task_dispatcher.decorators.register'):
+            celery_app_mock.task.return_value.return_value = self.task_mock
+            self.task_mock.apply_async.return_value.id = 'task_id'
+            decorator = BaseDecorator(fire_and_forget=True)(self.task_mock)
+            result = decorator.delay(1)
+
+        kwargs = celery_app_mock.task.call_args[1]
+        self.assertTrue(kwargs['ignore_result'])
+        self.assertFalse(kwargs['track_started'])
+        self.assertFalse(kwargs['acks_late'])
+        self.assertNotIn('fire_and_forget', kwargs)
+        self.assertIsInstance(result, FireAndForgetResult)
+        self.assertEqual(result.id, 'task_id')
+        self.assertRaises(ResultNotStored, result.get)
+        self.assertRaises(ResultNotStored, result.wait, timeout=1)
+
+    @pytest.mark.high
+    def test_fire_and_forget_from_settings(self):
+        with patch('task_dispatcher.decorators.app') as celery_app_mock, \
+                patch('task_dispatcher.decorators.register'), \
+                patch('task_dispatcher.decorators.settings') as settings_mock:
+            settings_mock.stats = False
+            settings_mock.fire_and_forget = True
+            settings_mock.claim_check = False
+            decorator = BaseDecorator(self.task_mock)
+
+        self.assertTrue(decorator.fire_and_forget)
+        self.assertTrue(celery_app_mock.task.call_args[1]['ignore_result'])
+
+    @pytest.mark.mid
+    def test_serializer_not_accepted(self):
+        with patch('task_dispatcher.decorators.app') as celery_app_mock, \
+                patch('task_dispatcher.decorators.register'):
+            celery_app_mock.conf.accept_content = ['json']
+            BaseDecorator(serializer='pickle5')(self.task_mock)
+
+        self.assertEqual(celery_app_mock.task.call_args[1]['serializer'], 'pickle5')
+        self.assertEqual(celery_app_mock.conf.accept_content, ['json'])
+
+    @pytest.mark.mid
+    def test_tags(self):
+        with patch('task_dispatcher.decorators.app') as celery_app_mock, \
+                patch('task_dispatcher.decorators.register'):
+            self.assertEqual(BaseDecorator(tags=['foo', 'bar'])(self.task_mock).tags, ('foo', 'bar'))
+            self.assertEqual(BaseDecorator(tags='foo')(self.task_mock).tags, ('foo',))
+
+        self.assertNotIn('tags', celery_app_mock.task.call_args[1])
+
+    @pytest.mark.high
+    def test_lane(self):
+        with patch('task_dispatcher.decorators.app') as celery_app_mock, \
+                patch('task_dispatcher.decorators.register'):
+            consumer(lane='interactive')(self.task_mock)
+
+        self.assertEqual(celery_app_mock.task.call_args[1]['queue'], 'consumer.interactive')
+        self.assertNotIn('lane', celery_app_mock.task.call_args[1])
+
+    @pytest.mark.mid
+    def test_lane_explicit_queue(self):
+        with patch('task_dispatcher.decorators.app') as celery_app_mock, \
+                patch('task_dispatcher.decorators.register'):
+            consumer(lane='interactive', queue='foo')(self.task_mock)
+
+        self.assertEqual(celery_app_mock.task.call_args[1]['queue'], 'foo')
+
+    @pytest.mark.high
+    def test_group(self):
+        with patch('task_dispatcher.decorators.app') as celery_app_mock, \
+                patch('task_dispatcher.decorators.register'), \
+                patch('task_dispatcher.groups.settings') as settings_mock:
+            settings_mock.groups = {'heavy': {'tasks': ['module.*']}}
+            consumer(self.task_mock)
+            consumer(queue='foo')(self.task_mock)
+            settings_mock.groups = {'heavy': {'tasks': ['other.*']}}
+            consumer(self.task_mock)
+
+        self.assertEqual([c[1]['queue'] for c in celery_app_mock.task.call_args_list],
+                         ['group.heavy', 'foo', 'consumer'])
+
+    @pytest.mark.high
+    def test_local_engine(self):
+        with patch('task_dispatcher.decorators.app') as celery_app_mock, \
+                patch('task_dispatcher.decorators.register'), \
+                patch.object(settings, 'engine', 'local'), \
+                patch('task_dispatcher.local.get_engine') as get_engine_mock, \
+                patch('task_dispatcher.decorators.claim_check') as claim_check_mock:
+            decorator = consumer(claim_check=True, partition_key=lambda x: x, partitions=2)(self.task_mock)
+            result = decorator.apply_async((1,), queue='foo')
+            count = decorator.delay_many([2, 3])
+
+        engine = get_engine_mock.return_value
+        self.assertIs(result, engine.apply_async.return_value)
+        self.assertEqual(count, 2)
+        self.assertEqual(engine.apply_async.call_args_list, [
+            call(decorator.task, (1,), None, queue='foo'), call(decorator.task, (2,)), call(decorator.task, (3,))])
+        celery_app_mock.task.return_value.apply_async.assert_not_called()
+        claim_check_mock.offload.assert_not_called()
+
+    @pytest.mark.mid
+    def test_local_engine_method(self):
+        class Foo:
+            @consumer
+            def bar(self, x):
+                return x
+
+        instance = Foo()
+
+        with patch.object(settings, 'engine', 'local'), \
+                patch('task_dispatcher.local.get_engine') as get_engine_mock:
+            instance.bar.delay(1)
+            instance.bar.apply_many([(2,)])
+
+        self.assertEqual(get_engine_mock.return_value.apply_async.call_args_list, [
+            call(Foo.bar.task, (instance, 1), {}), call(Foo.bar.task, (instance, 2))])
+
+    @pytest.mark.high
+    def test_claim_check(self):
+        with patch('task_dispatcher.decorators.app') as celery_app_mock, \
+                patch('task_dispatcher.decorators.register'), \
+                patch('task_dispatcher.decorators.claim_check') as claim_check_mock:
+            celery_app_mock.task.return_value.return_value = self.task_mock
+            claim_check_mock.offload.return_value = (('reference',), {})
+            decorator = BaseDecorator(claim_check=True)(self.task_mock)
+            decorator.delay(b'foo')
+            decorator.apply_many([(b'foo',)])
+
+        self.assertEqual(celery_app_mock.task.return_value.call_args[0][0], claim_check_mock.resolving.return_value)
+        self.assertNotIn('claim_check', celery_app_mock.task.call_args[1])
+        self.assertIs(self.task_mock._claim_check, True)
+        self.assertEqual(claim_check_mock.offload.call_args_list, [call((b'foo',), {}), call((b'foo',))])
+        self.assertEqual(self.task_mock.apply_async.call_args_list,
+                         [call(('reference',), {}), call(('reference',), producer=ANY)])
+
+    @pytest.mark.high
+    def test_dedup(self):
+        key = MagicMock()
+        with patch('task_dispatcher.decorators.app') as celery_app_mock, \
+                patch('task_dispatcher.decorators.register'), \
+                patch('task_dispatcher.stats') as stats_mock, \
+                patch('task_dispatcher.dedup') as dedup_mock:
+            decorator = BaseDecorator(dedup_key=key, dedup_ttl=5.0, name='foo')(self.task_mock)
+
+        self.assertIs(decorator.dedup_key, key)
+        self.assertEqual(dedup_mock.deduplicating.call_args,
+                         call(self.task_mock, 'foo', key, 5.0, stats_mock.stats.register.return_value))
+        self.assertEqual(celery_app_mock.task.return_value.call_args[0][0], dedup_mock.deduplicating.return_value)
+        self.assertNotIn('dedup_key', celery_app_mock.task.call_args[1])
+        self.assertNotIn('dedup_ttl', celery_app_mock.task.call_args[1])
+        self.assertEqual(stats_mock.enable.call_count, 1)
+
+    @pytest.mark.high
+    def test_cache(self):
+        with patch('task_dispatcher.decorators.app') as celery_app_mock, \
+                patch('task_dispatcher.decorators.register'), \
+                patch('task_dispatcher.stats') as stats_mock, \
+                patch('task_dispatcher.memoize') as memoize_mock:
+            decorator = BaseDecorator(cache=True, cache_size=10, cache_ttl=5.0, name='foo')(self.task_mock)
+
+        self.assertTrue(decorator.cache)
+        self.assertEqual(memoize_mock.memoizing.call_args,
+                         call(self.task_mock, 'foo', 10, 5.0, stats_mock.stats.register.return_value))
+        self.assertEqual(celery_app_mock.task.return_value.call_args[0][0], memoize_mock.memoizing.return_value)
+        for option in ('cache', 'cache_size', 'cache_ttl'):
+            self.assertNotIn(option, celery_app_mock.task.call_args[1])
+
+    @pytest.mark.high
+    def test_throttle(self):
+        with patch('task_dispatcher.decorators.app') as celery_app_mock, \
+                patch('task_dispatcher.decorators.register'), \
+                patch('task_dispatcher.stats') as stats_mock, \
+                patch('task_dispatcher.throttle') as throttle_mock:
+            decorator = BaseDecorator(max_rate='10/s', max_concurrency=2, name='foo')(self.task_mock)
+
+        self.assertIs(decorator.throttle, throttle_mock.Throttle.return_value)
+        throttle_mock.Throttle.assert_called_once_with('foo', '10/s', 2)
+        self.assertEqual(throttle_mock.throttling.call_args,
+                         call(self.task_mock, decorator.throttle, stats_mock.stats.register.return_value))
+        self.assertEqual(celery_app_mock.task.return_value.call_args[0][0], throttle_mock.throttling.return_value)
+        for option in ('max_rate', 'max_concurrency'):
+            self.assertNotIn(option, celery_app_mock.task.call_args[1])
+
+    @pytest.mark.mid
+    def test_without_throttle(self):
+        with patch('task_dispatcher.decorators.app'), \
+                patch('task_dispatcher.decorators.register'):
+            decorator = BaseDecorator(self.task_mock)
+
+        self.assertIsNone(decorator.throttle)
+
+    @pytest.mark.high
+    def test_coroutine_function(self):
+        async def foo(bar):
+            return bar
+
+        with patch('task_dispatcher.decorators.app') as celery_app_mock, \
+                patch('task_dispatcher.decorators.register'):
+            BaseDecorator(foo)
+
+        func = celery_app_mock.task.return_value.call_args[0][0]
+        self.assertFalse(inspect.iscoroutinefunction(func))
+        self.assertEqual(func(1), 1)
+
+    @pytest.mark.high
+    def test_target(self):
+        def foo():
+            yield 1
+
+        target = MagicMock()
+        with patch('task_dispatcher.decorators.app') as celery_app_mock, \
+                patch('task_dispatcher.decorators.register'), \
+                patch('task_dispatcher.decorators.streaming') as streaming_mock:
+            BaseDecorator(target=target, checkpoint_interval=10)(foo)
+
+        self.assertEqual(streaming_mock.dispatching.call_args, call(foo, target, 10))
+        self.assertEqual(celery_app_mock.task.return_value.call_args[0][0], streaming_mock.dispatching.return_value)
+        kwargs = celery_app_mock.task.call_args[1]
+        self.assertTrue(kwargs['acks_late'])
+        self.assertTrue(kwargs['reject_on_worker_lost'])
+        self.assertNotIn('target', kwargs)
+
+    @pytest.mark.mid
+    def test_target_not_generator(self):
+        with patch('task_dispatcher.decorators.app'), patch('task_dispatcher.decorators.register'):
+            with self.assertRaises(ValueError):
+                BaseDecorator(target=MagicMock())(lambda: None)
+
+    @pytest.mark.high
+    def test_delay_many(self):
+        expected_calls = [call((i,), producer=ANY) for i in range(3)]
+
+        with patch('task_dispatcher.decorators.app') as celery_app_mock, \
+                patch('task_dispatcher.decorators.register') as register_mock:
+            celery_app_mock.task().return_value = self.task_mock
+            decorator = BaseDecorator(self.task_mock)
+
+            count = decorator.delay_many(i for i in range(3))
+
+        self.assertEqual(count, 3)
+        self.assertEqual(self.task_mock.apply_async.call_args_list, expected_calls)
+
     @pytest.mark.high
     def test_call_not_initialized(self):
         with patch('task_dispatcher.decorators.app') as celery_app_mock, \
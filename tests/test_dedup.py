@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+from unittest.case import TestCase
+from unittest.mock import MagicMock, patch
+
+import pytest
+from celery import Celery
+
+from task_dispatcher import dedup
+from task_dispatcher.dedup import KeyCache, KeyStore, SQLiteKeyStore, deduplicating, get_key_store
+from task_dispatcher.stats import TaskStats
+
+
+class KeyCacheTestCase(TestCase):
+    @pytest.mark.high
+    def test_add(self):
+        cache = KeyCache(maxsize=10, ttl=60.0)
+
+        self.assertTrue(cache.add('foo'))
+        self.assertFalse(cache.add('foo'))
+        self.assertTrue(cache.add('bar'))
+
+    @pytest.mark.high
+    def test_expired(self):
+        cache = KeyCache(maxsize=10, ttl=1.0)
+
+        with patch('task_dispatcher.cache.time.monotonic', side_effect=[0.0, 0.5, 2.0]):
+            self.assertTrue(cache.add('foo'))
+            self.assertFalse(cache.add('foo'))
+            self.assertTrue(cache.add('foo'))
+
+    @pytest.mark.high
+    def test_evict_least_recently_used(self):
+        cache = KeyCache(maxsize=2, ttl=60.0)
+
+        cache.add('foo')
+        cache.add('bar')
+        cache.add('foo')
+        cache.add('baz')
+
+        self.assertEqual(len(cache), 2)
+        self.assertFalse(cache.add('foo'))
+        self.assertTrue(cache.add('bar'))
+
+    @pytest.mark.mid
+    def test_evict_expired(self):
+        cache = KeyCache(maxsize=10, ttl=1.0)
+
+        with patch('task_dispatcher.cache.time.monotonic', side_effect=[0.0, 0.5, 2.0]):
+            cache.add('foo')
+            cache.add('bar')
+            cache.add('baz')
+
+        self.assertEqual(len(cache), 1)
+
+    @pytest.mark.mid
+    def test_discard(self):
+        cache = KeyCache(maxsize=10, ttl=60.0)
+        cache.add('foo')
+
+        cache.discard('foo')
+        cache.discard('foo')
+
+        self.assertTrue(cache.add('foo'))
+
+    @pytest.mark.low
+    def test_defaults_from_settings(self):
+        with patch('task_dispatcher.dedup.settings') as settings_mock:
+            settings_mock.dedup_maxsize = 5
+            settings_mock.dedup_ttl = 3.0
+            cache = KeyCache()
+
+        self.assertEqual((cache.maxsize, cache.ttl), (5, 3.0))
+
+
+class KeyStoreTestCase(TestCase):
+    def tearDown(self):
+        dedup._key_store = None
+
+    @pytest.mark.low
+    def test_not_implemented(self):
+        self.assertRaises(NotImplementedError, KeyStore().add, 'foo', 1.0)
+        self.assertRaises(NotImplementedError, KeyStore().discard, 'foo')
+
+    @pytest.mark.mid
+    def test_get_key_store(self):
+        with patch('task_dispatcher.dedup.settings') as settings_mock:
+            settings_mock.dedup_backend = None
+            self.assertIsNone(get_key_store())
+
+            settings_mock.dedup_backend = 'task_dispatcher.dedup:SQLiteKeyStore'
+            settings_mock.dedup_path = '/foo/dedup.db'
+            self.assertIsInstance(get_key_store(), SQLiteKeyStore)
+            self.assertEqual(get_key_store().path, '/foo/dedup.db')
+            self.assertIs(get_key_store(), get_key_store())
+
+
+class SQLiteKeyStoreTestCase(TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.store = SQLiteKeyStore(os.path.join(self.path, 'dedup', 'dedup.db'))
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    @pytest.mark.high
+    def test_add(self):
+        other = SQLiteKeyStore(self.store.path)
+
+        self.assertTrue(self.store.add('foo', 60.0))
+        self.assertFalse(other.add('foo', 60.0))
+        self.assertTrue(other.add('bar', 60.0))
+
+    @pytest.mark.high
+    def test_expired(self):
+        with patch('task_dispatcher.dedup.time.time', side_effect=[0.0, 30.0, 61.0]):
+            self.assertTrue(self.store.add('foo', 60.0))
+            self.assertFalse(self.store.add('foo', 60.0))
+            self.assertTrue(self.store.add('foo', 60.0))
+
+        self.assertEqual(self.store.connection.execute('SELECT COUNT(*) FROM keys').fetchone(), (1,))
+
+    @pytest.mark.mid
+    def test_discard(self):
+        self.store.add('foo', 60.0)
+
+        self.store.discard('foo')
+        self.store.discard('foo')
+
+        self.assertTrue(self.store.add('foo', 60.0))
+
+    @pytest.mark.low
+    def test_default_path(self):
+        self.assertEqual(SQLiteKeyStore().path, os.path.join(tempfile.gettempdir(), 'task_dispatcher', 'dedup.db'))
+
+
+class DeduplicatingTestCase(TestCase):
+    def setUp(self):
+        self.app = Celery(set_as_current=False)
+        self.stats = TaskStats('foo')
+        self.func = MagicMock(return_value='result', __name__='foo', __qualname__='foo')
+        self.task = self.app.task(deduplicating(self.func, 'foo', lambda x, y=None: x, 60.0, self.stats),
+                                  name='foo', shared=False)
+
+    def tearDown(self):
+        dedup._key_store = None
+
+    @pytest.mark.high
+    def test_skip_duplicated(self):
+        results = [self.task.apply((1,), {'y': 2}).get(), self.task.apply((1,), {'y': 3}).get(),
+                   self.task.apply((2,)).get()]
+
+        self.assertEqual(results, ['result', None, 'result'])
+        self.assertEqual(self.func.call_count, 2)
+        counters = self.stats.to_dict()['counters']
+        self.assertEqual((counters['dedup_hits_total'], counters['dedup_misses_total']), (1, 2))
+
+    @pytest.mark.high
+    def test_failed_runs_again(self):
+        self.func.side_effect = [ValueError, 'result']
+
+        self.task.apply((1,))
+        result = self.task.apply((1,)).get()
+
+        self.assertEqual(result, 'result')
+        self.assertEqual(self.func.call_count, 2)
+
+    @pytest.mark.high
+    def test_shared_key_store(self):
+        key_store = MagicMock()
+        key_store.add.side_effect = [True, False]
+        dedup._key_store = key_store
+        self.func.side_effect = [ValueError, 'result']
+
+        self.task.apply((1,))
+        result = self.task.apply((1,)).get()
+
+        self.assertIsNone(result)
+        self.assertEqual(key_store.discard.call_args[0][0], 'foo:1')
+        self.assertEqual(self.func.call_count, 1)
+
+    @pytest.mark.mid
+    def test_called_directly(self):
+        self.task(1)
+        self.task(1)
+
+        self.assertEqual(self.func.call_count, 2)
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+from unittest.case import TestCase
+from unittest.mock import MagicMock, patch
+
+import pytest
+from celery.exceptions import Retry
+
+from task_dispatcher.flow import FlowControl, MODE_BLOCK, MODE_RESCHEDULE, Watermarks
+
+
+class FlowControlTestCase(TestCase):
+    def setUp(self):
+        self.flow_control = FlowControl(MagicMock())
+        self.flow_control._queue_depth = MagicMock()
+        self.depth = self.flow_control._queue_depth.get
+
+        self.settings_patcher = patch('task_dispatcher.flow.settings')
+        self.settings = self.settings_patcher.start()
+        self.settings.flow_control = {'consumer': {'high': 10, 'low': 5}}
+        self.settings.flow_control_interval = 0.0
+
+    def tearDown(self):
+        self.settings_patcher.stop()
+
+    @pytest.mark.high
+    def test_watermarks_by_queue(self):
+        self.assertEqual(self.flow_control.watermarks('foo', 'consumer'), Watermarks(10, 5, MODE_BLOCK))
+
+    @pytest.mark.high
+    def test_watermarks_by_task(self):
+        self.settings.flow_control['foo'] = {'high': 3, 'mode': MODE_RESCHEDULE}
+
+        self.assertEqual(self.flow_control.watermarks('foo', 'consumer'), Watermarks(3, 3, MODE_RESCHEDULE))
+
+    @pytest.mark.high
+    def test_watermarks_disabled(self):
+        self.assertIsNone(self.flow_control.watermarks('foo', 'bar'))
+
+    @pytest.mark.high
+    def test_check_hysteresis(self):
+        watermarks = Watermarks(10, 5, MODE_BLOCK)
+        results = []
+        for depth in (9, 10, 7, 5, 9):
+            self.depth.return_value = depth
+            results.append(self.flow_control.check('consumer', watermarks))
+
+        self.assertEqual(results, [True, False, False, True, True])
+
+    @pytest.mark.high
+    def test_wait_block(self):
+        self.depth.side_effect = [12, 8, 4]
+
+        with patch('task_dispatcher.flow.time.sleep') as sleep_mock:
+            self.flow_control.wait('foo', 'consumer')
+
+        self.assertEqual(sleep_mock.call_count, 2)
+
+    @pytest.mark.high
+    def test_wait_disabled(self):
+        self.flow_control.wait('foo', 'bar')
+
+        self.assertEqual(self.depth.call_count, 0)
+
+    @pytest.mark.high
+    def test_wait_reschedule(self):
+        self.settings.flow_control['consumer']['mode'] = MODE_RESCHEDULE
+        self.depth.return_value = 12
+        task = MagicMock()
+        task.request.called_directly = False
+        task.retry.return_value = Retry()
+
+        with patch('task_dispatcher.flow.current_task', task):
+            with self.assertRaises(Retry):
+                self.flow_control.wait('foo', 'consumer')
+
+        self.assertEqual(task.retry.call_count, 1)
+
+    @pytest.mark.mid
+    def test_queue_depth(self):
+        app = MagicMock()
+
+        queue_depth = FlowControl(app).queue_depth
+
+        self.assertIs(queue_depth.app, app)
+        self.assertEqual(queue_depth.ttl, 0.0)
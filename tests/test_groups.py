@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+import signal
+import sys
+from unittest.case import TestCase
+from unittest.mock import MagicMock, call, patch
+
+import pytest
+
+from task_dispatcher.groups import Group, Supervisor, get_groups, group_of, group_queue, worker_argv
+
+GROUPS = {
+    'heavy': {'tasks': ['myapp.ml.*', 'myapp.reports.build'], 'pool': 'prefork', 'concurrency': 2, 'prefetch': 1,
+              'max_memory_per_child': 1048576},
+    'light': {'tasks': ['myapp.*'], 'pool': 'threads', 'concurrency': 50, 'queue': 'io'},
+}
+
+
+class GroupsTestCase(TestCase):
+    def setUp(self):
+        self.settings_patcher = patch('task_dispatcher.groups.settings')
+        self.settings_mock = self.settings_patcher.start()
+        self.settings_mock.groups = GROUPS
+
+    def tearDown(self):
+        self.settings_patcher.stop()
+
+    @pytest.mark.low
+    def test_group_queue(self):
+        self.assertEqual(group_queue('heavy'), 'group.heavy')
+
+    @pytest.mark.high
+    def test_get_groups(self):
+        heavy, light = get_groups()
+
+        self.assertEqual(heavy, Group('heavy', ['myapp.ml.*', 'myapp.reports.build'], 'group.heavy', 'prefork', 2, 1,
+                                      1048576, None))
+        self.assertEqual(light, Group('light', ['myapp.*'], 'io', 'threads', 50, None, None, None))
+
+    @pytest.mark.mid
+    def test_get_groups_by_name(self):
+        self.assertEqual([g.name for g in get_groups(iter(['light']))], ['light'])
+
+    @pytest.mark.mid
+    def test_get_groups_unknown(self):
+        with self.assertRaises(ValueError):
+            get_groups(['light', 'foo'])
+
+    @pytest.mark.high
+    def test_group_of(self):
+        self.assertEqual(group_of('myapp.ml.train').name, 'heavy')
+        self.assertEqual(group_of('myapp.reports.build').name, 'heavy')
+        self.assertEqual(group_of('myapp.reports.send').name, 'light')
+        self.assertIsNone(group_of('other.task'))
+
+    @pytest.mark.high
+    def test_worker_argv(self):
+        heavy, light = get_groups()
+
+        self.assertEqual(worker_argv(heavy), [
+            sys.executable, '-m', 'task_dispatcher', 'consumer', '-Q', 'group.heavy', '-n', 'heavy@%h', '-P', 'prefork',
+            '-c', '2', '--prefetch-multiplier', '1', '--max-memory-per-child', '1048576'])
+        self.assertEqual(worker_argv(light), [
+            sys.executable, '-m', 'task_dispatcher', 'consumer', '-Q', 'io', '-n', 'light@%h', '-P', 'threads', '-c',
+            '50'])
+
+
+class SupervisorTestCase(TestCase):
+    def setUp(self):
+        self.settings_patcher = patch('task_dispatcher.groups.settings')
+        self.settings_mock = self.settings_patcher.start()
+        self.settings_mock.groups = GROUPS
+        self.settings_mock.supervise_interval = 1.0
+        self.settings_mock.supervise_max_backoff = 10.0
+        self.popen_patcher = patch('task_dispatcher.groups.subprocess.Popen')
+        self.popen_mock = self.popen_patcher.start()
+        self.popen_mock.return_value.poll.return_value = None
+        self.supervisor = Supervisor(get_groups(['heavy']))
+
+    def tearDown(self):
+        self.popen_patcher.stop()
+        self.settings_patcher.stop()
+
+    def check(self, now: float):
+        with patch('task_dispatcher.groups.time.monotonic', return_value=now):
+            self.supervisor.check()
+
+    @pytest.mark.high
+    def test_start(self):
+        with patch('task_dispatcher.groups.time.monotonic', return_value=0.0):
+            self.supervisor.start(self.supervisor.groups[0])
+
+        self.popen_mock.assert_called_once_with(worker_argv(self.supervisor.groups[0]))
+        self.assertIs(self.supervisor.processes['heavy'], self.popen_mock.return_value)
+
+    @pytest.mark.high
+    def test_restart_backoff(self):
+        with patch('task_dispatcher.groups.time.monotonic', return_value=0.0):
+            self.supervisor.start(self.supervisor.groups[0])
+        self.popen_mock.return_value.poll.return_value = 1
+
+        self.check(1.0)  # First failure, restart in 1 second
+        self.assertEqual(self.popen_mock.call_count, 1)
+        self.check(2.0)
+        self.assertEqual(self.popen_mock.call_count, 2)
+
+        self.check(3.0)  # Second failure, restart in 2 seconds
+        self.check(4.0)
+        self.assertEqual(self.popen_mock.call_count, 2)
+        self.check(5.0)
+        self.assertEqual(self.popen_mock.call_count, 3)
+
+    @pytest.mark.mid
+    def test_backoff_capped(self):
+        self.supervisor._failures['heavy'] = 10
+        self.check(0.0)
+        self.supervisor.processes['heavy'] = MagicMock(**{'poll.return_value': 1})
+
+        self.check(0.0)
+        self.check(9.0)
+        self.assertEqual(self.popen_mock.call_count, 0)
+        self.check(10.0)
+        self.assertEqual(self.popen_mock.call_count, 1)
+
+    @pytest.mark.mid
+    def test_healthy_resets_backoff(self):
+        with patch('task_dispatcher.groups.time.monotonic', return_value=0.0):
+            self.supervisor.start(self.supervisor.groups[0])
+        self.supervisor._failures['heavy'] = 3
+
+        self.check(5.0)
+        self.assertEqual(self.supervisor._failures['heavy'], 3)
+        self.check(10.0)
+        self.assertEqual(self.supervisor._failures['heavy'], 0)
+
+    @pytest.mark.high
+    def test_stop(self):
+        with patch('task_dispatcher.groups.time.monotonic', return_value=0.0):
+            self.supervisor.start(self.supervisor.groups[0])
+
+        self.supervisor.stop(signal.SIGINT)
+        self.popen_mock.return_value.poll.return_value = 1
+        self.check(100.0)
+
+        self.popen_mock.return_value.send_signal.assert_called_once_with(signal.SIGINT)
+        self.assertEqual(self.popen_mock.call_count, 1)
+
+    @pytest.mark.high
+    def test_run(self):
+        def sleep(seconds):
+            self.supervisor.stop()
+
+        with patch('task_dispatcher.groups.signal.signal') as signal_mock, \
+                patch('task_dispatcher.groups.time.sleep', side_effect=sleep) as sleep_mock:
+            self.assertEqual(self.supervisor.run(), 0)
+
+        self.assertEqual(signal_mock.call_args_list,
+                         [call(signal.SIGTERM, self.supervisor.stop), call(signal.SIGINT, self.supervisor.stop)])
+        sleep_mock.assert_called_once_with(1.0)
+        self.popen_mock.return_value.send_signal.assert_called_once_with(signal.SIGTERM)
+        self.popen_mock.return_value.wait.assert_called_once_with()
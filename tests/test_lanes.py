@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+from collections import Counter
+from unittest.case import TestCase
+from unittest.mock import MagicMock, call, patch
+
+import pytest
+
+from task_dispatcher.lanes import Lane, LaneQueue, get_lanes, lane_queue
+
+
+def waiter(queue):
+    request = MagicMock()
+    request.delivery_info = {'routing_key': queue}
+    return MagicMock(), (request,), {}
+
+
+class LanesTestCase(TestCase):
+    @pytest.mark.high
+    def test_lane_queue(self):
+        self.assertEqual(lane_queue('foo'), 'consumer.foo')
+        self.assertEqual(lane_queue('foo', 'producer'), 'producer.foo')
+
+    @pytest.mark.mid
+    def test_get_lanes(self):
+        with patch('task_dispatcher.lanes.settings') as settings_mock:
+            settings_mock.lanes = {'foo': {'weight': 10, 'prefetch': 4}}
+
+            lanes = get_lanes(['foo', 'bar'])
+
+        self.assertEqual(lanes, [Lane('foo', 'consumer.foo', 10, 4), Lane('bar', 'consumer.bar', 1, None)])
+
+
+class LaneQueueTestCase(TestCase):
+    def setUp(self):
+        self.on_pause = MagicMock()
+        self.on_resume = MagicMock()
+        self.queue = LaneQueue([Lane('fast', 'consumer.fast', 10, None), Lane('slow', 'consumer.slow', 1, 4)],
+                               on_pause=self.on_pause, on_resume=self.on_resume)
+
+    @pytest.mark.high
+    def test_weighted(self):
+        for _ in range(100):
+            self.queue.append(waiter('consumer.fast'))
+            self.queue.append(waiter('consumer.slow'))
+
+        popped = Counter(self.queue.popleft()[1][0].delivery_info['routing_key'] for _ in range(33))
+
+        self.assertEqual(popped, {'consumer.fast': 30, 'consumer.slow': 3})
+
+    @pytest.mark.high
+    def test_fifo_within_lane(self):
+        waiters = [waiter('consumer.fast') for _ in range(3)]
+        for w in waiters:
+            self.queue.append(w)
+
+        self.assertEqual([self.queue.popleft() for _ in range(3)], waiters)
+
+    @pytest.mark.high
+    def test_default_lane(self):
+        other = waiter('foo')
+        self.queue.append(other)
+        self.queue.append(waiter('consumer.fast'))
+
+        self.assertEqual(len(self.queue), 2)
+        self.assertEqual({self.queue.popleft()[1][0].delivery_info['routing_key'] for _ in range(2)},
+                         {'foo', 'consumer.fast'})
+
+    @pytest.mark.mid
+    def test_waiter_without_args(self):
+        self.queue.append((MagicMock(), (), {}))
+
+        self.assertEqual(len(self.queue._waiting[None]), 1)
+
+    @pytest.mark.high
+    def test_empty(self):
+        with self.assertRaises(IndexError):
+            self.queue.popleft()
+
+    @pytest.mark.high
+    def test_pause_resume(self):
+        for _ in range(5):
+            self.queue.append(waiter('consumer.slow'))
+
+        self.on_pause.assert_called_once_with('consumer.slow')
+
+        self.queue.popleft()
+        self.queue.popleft()
+        self.on_resume.assert_not_called()
+
+        self.queue.popleft()
+        self.on_resume.assert_called_once_with('consumer.slow')
+
+    @pytest.mark.mid
+    def test_clear(self):
+        for _ in range(4):
+            self.queue.append(waiter('consumer.slow'))
+        self.queue.append(waiter('consumer.fast'))
+
+        self.queue.clear()
+
+        self.assertEqual(len(self.queue), 0)
+        self.on_resume.assert_called_once_with('consumer.slow')
+
+    @pytest.mark.mid
+    def test_install(self):
+        semaphore = MagicMock()
+
+        self.queue.install(semaphore)
+
+        self.assertIs(semaphore._waiting, self.queue)
+        self.assertEqual(semaphore._add_waiter, self.queue.append)
+        self.assertEqual(semaphore._pop_waiter, self.queue.popleft)
+
+    @pytest.mark.mid
+    def test_semaphore(self):
+        from kombu.asynchronous.semaphore import LaxBoundedSemaphore
+
+        semaphore = LaxBoundedSemaphore(1)
+        self.queue.install(semaphore)
+        callback = MagicMock()
+        fast, slow = waiter('consumer.fast'), waiter('consumer.slow')
+
+        semaphore.acquire(callback, 'first')
+        semaphore.acquire(callback, *slow[1])
+        semaphore.acquire(callback, *fast[1])
+        semaphore.release()
+
+        self.assertEqual(callback.call_args_list, [call('first'), call(*fast[1])])
@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+import tempfile
+import threading
+from concurrent.futures import Future
+from unittest.case import TestCase
+from unittest.mock import patch
+
+import pytest
+from celery.exceptions import TimeoutError
+
+from task_dispatcher import local, streaming
+from task_dispatcher.batches import BatchTask
+from task_dispatcher.celery import app
+from task_dispatcher.decorators import consumer, producer
+from task_dispatcher.local import LocalEngine, LocalResult, get_engine, reset_engine
+from task_dispatcher.settings import settings
+
+
+def append(items, item):
+    items.append(item)
+    return items
+
+
+def fail():
+    raise ValueError('foo')
+
+
+def square(x):
+    return x * x
+
+
+def wait(event):
+    return event.wait(5)
+
+
+def send(engine, n):
+    return [engine.apply_async(square_task, (i,)) for i in range(n)]
+
+
+def batch_square(items):
+    return [x * y for x, y in items]
+
+
+def batch_none(items):
+    pass
+
+
+def batch_twice(items):
+    return items * 2
+
+
+append_task = app.task(append, name='tests.local.append', shared=False)
+fail_task = app.task(fail, name='tests.local.fail', shared=False)
+square_task = app.task(square, name='tests.local.square', shared=False)
+wait_task = app.task(wait, name='tests.local.wait', shared=False)
+send_task = app.task(send, name='tests.local.send', shared=False)
+batch_square_task = app.task(batch_square, name='tests.local.batch_square', base=BatchTask, shared=False)
+batch_none_task = app.task(batch_none, name='tests.local.batch_none', base=BatchTask, shared=False)
+batch_twice_task = app.task(batch_twice, name='tests.local.batch_twice', base=BatchTask, shared=False)
+
+squared = []
+
+
+@consumer(name='tests.local.consumer_square')
+def consumer_square(x):
+    squared.append(x * x)
+    return x * x
+
+
+@producer(name='tests.local.produce', target=consumer_square)
+def produce(n):
+    yield from range(n)
+
+
+class Foo:
+    calls = 0
+
+    @consumer(name='tests.local.Foo.square', cache=True)
+    def square(self, x):
+        Foo.calls += 1
+        return x * x
+
+
+class LocalEngineTestCase(TestCase):
+    def setUp(self):
+        self.engine = LocalEngine(concurrency=2, queue_size=2)
+
+    def tearDown(self):
+        self.engine.shutdown()
+
+    @pytest.mark.high
+    def test_apply_async(self):
+        result = self.engine.apply_async(square_task, (3,), task_id='foo', queue='bar', countdown=10)
+
+        self.assertIsInstance(result, LocalResult)
+        self.assertEqual(result.id, 'foo')
+        self.assertEqual(result.get(timeout=5), 9)
+        self.assertTrue(result.ready())
+        self.assertTrue(result.successful())
+        self.assertFalse(result.failed())
+
+    @pytest.mark.high
+    def test_arguments_by_reference(self):
+        items = []
+
+        result = self.engine.apply_async(append_task, kwargs={'items': items, 'item': 'foo'})
+
+        self.assertIs(result.get(timeout=5), items)
+        self.assertEqual(items, ['foo'])
+
+    @pytest.mark.high
+    def test_failure(self):
+        result = self.engine.apply_async(fail_task)
+
+        self.assertRaises(ValueError, result.get, timeout=5)
+        self.assertIsInstance(result.get(timeout=5, propagate=False), ValueError)
+        self.assertTrue(result.failed())
+        self.assertFalse(result.successful())
+
+    @pytest.mark.high
+    def test_bounded_queue(self):
+        event = threading.Event()
+        results = [self.engine.apply_async(wait_task, (event,)) for _ in range(4)]
+
+        # Two executions are running and two are waiting, so sending another one blocks
+        self.assertFalse(self.engine._pending.acquire(blocking=False))
+
+        event.set()
+        self.assertEqual([r.get(timeout=5) for r in results], [True] * 4)
+        self.assertTrue(self.engine._pending.acquire(blocking=False))
+
+    @pytest.mark.high
+    def test_send_from_pool(self):
+        engine = LocalEngine(concurrency=1, queue_size=1)
+        self.addCleanup(engine.shutdown, wait=False)
+
+        # The only thread of the pool sends more tasks than the queue size, without waiting for the pool itself
+        results = engine.apply_async(send_task, (engine, 5)).get(timeout=5)
+
+        self.assertEqual([r.get(timeout=5) for r in results], [0, 1, 4, 9, 16])
+        self.assertTrue(engine._pending.acquire(blocking=False))
+        self.assertTrue(engine._pending.acquire(blocking=False))
+
+    @pytest.mark.high
+    def test_timeout(self):
+        event = threading.Event()
+        result = self.engine.apply_async(wait_task, (event,))
+
+        self.assertRaises(TimeoutError, result.get, timeout=0.01)
+        event.set()
+        self.assertTrue(result.get(timeout=5))
+
+    @pytest.mark.high
+    def test_batch(self):
+        self.assertEqual(self.engine.apply_async(batch_square_task, (3, 2)).get(timeout=5), 6)
+        self.assertIsNone(self.engine.apply_async(batch_none_task, (3,)).get(timeout=5))
+
+    @pytest.mark.mid
+    def test_batch_wrong_results(self):
+        result = self.engine.apply_async(batch_twice_task, (3,))
+
+        self.assertRaises(ValueError, result.get, timeout=5)
+
+    @pytest.mark.mid
+    def test_submit_fails(self):
+        self.engine.shutdown()
+
+        self.assertRaises(RuntimeError, self.engine.apply_async, square_task, (3,))
+        self.assertTrue(self.engine._pending.acquire(blocking=False))
+
+    @pytest.mark.mid
+    def test_cancelled(self):
+        future, result = Future(), LocalResult('foo')
+        self.engine._pending.acquire()
+        future.cancel()
+
+        self.engine._done(future, result)
+
+        self.assertTrue(result.cancelled())
+        self.assertFalse(result.successful())
+
+    @pytest.mark.low
+    def test_unknown_pool(self):
+        self.assertRaises(ValueError, LocalEngine, 'foo')
+
+    @pytest.mark.mid
+    def test_processes(self):
+        engine = LocalEngine('processes', concurrency=1)
+
+        try:
+            self.assertEqual(engine.apply_async(square_task, (3,)).get(timeout=30), 9)
+        finally:
+            engine.shutdown()
+
+
+class GetEngineTestCase(TestCase):
+    def tearDown(self):
+        reset_engine()
+
+    @pytest.mark.mid
+    def test_get_engine(self):
+        with patch('task_dispatcher.local.settings') as settings_mock:
+            settings_mock.local_pool = 'threads'
+            settings_mock.local_concurrency = 3
+            settings_mock.local_queue_size = 10
+
+            engine = get_engine()
+
+        self.assertEqual(engine.executor._max_workers, 3)
+        self.assertIs(get_engine(), engine)
+
+    @pytest.mark.mid
+    def test_reset_engine(self):
+        engine = get_engine()
+
+        self.assertIs(reset_engine(), engine)
+        self.assertIsNone(local._engine)
+        self.assertIsNone(reset_engine())
+
+
+class LocalDecoratorsTestCase(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.settings_patcher = patch.multiple(settings, engine='local', checkpoint_path=self.directory.name)
+        self.settings_patcher.start()
+        streaming._checkpoint_store = None
+        local._engine = LocalEngine(concurrency=2, queue_size=2)
+        squared.clear()
+
+    def tearDown(self):
+        reset_engine()
+        streaming._checkpoint_store = None
+        self.settings_patcher.stop()
+        self.directory.cleanup()
+
+    @pytest.mark.high
+    def test_streaming(self):
+        self.assertEqual(produce.delay(3).get(timeout=5), 3)
+
+        local._engine.shutdown()
+        self.assertEqual(sorted(squared), [0, 1, 4])
+
+    @pytest.mark.high
+    def test_method(self):
+        Foo.calls = 0
+        foo = Foo()
+
+        self.assertEqual([foo.square.delay(3).get(timeout=5), foo.square.delay(3).get(timeout=5)], [9, 9])
+        self.assertEqual(Foo.calls, 1)
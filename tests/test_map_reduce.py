@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+import operator
+from unittest.case import TestCase
+from unittest.mock import patch
+
+import pytest
+
+from task_dispatcher.celery import app
+from task_dispatcher.decorators import consumer
+from task_dispatcher.map_reduce import MapReduceResult, map_chunk, map_reduce
+
+
+@consumer(name='tests.test_map_reduce.square')
+def square(x):
+    return x ** 2
+
+
+cached_calls = []
+
+
+@consumer(name='tests.test_map_reduce.cached_square', cache=True)
+def cached_square(x):
+    cached_calls.append(x)
+    return x ** 2
+
+
+@consumer(name='tests.test_map_reduce.batch_square', batch_size=2)
+def batch_square(requests):
+    pass
+
+
+@consumer(name='tests.test_map_reduce.partitioned_square', partition_key=lambda x: x, partitions=2)
+def partitioned_square(x):
+    return x ** 2
+
+
+class Foo:
+    @consumer(name='tests.test_map_reduce.Foo.square')
+    def square(self, x):
+        return x ** 2
+
+
+class MapReduceTestCase(TestCase):
+    def setUp(self):
+        self.always_eager = app.conf.task_always_eager
+        app.conf.task_always_eager = True
+
+    def tearDown(self):
+        app.conf.task_always_eager = self.always_eager
+
+    @pytest.mark.high
+    def test_map_reduce(self):
+        with patch.object(map_chunk, 'apply_async', wraps=map_chunk.apply_async) as apply_async_mock:
+            result = map_reduce(square, range(10), operator.add, chunk_size=4)
+
+            self.assertEqual(result.get(), sum(i ** 2 for i in range(10)))
+
+        self.assertEqual([c[0][0][2] for c in apply_async_mock.call_args_list],
+                         [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]])
+        self.assertEqual(apply_async_mock.call_args[1]['queue'], 'consumer')
+
+    @pytest.mark.high
+    def test_map_reduce_by_name(self):
+        result = map_reduce('tests.test_map_reduce.square', range(3), max, chunk_size=2)
+
+        self.assertEqual(result.get(), 4)
+
+    @pytest.mark.mid
+    def test_map_reduce_empty(self):
+        self.assertEqual(map_reduce(square, [], operator.add, initial=0).get(), 0)
+        with self.assertRaises(TypeError):
+            map_reduce(square, [], operator.add).get()
+
+    @pytest.mark.mid
+    def test_map_reduce_flow_control(self):
+        with patch('task_dispatcher.decorators.flow_control') as flow_control_mock:
+            map_reduce(square, range(5), operator.add, chunk_size=2)
+
+        self.assertEqual(flow_control_mock.wait.call_count, 3)
+
+    @pytest.mark.mid
+    def test_unknown_consumer(self):
+        with self.assertRaises(ValueError):
+            map_reduce('foo.bar', range(3), operator.add)
+
+        with self.assertRaises(ValueError):
+            map_reduce(map_chunk, range(3), operator.add)
+
+    @pytest.mark.high
+    def test_map_reduce_wrappers(self):
+        result = map_reduce(cached_square, [2, 2, 3], operator.add, chunk_size=3)
+
+        self.assertEqual(result.get(), 17)
+        self.assertEqual(cached_calls, [2, 3])
+
+    @pytest.mark.mid
+    def test_map_reduce_consumer_failed(self):
+        with patch.object(square.task, 'run', side_effect=ValueError):
+            result = map_reduce(square, range(3), operator.add)
+
+            self.assertRaises(ValueError, result.get)
+
+    @pytest.mark.mid
+    def test_consumer_cannot_be_mapped(self):
+        for task in (batch_square, partitioned_square, Foo.square):
+            with self.assertRaises(ValueError):
+                map_reduce(task, range(3), operator.add)
+
+    @pytest.mark.mid
+    def test_reducer_not_importable(self):
+        with self.assertRaises(ValueError):
+            map_reduce(square, range(3), lambda a, b: a + b)
+
+
+class MapReduceResultTestCase(TestCase):
+    @pytest.mark.mid
+    def test_forget_partial_results(self):
+        results = [app.AsyncResult('foo'), app.AsyncResult('bar')]
+
+        with patch.object(results[0], 'get', return_value=1), patch.object(results[0], 'forget') as forget_mock, \
+                patch.object(results[1], 'get', return_value=2), patch.object(results[1], 'forget'):
+            self.assertEqual(MapReduceResult(results, operator.add, 10).get(timeout=1), 13)
+
+        self.assertEqual(forget_mock.call_count, 1)
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import threading
+from unittest.case import TestCase
+from unittest.mock import MagicMock, patch
+
+import pytest
+from celery import Celery
+from kombu.exceptions import ContentDisallowed
+
+from task_dispatcher import memoize
+from task_dispatcher.memoize import ResultStore, SQLiteResultStore, get_result_store, memoize_key, memoizing
+from task_dispatcher.stats import TaskStats
+
+
+class Foo:
+    def __init__(self, bar):
+        self.bar = bar
+
+
+class MemoizeKeyTestCase(TestCase):
+    @pytest.mark.high
+    def test_key(self):
+        self.assertEqual(memoize_key('foo', (1,), {'a': 1, 'b': 2}), memoize_key('foo', (1,), {'b': 2, 'a': 1}))
+        self.assertNotEqual(memoize_key('foo', (1,), {}), memoize_key('foo', (2,), {}))
+        self.assertNotEqual(memoize_key('foo', (1,), {}), memoize_key('bar', (1,), {}))
+        self.assertTrue(memoize_key('foo', (1,), {}).startswith('foo:'))
+
+    @pytest.mark.high
+    def test_key_instance_state(self):
+        self.assertEqual(memoize_key('foo', (Foo(1), 2), {}), memoize_key('foo', (Foo(1), 2), {}))
+        self.assertNotEqual(memoize_key('foo', (Foo(1), 2), {}), memoize_key('foo', (Foo(2), 2), {}))
+
+    @pytest.mark.mid
+    def test_key_not_serializable(self):
+        self.assertIsNone(memoize_key('foo', (threading.Lock(),), {}))
+
+
+class ResultStoreTestCase(TestCase):
+    def tearDown(self):
+        memoize._result_store = None
+
+    @pytest.mark.low
+    def test_not_implemented(self):
+        self.assertRaises(NotImplementedError, ResultStore().get, 'foo')
+        self.assertRaises(NotImplementedError, ResultStore().set, 'foo', 1, 1.0)
+
+    @pytest.mark.mid
+    def test_get_result_store(self):
+        with patch('task_dispatcher.memoize.settings') as settings_mock:
+            settings_mock.cache_backend = None
+            self.assertIsNone(get_result_store())
+
+            settings_mock.cache_backend = 'task_dispatcher.memoize:SQLiteResultStore'
+            settings_mock.cache_path = '/foo/cache.db'
+            self.assertIsInstance(get_result_store(), SQLiteResultStore)
+            self.assertEqual(get_result_store().path, '/foo/cache.db')
+            self.assertIs(get_result_store(), get_result_store())
+
+
+class SQLiteResultStoreTestCase(TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.store = SQLiteResultStore(os.path.join(self.path, 'cache', 'cache.db'))
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    @pytest.mark.high
+    def test_get_set(self):
+        other = SQLiteResultStore(self.store.path)
+
+        self.store.set('foo', {'bar': [1, 2]}, 60.0)
+
+        self.assertEqual(other.get('foo'), (True, {'bar': [1, 2]}))
+        self.assertEqual(other.get('bar'), (False, None))
+
+    @pytest.mark.high
+    def test_expired(self):
+        with patch('task_dispatcher.memoize.time.time', side_effect=[0.0, 30.0, 61.0, 61.0]):
+            self.store.set('foo', 1, 60.0)
+            self.assertEqual(self.store.get('foo'), (True, 1))
+            self.assertEqual(self.store.get('foo'), (False, None))
+            self.store.set('bar', 2, 60.0)
+
+        self.assertEqual(self.store.connection.execute('SELECT key FROM results').fetchall(), [('bar',)])
+
+    @pytest.mark.mid
+    def test_not_serializable(self):
+        self.store.set('foo', threading.Lock(), 60.0)
+
+        self.assertEqual(self.store.get('foo'), (False, None))
+
+    @pytest.mark.mid
+    def test_content_not_accepted(self):
+        self.store.set('foo', 1, 60.0)
+        self.store.connection.execute("UPDATE results SET content_type = 'application/x-python-serialize'")
+
+        self.assertRaises(ContentDisallowed, self.store.get, 'foo')
+
+    @pytest.mark.low
+    def test_default_path(self):
+        self.assertEqual(SQLiteResultStore().path, os.path.join(tempfile.gettempdir(), 'task_dispatcher', 'cache.db'))
+
+
+class MemoizingTestCase(TestCase):
+    def setUp(self):
+        self.app = Celery(set_as_current=False)
+        self.stats = TaskStats('foo')
+        self.func = MagicMock(side_effect=lambda x, y=0: x + y, __name__='foo', __qualname__='foo')
+        self.task = self.app.task(memoizing(self.func, 'foo', 10, 60.0, self.stats), name='foo', shared=False)
+
+    def tearDown(self):
+        memoize._result_store = None
+
+    @pytest.mark.high
+    def test_memoize(self):
+        results = [self.task.apply((1,), {'y': 1}).get(), self.task.apply((1,), {'y': 1}).get(),
+                   self.task.apply((2,)).get()]
+
+        self.assertEqual(results, [2, 2, 2])
+        self.assertEqual(self.func.call_count, 2)
+        counters = self.stats.to_dict()['counters']
+        self.assertEqual((counters['cache_hits_total'], counters['cache_misses_total']), (1, 2))
+
+    @pytest.mark.high
+    def test_failed_not_cached(self):
+        self.func.side_effect = [ValueError, 1]
+
+        self.assertTrue(self.task.apply((1,)).failed())
+
+        self.assertEqual(self.task.apply((1,)).get(), 1)
+        self.assertEqual(self.func.call_count, 2)
+
+    @pytest.mark.mid
+    def test_not_serializable(self):
+        self.func.side_effect = None
+        lock = threading.Lock()
+
+        self.task.apply((lock,))
+        self.task.apply((lock,))
+
+        self.assertEqual(self.func.call_count, 2)
+
+    @pytest.mark.high
+    def test_shared_result_store(self):
+        result_store = MagicMock()
+        result_store.get.side_effect = [(True, 5), (False, None)]
+        memoize._result_store = result_store
+
+        results = [self.task.apply((1,)).get(), self.task.apply((1,)).get(), self.task.apply((2,)).get()]
+
+        self.assertEqual(results, [5, 5, 2])
+        self.assertEqual(self.func.call_count, 1)
+        self.assertEqual(result_store.set.call_args[0][1:], (2, 60.0))
+
+    @pytest.mark.mid
+    def test_called_directly(self):
+        memoize._result_store = MagicMock()
+
+        self.assertEqual([self.task(1), self.task(1)], [1, 1])
+
+        self.assertEqual(self.func.call_count, 2)
+        memoize._result_store.get.assert_not_called()
+        memoize._result_store.set.assert_not_called()
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+from collections import Counter
+from unittest.case import TestCase
+
+import pytest
+
+from task_dispatcher.partitions import jump_hash, parse_partitions, partition, partition_queue
+
+
+class JumpHashTestCase(TestCase):
+    @pytest.mark.high
+    def test_range(self):
+        self.assertEqual({jump_hash(k, 5) for k in range(1000)}, set(range(5)))
+        self.assertEqual({jump_hash(k, 1) for k in range(100)}, {0})
+
+    @pytest.mark.high
+    def test_minimal_reshuffling(self):
+        keys = range(0, 2 ** 64, 2 ** 64 // 10000)
+        before = [jump_hash(k, 10) for k in keys]
+        after = [jump_hash(k, 11) for k in keys]
+
+        moved = [(b, a) for b, a in zip(before, after) if b != a]
+
+        self.assertTrue(all(a == 10 for _, a in moved))
+        self.assertAlmostEqual(len(moved) / len(before), 1 / 11, delta=0.02)
+
+    @pytest.mark.mid
+    def test_balanced(self):
+        counts = Counter(partition(k, 4) for k in range(4000))
+
+        self.assertTrue(all(900 < c < 1100 for c in counts.values()), counts)
+
+
+class PartitionTestCase(TestCase):
+    @pytest.mark.high
+    def test_stable(self):
+        self.assertEqual(partition('tenant', 16), partition(b'tenant', 16))
+        self.assertEqual(partition(42, 16), partition('42', 16))
+        self.assertEqual(partition('tenant', 16), 10)
+
+    @pytest.mark.high
+    def test_partition_queue(self):
+        self.assertEqual(partition_queue('consumer', 3), 'consumer.p3')
+
+    @pytest.mark.high
+    def test_parse_partitions(self):
+        self.assertEqual(parse_partitions('0-3, 7,2'), [0, 1, 2, 3, 7])
+        self.assertEqual(parse_partitions('5'), [5])
+
+    @pytest.mark.mid
+    def test_parse_invalid_partitions(self):
+        for spec in ('foo', '3-1', '-1', '1-', ''):
+            with self.assertRaises(ValueError):
+                parse_partitions(spec)
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+from unittest.case import TestCase
+from unittest.mock import MagicMock, patch
+from uuid import uuid4
+
+import pytest
+from celery import Celery
+
+from task_dispatcher.queues import QueueDepth
+
+
+class QueueDepthTestCase(TestCase):
+    def setUp(self):
+        self.app = Celery('test_queues', broker='memory://', set_as_current=False)
+        self.queue_depth = QueueDepth(self.app, ttl=60.0)
+        # Memory transport shares queues between apps, so each test uses its own queues
+        self.foo, self.bar = 'foo-{}'.format(uuid4()), 'bar-{}'.format(uuid4())
+
+    def tearDown(self):
+        self.queue_depth.clear()
+
+    def publish(self, queue, n):
+        with self.app.connection_for_write() as connection:
+            simple_queue = connection.SimpleQueue(queue)
+            for i in range(n):
+                simple_queue.put(i)
+            simple_queue.close()
+
+    @pytest.mark.high
+    def test_get(self):
+        self.publish(self.foo, 3)
+
+        self.assertEqual(self.queue_depth.get(self.foo), 3)
+
+    @pytest.mark.high
+    def test_get_missing_queue(self):
+        self.assertEqual(self.queue_depth.get('missing'), 0)
+
+    @pytest.mark.high
+    def test_call(self):
+        self.publish(self.foo, 3)
+        self.publish(self.bar, 2)
+
+        self.assertEqual(self.queue_depth(self.foo, self.bar, 'missing'), 5)
+
+    @pytest.mark.high
+    def test_cached(self):
+        self.publish(self.foo, 1)
+        self.queue_depth.get(self.foo)
+        self.publish(self.foo, 1)
+
+        self.assertEqual(self.queue_depth.get(self.foo), 1)
+
+        self.queue_depth.clear()
+        self.assertEqual(self.queue_depth.get(self.foo), 2)
+
+    @pytest.mark.mid
+    def test_connection_error(self):
+        app = MagicMock()
+        app.connection_for_read.return_value.channel_errors = (KeyError,)
+        app.connection_for_read.return_value.channel.side_effect = ConnectionError
+        queue_depth = QueueDepth(app)
+
+        with patch('task_dispatcher.queues.logger'):
+            self.assertEqual(queue_depth.get('foo'), 0)
+
+        self.assertEqual(app.connection_for_read.return_value.release.call_count, 1)
+        self.assertIsNone(queue_depth._connection)
@@ -1,15 +1,21 @@
 # -*- coding: utf-8 -*-
 import json
+import sys
+import tempfile
 from collections import OrderedDict
 from unittest import TestCase
-from unittest.mock import patch, MagicMock
+from unittest.mock import call, patch, MagicMock
 
 import pytest
 import yaml
 from celery.app.task import Task
+from celery.exceptions import NotRegistered
 
 from task_dispatcher.decorators import consumer, producer
-from task_dispatcher.register import Register, TaskRegister
+from task_dispatcher.register import LazyTaskRegistry, Register, TaskRegister
+
+# Module is shadowed by register instance in package namespace
+register_module = sys.modules['task_dispatcher.register']
 
 
 class RegisterTestCase(TestCase):
@@ -51,12 +57,16 @@ class TaskRegisterTestCase(TestCase):
         producer_mock.__qualname__ = 'qualname'
         producer_mock.__module__ = 'module'
         producer_mock.name = 'producer_name'
+        producer_mock.queue = 'producer'
+        producer_mock.serializer = 'json'
 
         consumer_mock = MagicMock(spec=Task)
         consumer_mock.__doc__ = 'docstring'
         consumer_mock.__qualname__ = 'qualname'
         consumer_mock.__module__ = 'module'
         consumer_mock.name = 'consumer_name'
+        consumer_mock.queue = 'consumer'
+        consumer_mock.serializer = 'msgpack'
 
         with patch('task_dispatcher.decorators.app') as celery_app_mock:
             celery_app_mock.task().side_effect = [producer_mock, consumer_mock]
@@ -104,6 +114,9 @@ class TaskRegisterTestCase(TestCase):
                     'description': 'docstring',
                     'module': 'module',
                     'name': 'qualname',
+                    'queue': 'consumer',
+                    'serializer': 'msgpack',
+                    'tags': [],
                 },
             },
             'producers': {
@@ -111,6 +124,9 @@ class TaskRegisterTestCase(TestCase):
                     'description': 'description',
                     'module': 'module',
                     'name': 'qualname',
+                    'queue': 'producer',
+                    'serializer': 'json',
+                    'tags': [],
                 }
             }
         }
@@ -130,6 +146,9 @@ class TaskRegisterTestCase(TestCase):
                     'description': 'docstring',
                     'module': 'module',
                     'name': 'qualname',
+                    'queue': 'consumer',
+                    'serializer': 'msgpack',
+                    'tags': [],
                 },
             },
             'producers': {
@@ -137,6 +156,9 @@ class TaskRegisterTestCase(TestCase):
                     'description': 'description',
                     'module': 'module',
                     'name': 'qualname',
+                    'queue': 'producer',
+                    'serializer': 'json',
+                    'tags': [],
                 }
             }
         }.items())))
@@ -156,6 +178,9 @@ class TaskRegisterTestCase(TestCase):
                     'description': 'docstring',
                     'module': 'module',
                     'name': 'qualname',
+                    'queue': 'consumer',
+                    'serializer': 'msgpack',
+                    'tags': [],
                 },
             },
             'producers': {
@@ -163,6 +188,9 @@ class TaskRegisterTestCase(TestCase):
                     'description': 'description',
                     'module': 'module',
                     'name': 'qualname',
+                    'queue': 'producer',
+                    'serializer': 'json',
+                    'tags': [],
                 }
             }
         }, default_flow_style=False)
@@ -173,3 +201,211 @@ class TaskRegisterTestCase(TestCase):
         result = self.register.to_yaml()
 
         self.assertEqual(expected_result, result)
+
+    @pytest.mark.high
+    def test_to_manifest(self):
+        expected_result = {
+            'consumer_name': {
+                'type': 'consumer',
+                'module': 'module',
+                'name': 'qualname',
+                'queue': 'consumer',
+                'description': 'docstring',
+                'serializer': 'msgpack',
+                'tags': [],
+                'stats': False,
+                'throttled': False,
+            },
+            'producer_name': {
+                'type': 'producer',
+                'module': 'module',
+                'name': 'qualname',
+                'queue': 'producer',
+                'description': 'description',
+                'serializer': 'json',
+                'tags': [],
+                'stats': False,
+                'throttled': False,
+            },
+        }
+
+        self.register.register(self.tasks['consumer'])
+        self.register.register(self.tasks['producer'])
+
+        result = self.register.to_manifest()
+
+        self.assertDictEqual(expected_result, result)
+
+    @pytest.mark.high
+    def test_to_manifest_celery_tasks(self):
+        task = MagicMock(spec=Task)
+        task.__module__ = 'module'
+        task.__doc__ = None
+        task.queue = 'foo'
+
+        self.register.register(self.tasks['consumer'])
+
+        result = self.register.to_manifest({'task_name': task, 'consumer_name': task, 'celery.chord': task})
+
+        self.assertEqual(set(result.keys()), {'consumer_name', 'task_name'})
+        self.assertEqual(result['consumer_name']['type'], 'consumer')
+        self.assertEqual(result['task_name']['type'], 'task')
+        self.assertEqual(result['task_name']['module'], 'module')
+        self.assertEqual(result['task_name']['queue'], 'foo')
+        self.assertEqual(result['task_name']['description'], 'Description not found')
+
+    @pytest.mark.high
+    def test_dump_and_load_manifest(self):
+        self.register.register(self.tasks['consumer'])
+        self.register.register(self.tasks['producer'])
+
+        with tempfile.NamedTemporaryFile() as manifest:
+            self.register.dump_manifest(manifest.name)
+            lazy_register = TaskRegister()
+            lazy_register.load_manifest(manifest.name)
+
+        self.assertDictEqual(self.register.to_dict(), lazy_register.to_dict())
+        self.assertEqual(len(lazy_register.consumers), 0)
+        self.assertEqual(set(lazy_register.manifest.keys()), {'consumer_name', 'producer_name'})
+
+    @pytest.mark.high
+    def test_to_dict_skips_celery_tasks(self):
+        self.register._manifest = {'foo': {'type': 'task', 'module': 'foo', 'name': 'foo', 'description': 'foo'}}
+
+        result = self.register.to_dict()
+
+        self.assertEqual(result, OrderedDict([('consumers', {}), ('producers', {})]))
+
+    @pytest.mark.high
+    def test_find(self):
+        self.register.register(self.tasks['consumer'])
+        self.register.register(self.tasks['producer'])
+        self.register._index('consumer', 'tagged', {'description': '', 'module': 'myapp.billing.tasks', 'name': 'foo',
+                                                    'queue': 'consumer', 'serializer': None, 'tags': ['nightly']})
+
+        self.assertEqual(self.register.find(), {'consumer_name', 'producer_name', 'tagged'})
+        self.assertEqual(self.register.find(type_='producer'), {'producer_name'})
+        self.assertEqual(self.register.find(queue='consumer'), {'consumer_name', 'tagged'})
+        self.assertEqual(self.register.find(module='myapp'), {'tagged'})
+        self.assertEqual(self.register.find(module='myapp.billing.tasks'), {'tagged'})
+        self.assertEqual(self.register.find(module='myapp.bill'), set())
+        self.assertEqual(self.register.find(tag='nightly', queue='consumer'), {'tagged'})
+        self.assertEqual(self.register.find(tag='nightly', queue='producer'), set())
+        self.assertEqual(self.register.find(type_='consumer', tag='nightly'), {'tagged'})
+        self.assertEqual(self.register.find(type_='producer', module='myapp'), set())
+        self.assertEqual(self.register.find(type_='foo', tag='nightly'), set())
+
+    @pytest.mark.mid
+    def test_find_by_index_does_not_scan(self):
+        self.register._index('consumer', 'tagged', {'description': '', 'module': 'myapp.tasks', 'name': 'foo',
+                                                    'queue': 'consumer', 'serializer': None, 'tags': ['nightly']})
+        entries = MagicMock(**{'__iter__.side_effect': AssertionError, '__contains__.return_value': True})
+        self.register._entries = {'consumer': entries, 'producer': entries}
+
+        self.assertEqual(self.register.find(type_='consumer', queue='consumer', tag='nightly'), {'tagged'})
+
+    @pytest.mark.high
+    def test_reindex(self):
+        entry = {'description': '', 'module': 'foo.bar', 'name': 'foo', 'queue': 'foo', 'serializer': None,
+                 'tags': ['foo']}
+        self.register._index('consumer', 'foo', entry)
+        self.register._index('consumer', 'foo', dict(entry, module='bar', queue='bar', tags=[]))
+
+        self.assertEqual(self.register.find(queue='foo'), set())
+        self.assertEqual(self.register.find(module='foo'), set())
+        self.assertEqual(self.register.find(tag='foo'), set())
+        self.assertEqual(self.register.find(queue='bar', module='bar'), {'foo'})
+
+    @pytest.mark.high
+    def test_to_dict_filtered(self):
+        self.register.register(self.tasks['consumer'])
+        self.register.register(self.tasks['producer'])
+
+        result = self.register.to_dict(queue='producer')
+
+        self.assertEqual(result['consumers'], {})
+        self.assertEqual(set(result['producers']), {'producer_name'})
+
+    @pytest.mark.high
+    def test_serialized_output_cached(self):
+        self.register.register(self.tasks['consumer'])
+
+        with patch.object(self.register, 'to_dict', wraps=self.register.to_dict) as to_dict_mock:
+            self.assertIs(self.register.to_json(), self.register.to_json())
+            self.assertIs(self.register.to_yaml(tag='foo'), self.register.to_yaml(tag='foo'))
+            self.assertEqual(to_dict_mock.call_args_list, [call(), call(tag='foo')])
+
+            self.register.register(self.tasks['producer'])
+
+            self.assertIn('producer_name', self.register.to_json())
+            self.assertEqual(to_dict_mock.call_count, 3)
+
+    @pytest.mark.high
+    def test_load_manifest_indexes(self):
+        manifest = {
+            'consumer_name': {'type': 'consumer', 'module': 'module', 'name': 'qualname', 'queue': 'consumer',
+                              'description': 'docstring', 'serializer': 'msgpack', 'tags': [], 'stats': False},
+            'lazy': {'type': 'producer', 'module': 'lazy.tasks', 'name': 'lazy', 'queue': 'producer',
+                     'description': 'lazy', 'serializer': None, 'tags': ['foo'], 'stats': False},
+            'task_name': {'type': 'task', 'module': 'module', 'name': 'task', 'queue': None,
+                          'description': 'task', 'serializer': None, 'tags': [], 'stats': False},
+        }
+        self.register.register(self.tasks['consumer'])
+
+        with tempfile.NamedTemporaryFile('w') as f:
+            json.dump(manifest, f)
+            f.flush()
+            self.register.load_manifest(f.name)
+            self.register.load_manifest(f.name)
+
+        self.assertEqual(self.register.find(), {'consumer_name', 'lazy'})
+        self.assertEqual(self.register.find(tag='foo', module='lazy'), {'lazy'})
+        self.assertEqual(self.register._entries['consumer']['consumer_name']['serializer'], 'msgpack')
+
+    @pytest.mark.high
+    def test_load(self):
+        self.register._manifest = {'foo': {'module': 'foo.bar'}}
+
+        with patch.object(register_module, 'import_module') as import_mock:
+            self.assertTrue(self.register.load('foo'))
+            self.assertFalse(self.register.load('bar'))
+
+        self.assertEqual(import_mock.call_args_list, [call('foo.bar')])
+
+    @pytest.mark.high
+    def test_load_import_error(self):
+        self.register._manifest = {'foo': {'module': 'foo.bar'}}
+
+        with patch.object(register_module, 'import_module') as import_mock:
+            import_mock.side_effect = KeyError('missing')
+
+            with self.assertRaises(KeyError):
+                self.register.load('foo')
+
+
+class LazyTaskRegistryTestCase(TestCase):
+    def setUp(self):
+        self.registry = LazyTaskRegistry()
+        self.task = MagicMock(__trace__=None)
+
+    @pytest.mark.high
+    def test_lazy_import(self):
+        def load(name):
+            self.registry['foo'] = self.task
+            return True
+
+        with patch.object(register_module, 'register') as register_mock, \
+                patch('celery.app.trace.build_tracer') as build_tracer_mock:
+            register_mock.load.side_effect = load
+            task = self.registry['foo']
+
+        self.assertIs(task, self.task)
+        self.assertEqual(task.__trace__, build_tracer_mock())
+
+    @pytest.mark.high
+    def test_not_registered(self):
+        with patch.object(register_module, 'register') as register_mock:
+            register_mock.load.return_value = False
+
+            with self.assertRaises(NotRegistered):
+                _ = self.registry['foo']
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+from unittest.case import TestCase
+from unittest.mock import MagicMock, patch
+
+import pytest
+from celery.exceptions import ImproperlyConfigured
+from kombu.exceptions import ContentDisallowed
+from kombu.serialization import dumps, loads
+
+from task_dispatcher.serializers import pickle, pickle5_dumps, pickle5_loads, accept, content_type
+
+
+class Pickle5TestCase(TestCase):
+    @pytest.mark.high
+    def test_round_trip(self):
+        obj = {'foo': [1, 2.0, 'bar'], 'baz': b'qux'}
+
+        self.assertEqual(pickle5_loads(pickle5_dumps(obj)), obj)
+
+    @pytest.mark.high
+    def test_out_of_band_buffers(self):
+        buffers = [pickle.PickleBuffer(bytearray(b'foo')), pickle.PickleBuffer(bytearray(b'barbaz'))]
+
+        body = pickle5_dumps(buffers)
+        result = pickle5_loads(body)
+
+        self.assertEqual([bytes(b) for b in result], [b'foo', b'barbaz'])
+        self.assertTrue(body.endswith(b'foobarbaz'))
+
+    @pytest.mark.high
+    def test_disabled_unless_accepted(self):
+        ct, encoding, data = dumps({'foo': 1}, serializer='pickle5')
+
+        self.assertEqual(loads(data, ct, encoding, accept=[ct]), {'foo': 1})
+        with self.assertRaises(ContentDisallowed):
+            loads(data, ct, encoding)
+
+
+class CompressedTestCase(TestCase):
+    @pytest.mark.high
+    def test_round_trip(self):
+        obj = {'foo': 'x' * 16384}
+
+        for name in ('json+zlib', 'msgpack+zlib', 'pickle5+zlib'):
+            ct, encoding, data = dumps(obj, serializer=name)
+
+            self.assertEqual(ct, content_type(name.split('+')[0]) + '+zlib')
+            self.assertLess(len(data), 16384)
+            self.assertEqual(loads(data, ct, encoding, accept=[ct]), obj)
+
+    @pytest.mark.mid
+    def test_below_threshold(self):
+        with patch('task_dispatcher.serializers.settings') as settings_mock:
+            settings_mock.compress_threshold = 1024
+            ct, encoding, data = dumps({'foo': 'bar'}, serializer='json+zlib')
+
+        self.assertEqual(data[:1], b'\x00')
+        self.assertEqual(loads(data, ct, encoding, accept=[ct]), {'foo': 'bar'})
+
+
+class AcceptTestCase(TestCase):
+    @pytest.mark.mid
+    def test_accept(self):
+        app = MagicMock()
+        app.conf.accept_content = ['json', 'application/x-msgpack']
+
+        accept(app, 'json', 'msgpack', 'pickle5+zlib', allow_pickle=True)
+
+        self.assertEqual(app.conf.accept_content,
+                         ['json', 'application/x-msgpack', 'application/x-python-pickle5+zlib'])
+
+    @pytest.mark.high
+    def test_pickle_not_allowed(self):
+        app = MagicMock()
+        app.conf.accept_content = ['json']
+
+        with patch('task_dispatcher.serializers.settings') as settings_mock:
+            settings_mock.accept_pickle = False
+            for name in ('pickle', 'pickle5', 'pickle5+zlib'):
+                with self.assertRaises(ImproperlyConfigured):
+                    accept(app, 'msgpack', name)
+
+            settings_mock.accept_pickle = True
+            accept(app, 'pickle5')
+
+        self.assertEqual(app.conf.accept_content, ['json', 'application/x-python-pickle5'])
+
+    @pytest.mark.mid
+    def test_pickle_already_accepted(self):
+        app = MagicMock()
+        app.conf.accept_content = ['pickle']
+
+        accept(app, 'pickle', allow_pickle=False)
+
+        self.assertEqual(app.conf.accept_content, ['pickle'])
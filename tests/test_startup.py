@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import subprocess
+import sys
+import time
+from unittest.case import TestCase
+
+import pytest
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+#: Modules that should only be imported by the commands that need them.
+DEFERRED_MODULES = ('flower', 'tornado', 'celery.bin.worker', 'celery.bin.beat', 'http.server', 'asyncio', 'sqlite3',
+                    'concurrent.futures', 'multiprocessing.sharedctypes')
+
+#: Time budgets in seconds, only checked when TASK_DISPATCHER_TIMING_TESTS is set since wall-clock time depends on
+#: the machine running the tests.
+IMPORT_TIME_BUDGET = 1.5
+SHOW_TIME_BUDGET = 3.0
+
+timing = pytest.mark.skipif(not os.environ.get('TASK_DISPATCHER_TIMING_TESTS'),
+                            reason='TASK_DISPATCHER_TIMING_TESTS is not set')
+
+
+def run_python(code: str, *args) -> subprocess.CompletedProcess:
+    # Coverage of subprocesses is disabled, since its hooks import some of the deferred modules
+    env = {k: v for k, v in os.environ.items() if not k.startswith('COV_CORE_')}
+    env.update(PYTHONPATH=BASE_DIR, TASK_DISPATCHER_SETTINGS='')
+    return subprocess.run((sys.executable,) + (('-c', code) if code else ()) + args, env=env, cwd=BASE_DIR,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+
+
+class StartupTestCase(TestCase):
+    @pytest.mark.low
+    def test_import_defers_dependencies(self):
+        code = ('import json, sys\n'
+                'import task_dispatcher.commands\n'
+                'print(json.dumps(list(sys.modules)))')
+
+        modules = json.loads(run_python(code).stdout.decode('utf-8'))
+
+        self.assertFalse([m for m in modules if m.startswith(DEFERRED_MODULES)])
+
+    @pytest.mark.low
+    def test_show_defers_dependencies(self):
+        code = ('import json, sys\n'
+                'from task_dispatcher.commands import TaskDispatcherCommand\n'
+                'TaskDispatcherCommand(["-q", "show"]).run()\n'
+                'print(json.dumps(list(sys.modules)))')
+
+        modules = json.loads(run_python(code).stdout.decode('utf-8').splitlines()[-1])
+
+        self.assertFalse([m for m in modules if m.startswith(DEFERRED_MODULES)])
+
+    @timing
+    @pytest.mark.low
+    def test_import_time(self):
+        code = ('import time\n'
+                't = time.perf_counter()\n'
+                'import task_dispatcher.commands\n'
+                'print(time.perf_counter() - t)')
+
+        self.assertLess(float(run_python(code).stdout.decode('utf-8')), IMPORT_TIME_BUDGET)
+
+    @timing
+    @pytest.mark.low
+    def test_show_time(self):
+        start = time.perf_counter()
+        run_python(None, '-m', 'task_dispatcher', 'show')
+
+        self.assertLess(time.perf_counter() - start, SHOW_TIME_BUDGET)
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+import os
+import urllib.request
+from unittest.case import TestCase
+from unittest.mock import MagicMock, patch
+
+import pytest
+from celery import Celery, signals
+from celery.exceptions import Retry
+
+from task_dispatcher import stats
+from task_dispatcher.stats import Histogram, StatsRegister, TaskStats
+
+
+class HistogramTestCase(TestCase):
+    @pytest.mark.high
+    def test_observe(self):
+        histogram = Histogram((1, 2, 4))
+
+        for value in (0.5, 1, 3, 10):
+            histogram.observe(value)
+
+        self.assertEqual(histogram.to_dict(), {'bounds': [1, 2, 4], 'counts': [2, 0, 1, 1], 'sum': 14.5})
+
+    @pytest.mark.high
+    def test_shared_between_processes(self):
+        histogram = Histogram((1,))
+
+        pid = os.fork()
+        if pid == 0:  # pragma: no cover
+            histogram.observe(0.5)
+            os._exit(0)
+        os.waitpid(pid, 0)
+
+        self.assertEqual(histogram.to_dict()['counts'], [1, 0])
+
+
+class TaskStatsTestCase(TestCase):
+    def setUp(self):
+        self.stats = TaskStats('foo')
+
+    @pytest.mark.high
+    def test_observe(self):
+        self.stats.observe('execution_seconds', 0.01)
+
+        self.assertEqual(sum(self.stats.to_dict()['histograms']['execution_seconds']['counts']), 1)
+
+    @pytest.mark.high
+    def test_increment(self):
+        self.stats.increment('retries_total')
+        self.stats.increment('retries_total', 2)
+
+        self.assertEqual(self.stats.to_dict()['counters'],
+                         {'retries_total': 3, 'dedup_hits_total': 0, 'dedup_misses_total': 0, 'cache_hits_total': 0,
+                          'cache_misses_total': 0, 'throttled_total': 0})
+
+    @pytest.mark.high
+    def test_register(self):
+        register = StatsRegister()
+
+        task_stats = register.register('foo')
+
+        self.assertIs(register.register('foo'), task_stats)
+        self.assertEqual(set(register.to_dict().keys()), {'foo'})
+
+    @pytest.mark.mid
+    def test_register_shares_lock(self):
+        register = StatsRegister()
+
+        self.assertIs(register.register('foo')._lock, register.register('bar')._lock)
+
+
+def double(x):
+    return x * 2
+
+
+class InstrumentTestCase(TestCase):
+    def setUp(self):
+        self.app = Celery(set_as_current=False)
+        self.stats = TaskStats('foo')
+
+    @pytest.mark.high
+    def test_instrument(self):
+        task = self.app.task(stats.instrument(double, self.stats), name='foo', shared=False)
+
+        result = task.apply((2,), headers={stats.PUBLISHED_HEADER: 1.0})
+
+        self.assertEqual(result.get(), 4)
+        histograms = self.stats.to_dict()['histograms']
+        self.assertEqual(sum(histograms['execution_seconds']['counts']), 1)
+        self.assertEqual(sum(histograms['queue_wait_seconds']['counts']), 1)
+
+    @pytest.mark.high
+    def test_instrument_memory_growth(self):
+        task = self.app.task(stats.instrument(double, self.stats), name='foo', shared=False)
+
+        with patch('task_dispatcher.stats.rss_kb', side_effect=[1000, 1500, 1500, 1200]):
+            task.apply((2,))
+            task.apply((2,))
+
+        histogram = self.stats.to_dict()['histograms']['memory_growth_bytes']
+        self.assertEqual(histogram['sum'], 512000)
+        self.assertEqual(sum(histogram['counts']), 2)
+        self.assertEqual(histogram['counts'][0], 1)
+
+    @pytest.mark.high
+    def test_instrument_retry(self):
+        def foo():
+            raise Retry()
+
+        task = self.app.task(stats.instrument(foo, self.stats), name='foo', shared=False)
+
+        task.apply()
+
+        self.assertEqual(self.stats.to_dict()['counters']['retries_total'], 1)
+
+    @pytest.mark.high
+    def test_instrument_called_directly(self):
+        task = self.app.task(stats.instrument(double, self.stats), name='foo', shared=False)
+
+        self.assertEqual(task(2), 4)
+        self.assertEqual(sum(self.stats.to_dict()['histograms']['execution_seconds']['counts']), 0)
+
+    @pytest.mark.high
+    def test_instrument_keeps_signature(self):
+        task = self.app.task(stats.instrument(double, self.stats), name='foo', shared=False)
+
+        with self.assertRaises(TypeError):
+            task.delay(1, 2)
+
+
+class ReportTestCase(TestCase):
+    def setUp(self):
+        task_stats = TaskStats('foo')
+        for value in (0.0005, 0.003, 0.003, 0.2):
+            task_stats.observe('execution_seconds', value)
+        task_stats.increment('retries_total')
+        self.stats = {'foo': task_stats.to_dict()}
+
+    @pytest.mark.high
+    def test_merge(self):
+        result = stats.merge([self.stats, self.stats])
+
+        self.assertEqual(sum(result['foo']['histograms']['execution_seconds']['counts']), 8)
+        self.assertEqual(result['foo']['counters']['retries_total'], 2)
+
+    @pytest.mark.high
+    def test_summary(self):
+        result = stats.summary(self.stats)
+
+        self.assertEqual(result['foo']['retries_total'], 1)
+        self.assertEqual(result['foo']['execution_seconds']['count'], 4)
+        self.assertEqual(result['foo']['execution_seconds']['p50'], 0.004)
+        self.assertEqual(result['foo']['execution_seconds']['p99'], 0.256)
+        self.assertEqual(result['foo']['queue_wait_seconds'], {'count': 0, 'mean': 0.0, 'p50': 0.0, 'p99': 0.0})
+
+    @pytest.mark.high
+    def test_to_prometheus(self):
+        result = stats.to_prometheus(self.stats)
+
+        self.assertIn('# TYPE task_dispatcher_execution_seconds histogram', result)
+        self.assertIn('task_dispatcher_execution_seconds_bucket{task="foo",le="0.004"} 3', result)
+        self.assertIn('task_dispatcher_execution_seconds_bucket{task="foo",le="+Inf"} 4', result)
+        self.assertIn('task_dispatcher_execution_seconds_count{task="foo"} 4', result)
+        self.assertIn('# TYPE task_dispatcher_retries_total counter', result)
+        self.assertIn('task_dispatcher_retries_total{task="foo"} 1', result)
+
+
+class SignalsTestCase(TestCase):
+    @pytest.mark.high
+    def test_publish_timestamp(self):
+        headers = {}
+
+        with patch.dict(stats.stats, {'foo': TaskStats('foo')}):
+            stats._on_before_task_publish(sender='foo', headers=headers)
+
+        self.assertIn(stats.PUBLISHED_HEADER, headers)
+
+    @pytest.mark.high
+    def test_publish_timestamp_not_instrumented(self):
+        headers = {}
+
+        stats._on_before_task_publish(sender='not_instrumented', headers=headers)
+
+        self.assertNotIn(stats.PUBLISHED_HEADER, headers)
+
+    @pytest.mark.high
+    def test_queue_wait(self):
+        self.assertIsNone(stats.queue_wait(MagicMock(spec=['headers'], headers=None)))
+        self.assertGreater(stats.queue_wait(MagicMock(spec=['headers'], headers={stats.PUBLISHED_HEADER: 1.0})), 0)
+
+    @pytest.mark.high
+    def test_payload_size(self):
+        task_stats = TaskStats('foo')
+
+        request, unknown_request = MagicMock(body=b'1234'), MagicMock(body=b'1234')
+        request.name, unknown_request.name = 'foo', 'bar'
+
+        with patch.dict(stats.stats, {'foo': task_stats}):
+            stats._on_task_received(request=request)
+            stats._on_task_received(request=unknown_request)
+
+        self.assertEqual(task_stats.to_dict()['histograms']['payload_size_bytes']['sum'], 4)
+
+    @pytest.mark.high
+    def test_control_command(self):
+        with patch.dict(stats.stats, {'foo': TaskStats('foo')}, clear=True):
+            result = stats._control_stats(MagicMock())
+
+        self.assertEqual(set(result.keys()), {'foo'})
+
+    @pytest.mark.high
+    def test_enable(self):
+        with patch('celery.signals.worker_ready.connect') as ready_mock:
+            stats.enable(port=9999)
+
+        self.assertTrue(signals.before_task_publish.receivers)
+        self.assertTrue(signals.task_received.receivers)
+        self.assertEqual(ready_mock.call_count, 1)
+
+    @pytest.mark.high
+    def test_http_server(self):
+        with patch.dict(stats.stats, {'foo': TaskStats('foo')}, clear=True):
+            server = stats.start_http_server(0, '127.0.0.1')
+            try:
+                url = 'http://127.0.0.1:{}/metrics'.format(server.server_address[1])
+                body = urllib.request.urlopen(url).read().decode('utf-8')
+            finally:
+                server.shutdown()
+                server.server_close()
+
+        self.assertIn('task_dispatcher_execution_seconds_count{task="foo"} 0', body)
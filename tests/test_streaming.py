@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+from unittest.case import TestCase
+from unittest.mock import MagicMock, patch
+
+import pytest
+from celery import Celery
+
+from task_dispatcher import streaming
+from task_dispatcher.streaming import CheckpointStore, FileCheckpointStore, dispatching, get_checkpoint_store
+
+
+class FileCheckpointStoreTestCase(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = FileCheckpointStore(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    @pytest.mark.high
+    def test_set_get_delete(self):
+        self.assertIsNone(self.store.get('foo'))
+
+        self.store.set('foo', 10)
+        self.store.set('foo', 20)
+
+        self.assertEqual(self.store.get('foo'), 20)
+        self.assertEqual(os.listdir(self.directory.name), ['foo'])
+
+        self.store.delete('foo')
+        self.store.delete('foo')
+
+        self.assertIsNone(self.store.get('foo'))
+
+    @pytest.mark.low
+    def test_default_path(self):
+        self.assertEqual(FileCheckpointStore().path,
+                         os.path.join(tempfile.gettempdir(), 'task_dispatcher', 'checkpoints'))
+
+
+class CheckpointStoreTestCase(TestCase):
+    @pytest.mark.low
+    def test_not_implemented(self):
+        self.assertRaises(NotImplementedError, CheckpointStore().get, 'foo')
+        self.assertRaises(NotImplementedError, CheckpointStore().set, 'foo', 1)
+        self.assertRaises(NotImplementedError, CheckpointStore().delete, 'foo')
+
+
+class DispatchingTestCase(TestCase):
+    def setUp(self):
+        self.app = Celery(set_as_current=False)
+        self.directory = tempfile.TemporaryDirectory()
+        self.settings_patcher = patch('task_dispatcher.streaming.settings')
+        settings_mock = self.settings_patcher.start()
+        settings_mock.checkpoint_store = 'task_dispatcher.streaming:FileCheckpointStore'
+        settings_mock.checkpoint_path = self.directory.name
+        streaming._checkpoint_store = None
+
+        self.sent = []
+        self.target = MagicMock()
+        self.target.apply_many.side_effect = lambda iterable: sum(1 for args in iterable if not self.sent.append(args))
+
+    def tearDown(self):
+        streaming._checkpoint_store = None
+        self.settings_patcher.stop()
+        self.directory.cleanup()
+
+    def task(self, func, interval=2):
+        return self.app.task(dispatching(func, self.target, interval), name='foo', shared=False)
+
+    @pytest.mark.high
+    def test_dispatch(self):
+        def produce(n):
+            yield from range(n)
+
+        result = self.task(produce).apply((5,), task_id='id').get()
+
+        self.assertEqual(result, 5)
+        self.assertEqual(self.sent, [(0,), (1,), (2,), (3,), (4,)])
+        self.assertIsNone(get_checkpoint_store().get('id'))
+
+    @pytest.mark.high
+    def test_checkpoint(self):
+        def produce(n):
+            for i in range(n):
+                if i == 3:
+                    raise ValueError
+                yield i
+
+        self.task(produce).apply((5,), task_id='id')
+
+        self.assertEqual(len(self.sent), 3)
+        self.assertEqual(get_checkpoint_store().get('id'), 2)
+
+    @pytest.mark.high
+    def test_resume_skipping_items(self):
+        def produce(n):
+            yield from range(n)
+
+        get_checkpoint_store().set('id', 2)
+
+        result = self.task(produce).apply((5,), task_id='id').get()
+
+        self.assertEqual(result, 5)
+        self.assertEqual(self.sent, [(2,), (3,), (4,)])
+
+    @pytest.mark.high
+    def test_resume_seeking(self):
+        def produce(n, checkpoint, *, stream_checkpoint=0):
+            self.assertEqual((checkpoint, stream_checkpoint), ('foo', 2))
+            yield from range(stream_checkpoint, n)
+
+        get_checkpoint_store().set('id', 2)
+
+        self.task(produce).apply((5, 'foo'), task_id='id').get()
+
+        self.assertEqual(self.sent, [(2,), (3,), (4,)])
+
+    @pytest.mark.mid
+    def test_checkpoint_not_keyword_only(self):
+        def produce(n, stream_checkpoint=0):
+            yield from range(stream_checkpoint, n)
+
+        self.assertRaises(ValueError, dispatching, produce, self.target, 2)
+
+    @pytest.mark.mid
+    def test_checkpoint_given_by_caller(self):
+        def produce(n, *, stream_checkpoint=0):
+            yield from range(stream_checkpoint, n)
+
+        result = self.task(produce).apply((5,), {'stream_checkpoint': 3}, task_id='id')
+
+        self.assertIsInstance(result.result, TypeError)
+        self.assertEqual(self.sent, [])
+
+    @pytest.mark.mid
+    def test_called_directly(self):
+        def produce(n):
+            yield from range(n)
+
+        self.assertEqual(self.task(produce)(3), 3)
+        self.assertEqual(os.listdir(self.directory.name), [])
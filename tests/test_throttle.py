@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+from unittest.case import TestCase
+from unittest.mock import MagicMock, patch
+
+import pytest
+from celery import Celery
+
+from task_dispatcher import throttle
+from task_dispatcher.stats import TaskStats
+from task_dispatcher.throttle import LocalThrottleBackend, SQLiteThrottleBackend, Throttle, ThrottleBackend, \
+    get_throttle_backend, throttling
+
+
+class ThrottleBackendTestCase(TestCase):
+    def tearDown(self):
+        throttle._throttle_backend = None
+
+    @pytest.mark.low
+    def test_not_implemented(self):
+        self.assertRaises(NotImplementedError, ThrottleBackend().take, 'foo', 1.0, 1)
+        self.assertRaises(NotImplementedError, ThrottleBackend().acquire, 'foo', 1, 1.0)
+        self.assertRaises(NotImplementedError, ThrottleBackend().release, 'foo', 'slot')
+
+    @pytest.mark.mid
+    def test_get_throttle_backend(self):
+        with patch('task_dispatcher.throttle.settings') as settings_mock:
+            settings_mock.throttle_backend = 'task_dispatcher.throttle:SQLiteThrottleBackend'
+            settings_mock.throttle_path = '/foo/throttle.db'
+
+            backend = get_throttle_backend()
+
+        self.assertIsInstance(backend, SQLiteThrottleBackend)
+        self.assertEqual(backend.path, '/foo/throttle.db')
+        self.assertIs(get_throttle_backend(), backend)
+
+
+class LocalThrottleBackendTestCase(TestCase):
+    clock = 'task_dispatcher.throttle.time.monotonic'
+
+    def setUp(self):
+        self.backend = self.create_backend()
+
+    def create_backend(self):
+        return LocalThrottleBackend()
+
+    @pytest.mark.high
+    def test_take(self):
+        with patch(self.clock, return_value=0.0):
+            self.assertEqual(self.backend.take('foo', 10.0, 4), (4, 0.0))
+            self.assertEqual(self.backend.take('foo', 10.0, 8), (6, 0.0))
+            taken, wait = self.backend.take('foo', 10.0, 1)
+
+        self.assertEqual(taken, 0)
+        self.assertAlmostEqual(wait, 0.1)
+
+    @pytest.mark.high
+    def test_refill(self):
+        with patch(self.clock, side_effect=[0.0, 0.5, 10.0]):
+            self.assertEqual(self.backend.take('foo', 10.0, 10), (10, 0.0))
+            self.assertEqual(self.backend.take('foo', 10.0, 10), (5, 0.0))
+            self.assertEqual(self.backend.take('foo', 10.0, 20), (10, 0.0))
+
+    @pytest.mark.mid
+    def test_slow_rate(self):
+        with patch(self.clock, side_effect=[0.0, 30.0]):
+            self.assertEqual(self.backend.take('foo', 1 / 60, 5), (1, 0.0))
+            taken, wait = self.backend.take('foo', 1 / 60, 5)
+
+        self.assertEqual(taken, 0)
+        self.assertAlmostEqual(wait, 30.0)
+
+    @pytest.mark.high
+    def test_acquire_release(self):
+        first = self.backend.acquire('foo', 2, 60.0)
+        second = self.backend.acquire('foo', 2, 60.0)
+
+        self.assertIsNotNone(first)
+        self.assertIsNotNone(second)
+        self.assertIsNone(self.backend.acquire('foo', 2, 60.0))
+        self.assertIsNotNone(self.backend.acquire('bar', 2, 60.0))
+
+        self.backend.release('foo', first)
+        self.assertIsNotNone(self.backend.acquire('foo', 2, 60.0))
+
+    @pytest.mark.mid
+    def test_acquire_expired(self):
+        with patch(self.clock, side_effect=[0.0, 30.0, 61.0]):
+            self.assertIsNotNone(self.backend.acquire('foo', 1, 60.0))
+            self.assertIsNone(self.backend.acquire('foo', 1, 60.0))
+            self.assertIsNotNone(self.backend.acquire('foo', 1, 60.0))
+
+
+class SQLiteThrottleBackendTestCase(LocalThrottleBackendTestCase):
+    clock = 'task_dispatcher.throttle.time.time'
+
+    def create_backend(self):
+        self.path = tempfile.mkdtemp()
+        return SQLiteThrottleBackend(os.path.join(self.path, 'throttle', 'throttle.db'))
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    @pytest.mark.mid
+    def test_shared(self):
+        other = SQLiteThrottleBackend(self.backend.path)
+
+        self.assertIsNotNone(self.backend.acquire('foo', 1, 60.0))
+        self.assertIsNone(other.acquire('foo', 1, 60.0))
+
+    @pytest.mark.mid
+    def test_reconnect_after_fork(self):
+        connection = self.backend.connection
+
+        with patch('task_dispatcher.sqlite.os.getpid', return_value=-1):
+            self.assertIsNot(self.backend.connection, connection)
+
+    @pytest.mark.mid
+    def test_rollback(self):
+        with self.assertRaises(ZeroDivisionError):
+            self.backend._transaction(lambda c: (c.execute("INSERT INTO slots VALUES ('foo', 'bar', 0)"), 1 / 0))
+
+        self.assertFalse(self.backend.connection.in_transaction)
+        self.assertEqual(self.backend.connection.execute('SELECT COUNT(*) FROM slots').fetchone(), (0,))
+
+
+class ThrottleTestCase(TestCase):
+    def setUp(self):
+        self.backend = MagicMock()
+
+    @pytest.mark.high
+    def test_rate_string(self):
+        self.assertEqual(Throttle('foo', '120/m').max_rate, 2.0)
+        self.assertEqual(Throttle('foo', 5).max_rate, 5)
+        self.assertEqual(Throttle('foo', max_concurrency=1).max_rate, 0)
+
+    @pytest.mark.high
+    def test_local_token_cache(self):
+        self.backend.take.return_value = (10, 0.0)
+        task_throttle = Throttle('foo', 100, backend=self.backend)
+
+        with patch('task_dispatcher.throttle.settings') as settings_mock:
+            settings_mock.throttle_cache_time = 0.1
+            results = [task_throttle.acquire() for _ in range(11)]
+
+        self.assertEqual(results, [(None, 0.0)] * 11)
+        self.assertEqual(self.backend.take.call_count, 2)
+        self.backend.take.assert_called_with('foo', 100, 10)
+
+    @pytest.mark.high
+    def test_local_tokens_expire(self):
+        self.backend.take.return_value = (10, 0.0)
+        task_throttle = Throttle('foo', 100, backend=self.backend)
+
+        with patch('task_dispatcher.throttle.settings') as settings_mock, \
+                patch('task_dispatcher.throttle.time.monotonic', side_effect=[0.0, 0.05, 0.2]):
+            settings_mock.throttle_cache_time = 0.1
+            for _ in range(3):
+                task_throttle.acquire()
+
+        self.assertEqual(self.backend.take.call_count, 2)
+
+    @pytest.mark.high
+    def test_rate_limited(self):
+        self.backend.take.return_value = (0, 0.5)
+        task_throttle = Throttle('foo', 1, backend=self.backend)
+
+        self.assertEqual(task_throttle.acquire(), (None, 0.5))
+        self.backend.take.assert_called_once_with('foo', 1, 1)
+
+    @pytest.mark.high
+    def test_concurrency(self):
+        self.backend.acquire.return_value = 'slot'
+        task_throttle = Throttle('foo', max_concurrency=2, backend=self.backend)
+
+        with patch('task_dispatcher.throttle.settings') as settings_mock:
+            settings_mock.throttle_slot_ttl = 60.0
+            self.assertEqual(task_throttle.acquire(), ('slot', 0.0))
+            task_throttle.release('slot')
+            task_throttle.release(None)
+
+        self.backend.acquire.assert_called_once_with('foo', 2, 60.0)
+        self.backend.release.assert_called_once_with('foo', 'slot')
+        self.backend.take.assert_not_called()
+
+    @pytest.mark.high
+    def test_concurrency_capped(self):
+        self.backend.acquire.return_value = None
+        task_throttle = Throttle('foo', max_rate=10, max_concurrency=2, backend=self.backend)
+
+        with patch('task_dispatcher.throttle.settings') as settings_mock:
+            settings_mock.throttle_interval = 2.0
+            self.assertEqual(task_throttle.acquire(), (None, 2.0))
+
+        self.backend.take.assert_not_called()
+
+    @pytest.mark.mid
+    def test_rate_limited_releases_slot(self):
+        self.backend.acquire.return_value = 'slot'
+        self.backend.take.return_value = (0, 0.5)
+        task_throttle = Throttle('foo', max_rate=1, max_concurrency=2, backend=self.backend)
+
+        self.assertEqual(task_throttle.acquire(), (None, 0.5))
+        self.backend.release.assert_called_once_with('foo', 'slot')
+
+    @pytest.mark.low
+    def test_backend_from_settings(self):
+        with patch('task_dispatcher.throttle.get_throttle_backend') as get_throttle_backend_mock:
+            self.assertIs(Throttle('foo', 1).backend, get_throttle_backend_mock.return_value)
+
+
+class ThrottlingTestCase(TestCase):
+    def setUp(self):
+        self.app = Celery(set_as_current=False)
+        self.stats = TaskStats('foo')
+        self.func = MagicMock(return_value='result', __name__='foo', __qualname__='foo')
+        self.throttle = MagicMock()
+        self.throttle.acquire.return_value = ('slot', 0.0)
+        self.task = self.app.task(throttling(self.func, self.throttle, self.stats), name='foo', shared=False)
+
+    @pytest.mark.high
+    def test_acquired(self):
+        result = self.task.apply((1,)).get()
+
+        self.assertEqual(result, 'result')
+        self.throttle.release.assert_called_once_with('slot')
+
+    @pytest.mark.high
+    def test_released_on_failure(self):
+        self.func.side_effect = ValueError
+
+        self.task.apply((1,))
+
+        self.throttle.release.assert_called_once_with('slot')
+
+    @pytest.mark.high
+    def test_deferred(self):
+        self.throttle.acquire.return_value = (None, 0.5)
+        request = MagicMock(called_directly=False, is_eager=False)
+
+        with patch('task_dispatcher.throttle.current_task') as current_task_mock:
+            current_task_mock.request = request
+            with self.assertRaises(throttle.Ignore):
+                self.task.run(1)
+
+        current_task_mock.signature_from_request.assert_called_once_with(request, countdown=0.5)
+        current_task_mock.signature_from_request.return_value.apply_async.assert_called_once_with()
+        self.func.assert_not_called()
+        self.throttle.release.assert_not_called()
+        self.assertEqual(self.stats.to_dict()['counters']['throttled_total'], 1)
+
+    @pytest.mark.high
+    def test_eager_waits(self):
+        self.throttle.acquire.side_effect = [(None, 0.5), ('slot', 0.0)]
+
+        with patch('task_dispatcher.throttle.time.sleep') as sleep_mock:
+            result = self.task.apply((1,)).get()
+
+        self.assertEqual(result, 'result')
+        sleep_mock.assert_called_once_with(0.5)
+        self.assertEqual(self.stats.to_dict()['counters']['throttled_total'], 1)
+
+    @pytest.mark.mid
+    def test_called_directly(self):
+        self.task(1)
+
+        self.func.assert_called_once_with(1)
+        self.throttle.acquire.assert_not_called()
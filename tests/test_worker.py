@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+from unittest.case import TestCase
+from unittest.mock import MagicMock, patch
+
+import pytest
+from celery.worker.consumer import Consumer as CeleryConsumer
+
+from task_dispatcher.lanes import Lane
+from task_dispatcher.worker import Consumer, LazyStrategies
+
+
+class LazyStrategiesTestCase(TestCase):
+    def setUp(self):
+        self.consumer = MagicMock()
+        self.strategies = LazyStrategies(self.consumer)
+
+    @pytest.mark.high
+    def test_start_strategy(self):
+        task = self.consumer.app.tasks['foo']
+
+        with patch('task_dispatcher.worker.build_tracer') as build_tracer_mock:
+            strategy = self.strategies['foo']
+            self.assertIs(self.strategies['foo'], strategy)
+
+        self.assertEqual(strategy, task.start_strategy())
+        self.assertEqual(task.start_strategy.call_count, 2)
+        self.assertEqual(task.__trace__, build_tracer_mock())
+
+    @pytest.mark.high
+    def test_not_registered(self):
+        self.consumer.app.tasks = {}
+
+        with self.assertRaises(KeyError):
+            _ = self.strategies['foo']
+
+
+class ConsumerTestCase(TestCase):
+    def consumer(self, controller):
+        def init(consumer, *args, **kwargs):
+            consumer.controller = controller
+            consumer.task_consumer = MagicMock()
+
+        with patch.object(CeleryConsumer, '__init__', init):
+            consumer = Consumer()
+        consumer.add_task_queue = MagicMock()
+
+        return consumer
+
+    @pytest.mark.high
+    def test_lanes(self):
+        controller = MagicMock()
+        controller.options = {'lanes': [Lane('foo', 'consumer.foo', 10, 1)]}
+
+        consumer = self.consumer(controller)
+
+        self.assertIs(controller.semaphore._waiting, consumer.lanes)
+
+        consumer.lanes.on_pause('consumer.foo')
+        consumer.task_consumer.cancel_by_queue.assert_called_once_with('consumer.foo')
+        consumer.lanes.on_resume('consumer.foo')
+        consumer.add_task_queue.assert_called_once_with('consumer.foo')
+
+    @pytest.mark.mid
+    def test_lanes_without_semaphore(self):
+        controller = MagicMock(semaphore=None)
+        controller.options = {'lanes': [Lane('foo', 'consumer.foo', 10, 1)]}
+
+        with self.assertLogs('task_dispatcher.worker', 'WARNING'):
+            consumer = self.consumer(controller)
+
+        self.assertFalse(hasattr(consumer, 'lanes'))
+
+    @pytest.mark.mid
+    def test_without_lanes(self):
+        controller = MagicMock(options={})
+
+        consumer = self.consumer(controller)
+
+        self.assertFalse(hasattr(consumer, 'lanes'))